@@ -0,0 +1,162 @@
+"""
+Benchmark of the climatology reductions: the previous pandas versions
+(strftime keys and one groupby per statistic) against utils.climate_kernels,
+on 30 years of synthetic data. Only the reduction is timed, not the download.
+Run from the repository root:
+    python benchmarks/climate_kernels.py [--repeat 5]
+"""
+import argparse
+import os
+import sys
+import timeit
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from utils.climate_kernels import (  # noqa: E402
+    calendar_means,
+    calendar_stats,
+    calendar_day_labels,
+    centered_mean,
+)
+from utils.climatology import HourlyClimatology  # noqa: E402
+
+
+def synthetic(freq, start="1991-01-01", end="2020-12-31 23:00"):
+    time = pd.date_range(start, end, freq=freq)
+    rng = np.random.default_rng(0)
+    values = 10 * np.sin(2 * np.pi * (time.dayofyear - 110) / 365.25) + 3 * np.sin(
+        2 * np.pi * (time.hour - 9) / 24) + rng.normal(0, 2, len(time))
+
+    return pd.DataFrame({"time": time, "temperature_2m": values.round(1)})
+
+
+def daily_climatology_pandas(data):
+    data = data.copy()
+    data['doy'] = data.time.dt.strftime("%m%d")
+
+    return data.groupby(data.doy).mean(numeric_only=True).round(1).rename_axis(['doy']).reset_index()
+
+
+def daily_climatology_kernels(data):
+    return calendar_means(data).round(1)
+
+
+def hourly_climatology_pandas(data):
+    data = data.copy()
+    data['doy'] = data.time.dt.strftime("%m%d")
+
+    return (
+        data.groupby([data.doy, data.time.dt.hour])
+        .mean(numeric_only=True)
+        .round(1)
+        .rename_axis(["doy", "hour"])
+        .reset_index()
+    )
+
+
+def hourly_climatology_kernels(data):
+    climatology = HourlyClimatology()
+    for _, year in data.groupby(data.time.dt.year):
+        climatology.add(year)
+
+    return climatology.result()
+
+
+def yearly_comparison_pandas(daily, var="temperature_2m"):
+    daily = daily.copy()
+    daily['doy'] = daily.time.dt.strftime("%m%d")
+    clima = daily.groupby('doy').mean(numeric_only=True).add_suffix("_clima")
+    clima['q05'] = daily.groupby('doy').quantile(q=0.05, numeric_only=True).add_suffix("_q05").values
+    clima['q95'] = daily.groupby('doy').quantile(q=0.95, numeric_only=True).add_suffix("_q95").values
+    for col in ['q05', 'q95']:
+        clima[col] = pd.Series(clima[col]).rolling(window=10, center=True, min_periods=1).mean().values
+
+    return clima
+
+
+def yearly_comparison_kernels(daily, var="temperature_2m"):
+    daily = daily.assign(doy=calendar_day_labels(daily.time))
+    stats = calendar_stats(daily.time, daily[var], quantiles=(0.05, 0.95))
+    clima = pd.DataFrame({f"{var}_clima": stats["mean"]})
+    clima['q05'] = stats[0.05]
+    clima['q95'] = stats[0.95]
+    for col in ['q05', 'q95']:
+        clima[col] = centered_mean(clima[col], window=10)
+
+    return clima
+
+
+def yearly_accumulation_pandas(daily, var="temperature_2m", q=(0.05, 0.5, 0.95)):
+    return (
+        daily.groupby([daily.time.dt.day, daily.time.dt.month])[var]
+        .quantile(list(q))
+        .unstack()
+        .rename_axis(index=['day', 'month'])
+        .reset_index()
+        .assign(dummy_date=lambda x: pd.to_datetime(
+            '2024-' + x['month'].astype(str) + "-" + x['day'].astype(str)))
+        .sort_values(by='dummy_date')
+    )
+
+
+def yearly_accumulation_kernels(daily, var="temperature_2m", q=(0.05, 0.5, 0.95)):
+    stats = calendar_stats(daily.time, daily[var], quantiles=q)
+
+    return pd.DataFrame({
+        'day': stats.index.str[2:].astype(np.int32),
+        'month': stats.index.str[:2].astype(np.int32),
+        **{value: stats[value].values for value in q},
+        'dummy_date': pd.to_datetime('2024' + stats.index, format='%Y%m%d'),
+    })
+
+
+def calendar_doy_pandas(daily):
+    return daily.time.dt.strftime("%m%d")
+
+
+def calendar_doy_kernels(daily):
+    return calendar_day_labels(daily.time)
+
+
+def max_difference(old, new):
+    old, new = np.asarray(old), np.asarray(new)
+    if old.dtype.kind in "fi":
+        return float(np.nanmax(np.abs(old.astype(float) - new.astype(float))))
+
+    return 0.0 if (old == new).all() else float("inf")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    hourly = synthetic("1h")
+    daily = hourly.resample("1D", on="time").mean().reset_index()
+    no_leap = daily[~((daily.time.dt.month == 2) & (daily.time.dt.day == 29))].reset_index(drop=True)
+
+    cases = [
+        ("compute_climatology(daily=True)", daily_climatology_pandas, daily_climatology_kernels, daily,
+         lambda df: df["temperature_2m"]),
+        ("compute_climatology(daily=False)", hourly_climatology_pandas, hourly_climatology_kernels, hourly,
+         lambda df: df["temperature_2m"]),
+        ("compute_yearly_comparison", yearly_comparison_pandas, yearly_comparison_kernels, no_leap,
+         lambda df: df[["temperature_2m_clima", "q05", "q95"]]),
+        ("compute_yearly_accumulation", yearly_accumulation_pandas, yearly_accumulation_kernels, no_leap,
+         lambda df: df[[0.05, 0.5, 0.95]]),
+        ("climate calendar anomalies", calendar_doy_pandas, calendar_doy_kernels, daily,
+         lambda values: values),
+    ]
+
+    print(f"{'function':34s} {'pandas':>10s} {'kernels':>10s} {'speedup':>8s} {'max diff':>9s}")
+    for name, old, new, data, columns in cases:
+        t_old = min(timeit.repeat(lambda: old(data), number=1, repeat=args.repeat))
+        t_new = min(timeit.repeat(lambda: new(data), number=1, repeat=args.repeat))
+        diff = max_difference(columns(old(data)), columns(new(data)))
+        print(f"{name:34s} {t_old * 1000:8.1f}ms {t_new * 1000:8.1f}ms {t_old / t_new:7.1f}x {diff:9.3g}")
+
+
+if __name__ == "__main__":
+    main()
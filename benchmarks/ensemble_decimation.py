@@ -0,0 +1,105 @@
+"""
+Benchmark of the ensemble decimation (get_ensemble_data(decimate=True)): the
+previous pandas version (regexes, rolling and resample for every group of
+variables, merged with functools.reduce) against utils.ensemble_decimation,
+on synthetic 51 members frames of 35 days (3 hourly then 6 hourly, as GFS05)
+and of 8 days (hourly, as ICON). Outputs are checked to be the same.
+Run from the repository root:
+    python benchmarks/ensemble_decimation.py [--repeat 5]
+"""
+import argparse
+import os
+import sys
+import timeit
+from functools import reduce
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from utils.settings import ENSEMBLE_VARS  # noqa: E402
+from utils.ensemble_decimation import decimate, decimate_after  # noqa: E402
+
+VARIABLES = ["temperature_2m", "temperature_850hPa", "cloudcover", "wind_speed_10m",
+             "weather_code", "rain", "snowfall", "wind_gusts_10m"]
+
+
+def synthetic(days, step_hours, members=51, start="2024-03-25"):
+    """Hourly frame (rows without data dropped, as in _ensemble_frame)"""
+    time = pd.date_range(start, periods=days * 24, freq="1h", tz="Europe/Berlin")
+    hours = np.arange(len(time))
+    rng = np.random.default_rng(0)
+    columns = {"time": time}
+    for var in VARIABLES:
+        for member in range(members):
+            values = rng.normal(5, 5, len(time)).round(1)
+            if var in ["rain", "snowfall"]:
+                values = np.clip(values - 5, 0, None)
+            if var == "weather_code":
+                values = rng.choice([0, 1, 2, 3, 61, 63, 71], len(time))
+            values = np.where(hours % step_hours(hours) == 0, values, np.nan)
+            if var != "weather_code" and member % 10 == 3:
+                values[rng.integers(0, len(time), 20)] = np.nan
+            columns[var if member == 0 else f"{var}_member{member:02d}"] = values
+    data = pd.DataFrame(columns)
+    data = data.dropna(subset=data.columns[data.columns != "time"], how="all").reset_index(drop=True)
+    data["weather_code"] = data["weather_code"].astype(np.int64)
+
+    return data
+
+
+def group_regex(name):
+    return "|".join(
+        item["value"] for group in ENSEMBLE_VARS if group["group"] == name for item in group["items"])
+
+
+def decimate_pandas(data):
+    dfs = []
+    if any(data.columns.str.contains(group_regex("Accumulated"))):
+        dfs.append(
+            data.loc[:, data.columns.str.contains("time|" + group_regex("Accumulated"))]
+            .rolling(window="3h", on="time").sum()
+            .resample("3h", on="time", origin=data.iloc[0]["time"]).first())
+    if any(data.columns.str.contains(group_regex("Instantaneous"))):
+        dfs.insert(0, data.loc[:, data.columns.str.contains("time|" + group_regex("Instantaneous"))]
+                   .resample("3h", on="time", origin=data.iloc[0]["time"]).first())
+    if any(data.columns.str.contains(group_regex("Preceding hour maximum"))):
+        dfs.append(
+            data.loc[:, data.columns.str.contains("time|" + group_regex("Preceding hour maximum"))]
+            .rolling(window="3h", on="time").max()
+            .resample("3h", on="time", origin=data.iloc[0]["time"]).first())
+
+    return reduce(lambda left, right: pd.merge(left, right, left_index=True, right_index=True),
+                  dfs).reset_index()
+
+
+def decimate_after_pandas(data):
+    t48_start_date = data.iloc[0]["time"] + pd.to_timedelta("48h")
+    after_48_hrs = decimate_pandas(data.loc[data.time >= t48_start_date + pd.to_timedelta("3h"), :])
+
+    return pd.concat([data.loc[data.time <= t48_start_date, :], after_48_hrs]).reset_index(drop=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    gfs05 = synthetic(35, lambda hours: np.where(hours < 10 * 24, 3, 6))
+    icon = synthetic(8, lambda hours: np.ones_like(hours))
+    cases = [
+        ("GFS05, 35 days (decimate)", decimate_pandas, decimate, gfs05),
+        ("ICON, 8 days (decimate_after)", decimate_after_pandas, decimate_after, icon),
+    ]
+
+    print(f"{'case':32s} {'shape':>12s} {'pandas':>10s} {'engine':>10s} {'speedup':>8s}")
+    for name, old, new, data in cases:
+        pd.testing.assert_frame_equal(old(data), new(data), check_exact=False, rtol=1e-12)
+        t_old = min(timeit.repeat(lambda: old(data), number=1, repeat=args.repeat))
+        t_new = min(timeit.repeat(lambda: new(data), number=1, repeat=args.repeat))
+        shape = "x".join(map(str, data.shape))
+        print(f"{name:32s} {shape:>12s} {t_old * 1000:8.1f}ms {t_new * 1000:8.1f}ms {t_old / t_new:7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -19,8 +19,11 @@ from components import navbar, footer
 from flask import request, redirect
 from utils.custom_logger import logging
 from utils.ai_utils import create_ai_report
+from utils.popularity import record_location
 from datetime import datetime
 from dash_iconify import DashIconify
+from io import StringIO
+import pandas as pd
 
 app = dash.Dash(
     __name__,
@@ -211,16 +214,29 @@ def ip(id):
         State("location-selected", "data"),
         State("client-details", "data"),
         State("url", "pathname"),
+        State("locations-list", "data"),
     ],
     prevent_initial_call=True,
 )
-def log_user_location(n, location, client, pathname):
+def log_user_location(n, location, client, pathname, locations):
     if not n:
         raise PreventUpdate
     if location and len(location) > 0:
         logging.info(
             f"SUBMIT => Session {client['session_id']}, Page {pathname}, selected location {location[0]['label']}"
         )
+        # Feed the popularity score used by the cache warmer
+        try:
+            locations = pd.read_json(StringIO(locations), orient="split", dtype={"id": str})
+            loc = locations[locations["id"] == location[0]["value"]]
+            record_location(
+                latitude=loc["latitude"].item(),
+                longitude=loc["longitude"].item(),
+                label=location[0]["label"].split("|")[0].strip(),
+                page=pathname,
+            )
+        except Exception as e:
+            logging.warning(f"Could not record location for the cache warmer: {e}")
 
 
 '''
@@ -5,7 +5,8 @@ TODO
 - Remove useless spaces? 
 """
 
-from utils.openmeteo_api import make_request, compute_climatology, r
+from utils.openmeteo_api import make_request, compute_climatology
+from utils.http_session import http_get
 from utils.settings import cache, OPENWEATHERMAP_KEY
 from datetime import datetime
 import pytz
@@ -417,7 +418,7 @@ def get_marine_forecast(location, start_date, end_date):
 
 def get_radar_data(address):
     payload = {"address": address}
-    resp = r.get(url="https://hh.guidocioni.it/nmwr/pointquery", params=payload)
+    resp = http_get(url="https://hh.guidocioni.it/nmwr/pointquery", params=payload)
     resp.raise_for_status()
 
     return resp.json()
@@ -431,7 +432,7 @@ def get_current_conditions(location):
         "appid": OPENWEATHERMAP_KEY,
         "units": "metric"
     }
-    resp = r.get(url="https://api.openweathermap.org/data/2.5/weather", params=payload)
+    resp = http_get(url="https://api.openweathermap.org/data/2.5/weather", params=payload)
     resp.raise_for_status()
 
     return resp.json()
@@ -446,7 +447,7 @@ def get_daily_summary(location, date):
         "units": "metric",
         "date": date
     }
-    resp = r.get(url="https://api.openweathermap.org/data/3.0/onecall/day_summary", params=payload)
+    resp = http_get(url="https://api.openweathermap.org/data/3.0/onecall/day_summary", params=payload)
     resp.raise_for_status()
 
     return resp.json()
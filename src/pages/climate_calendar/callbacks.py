@@ -1,5 +1,6 @@
 from dash import callback, Output, Input, State, no_update, clientside_callback
 from utils.openmeteo_api import get_historical_daily_data, compute_climatology
+from utils.climate_kernels import calendar_day_labels
 from utils.custom_logger import logging
 from utils.settings import REANALYSIS_MODELS, validate_model_selection
 from datetime import date, timedelta
@@ -66,7 +67,7 @@ def generate_figure(n_clicks, locations, location, model, graph_type, graph_type
         )
         if graph_type in ['precipitation_anomaly', 'temperature_anomaly', 'temperature_anomaly_rank', 'snow_anomaly']:
             # TODO, Report in the frontend that it's better to use ERA5 when comparing to the clima
-            data['doy'] = data.time.dt.strftime("%m%d")
+            data['doy'] = calendar_day_labels(data.time)
             clima = compute_climatology(
                         latitude=loc["latitude"].item(),
                         longitude=loc["longitude"].item(),
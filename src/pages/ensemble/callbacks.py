@@ -4,10 +4,12 @@ from utils.openmeteo_api import (
     get_model_meta,
     compute_climatology,
     compute_climatology_zarr,
+    compute_harmonic_climatology,
 )
 from utils.suntimes import find_suntimes
 from utils.custom_logger import logging
-from utils.settings import ENSEMBLE_MODELS, validate_model_selection
+from utils.settings import ENSEMBLE_MODELS, CLIMATOLOGY_MODE, validate_model_selection
+from utils.figures_utils import add_data_age
 from .figures import make_subplot_figure, make_barpolar_figure
 from components import location_selector_callbacks
 import pandas as pd
@@ -63,12 +65,21 @@ def generate_figure(
 
         clima = None
         if clima_:
-            clima = compute_climatology(
-                latitude=loc["latitude"].item(),
-                longitude=loc["longitude"].item(),
-                variables="temperature_2m",
-                model='era5_seamless'
-            )
+            if CLIMATOLOGY_MODE == "table":
+                clima = compute_climatology(
+                    latitude=loc["latitude"].item(),
+                    longitude=loc["longitude"].item(),
+                    variables="temperature_2m",
+                    model='era5_seamless'
+                )
+            else:
+                clima = compute_harmonic_climatology(
+                    latitude=loc["latitude"].item(),
+                    longitude=loc["longitude"].item(),
+                    variables="temperature_2m",
+                    model='era5_seamless',
+                    source="daily" if CLIMATOLOGY_MODE == "harmonic_daily" else "hourly",
+                ).table()
             # BETA, load the climatology of 850hPa T from  a zarr
             try:
                 clima_t850 = compute_climatology_zarr(latitude=loc["latitude"].item(),
@@ -114,7 +125,7 @@ def generate_figure(
         )
 
         return (
-            make_subplot_figure(data, clima, loc_label, sun, additional_plot),
+            add_data_age(make_subplot_figure(data, clima, loc_label, sun, additional_plot), data),
             # make_barpolar_figure(data),
             None,
             False,  # deactivate error popup
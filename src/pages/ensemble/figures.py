@@ -4,18 +4,18 @@ import numpy as np
 from plotly.subplots import make_subplots
 import pandas as pd
 from utils.settings import images_config
-from utils.figures_utils import add_attribution, get_precip_yaxis_max
+from utils.figures_utils import add_attribution, get_precip_yaxis_max, bin_percentages
+from utils.ensemble_cube import EnsembleCube
 
 
-def make_boxplot_timeseries(df, var, clima=None):
-    columns_regex = rf'{var}$|{var}_member(0[1-9]|[1-9][0-9])$|time'
-    tmp = df.loc[:, df.columns.str.match(columns_regex)].set_index("time")
+def make_boxplot_timeseries(cube, var, clima=None):
+    members = cube[var]
     traces = []
-    for index, row in tmp.iterrows():
+    for i, index in enumerate(cube.time):
         traces.append(
             go.Box(
-                x=[index] * len(row),
-                y=row,
+                x=[index] * members.shape[0],
+                y=members[:, i],
                 showlegend=False,
                 boxpoints=False,
                 marker_color="gray",
@@ -24,6 +24,7 @@ def make_boxplot_timeseries(df, var, clima=None):
 
     if clima is not None:
         # Now add climatology
+        df = pd.DataFrame({"time": cube.time})
         df["doy"] = df["time"].dt.strftime("%m%d")
         df["hour"] = df["time"].dt.hour
         clima = clima.merge(
@@ -46,18 +47,17 @@ def make_boxplot_timeseries(df, var, clima=None):
     return traces
 
 
-def make_lineplot_timeseries(df, var, clima=None, break_hours="48h"):
+def make_lineplot_timeseries(cube, var, clima=None, break_hours="48h"):
     traces = []
-    columns_regex = rf'{var}$|{var}_member(0[1-9]|[1-9][0-9])$'
-    for col in df.columns[df.columns.str.match(columns_regex)]:
+    members = cube[var]
+    time = cube.time
+    before = time <= time[0] + pd.to_timedelta(break_hours)
+    after = time >= time[0] + pd.to_timedelta(break_hours)
+    for col, values in zip(cube.columns(var), members):
         traces.append(
             go.Scattergl(
-                x=df.loc[
-                    df.time <= df.time.iloc[0] + pd.to_timedelta(break_hours), "time"
-                ],
-                y=df.loc[
-                    df.time <= df.time.iloc[0] + pd.to_timedelta(break_hours), col
-                ],
+                x=time[before],
+                y=values[before],
                 mode="lines+markers",
                 name=col,
                 hovertemplate="<extra></extra><b>%{x|%a %-d %b %H:%M}</b>, "
@@ -68,15 +68,11 @@ def make_lineplot_timeseries(df, var, clima=None, break_hours="48h"):
                 showlegend=False,
             ),
         )
-    for col in df.columns[df.columns.str.match(columns_regex)]:
+    for col, values in zip(cube.columns(var), members):
         traces.append(
             go.Scattergl(
-                x=df.loc[
-                    df.time >= df.time.iloc[0] + pd.to_timedelta(break_hours), "time"
-                ],
-                y=df.loc[
-                    df.time >= df.time.iloc[0] + pd.to_timedelta(break_hours), col
-                ],
+                x=time[after],
+                y=values[after],
                 mode="lines",
                 name=col,
                 hovertemplate="<extra></extra><b>%{x|%a %-d %b %H:%M}</b>, "
@@ -89,8 +85,8 @@ def make_lineplot_timeseries(df, var, clima=None, break_hours="48h"):
     # Additional shading
     traces.append(
         go.Scattergl(
-            x=df.loc[:, "time"],
-            y=df.loc[:, df.columns.str.match(columns_regex)].min(axis=1),
+            x=time,
+            y=cube.reduce(var, "min"),
             mode="lines",
             line=dict(color="rgba(0, 0, 0, 0)"),
             hoverinfo="skip",
@@ -99,8 +95,8 @@ def make_lineplot_timeseries(df, var, clima=None, break_hours="48h"):
     )
     traces.append(
         go.Scattergl(
-            x=df.loc[:, "time"],
-            y=df.loc[:, df.columns.str.match(columns_regex)].max(axis=1),
+            x=time,
+            y=cube.reduce(var, "max"),
             mode="lines",
             line=dict(color="rgba(0, 0, 0, 0)"),
             fillcolor="rgba(0, 0, 0, 0.1)",
@@ -120,7 +116,7 @@ def make_lineplot_timeseries(df, var, clima=None, break_hours="48h"):
         time_sel = pd.DataFrame(
             {
                 "time_selection": pd.date_range(
-                    df["time"].min(), df["time"].max(), freq="1h", tz=df.attrs["timezone"]
+                    time.min(), time.max(), freq="1h", tz=cube.attrs["timezone"]
                 )
             }
         )
@@ -153,9 +149,8 @@ def make_lineplot_timeseries(df, var, clima=None, break_hours="48h"):
     return traces
 
 
-def make_scatterplot_timeseries(df, var):
-    columns_regex = rf'{var}$|{var}_member(0[1-9]|[1-9][0-9])$'
-    df[f"{var}_mean"] = df.loc[:, df.columns.str.match(columns_regex)].mean(axis=1)
+def make_scatterplot_timeseries(cube, var):
+    members = cube[var]
     traces = []
     # for col in df.columns[df.columns.str.contains(var)]:
     #     traces.append(
@@ -176,33 +171,25 @@ def make_scatterplot_timeseries(df, var):
     if var == 'cloudcover':
         bins = list(np.linspace(0, 100, 11))
     elif var == 'wind_speed_10m':
-        bins = list(np.linspace(0, df.loc[:, df.columns.str.match(columns_regex)].max().max(), 11))
-
-    # Create a function to compute the percentage of values in each bin
-    def compute_bin_percentages(row, bins):
-        bin_counts = np.histogram(row, bins=bins)[0]
-        bin_percentages = bin_counts / len(row) * 100
-        return bin_percentages
+        bins = list(np.linspace(0, np.nanmax(members), 11))
 
-    # Apply the function to each row
-    bin_percentages_df = df.loc[:, df.columns.str.match(columns_regex)].apply(
-        lambda row: compute_bin_percentages(row, bins), axis=1, result_type="expand"
-    )
+    # Percentage of the members in each bin, for all the times at once
+    percentages = bin_percentages(members.T, bins)
     traces.append(
         go.Heatmap(
-            x=df.loc[:, "time"],
+            x=cube.time,
             colorscale="YlGnBu_r",
             hoverinfo="skip",
             y=bins,
-            z=bin_percentages_df.values.T,
+            z=percentages.T,
             showscale=False,
         ),
     )
     # add line with the average
     traces.append(
         go.Scattergl(
-            x=df.loc[:, "time"],
-            y=df.loc[:, f"{var}_mean"],
+            x=cube.time,
+            y=cube.mean(var),
             mode="lines",
             name="Mean",
             line=dict(width=2, color="white"),
@@ -214,50 +201,38 @@ def make_scatterplot_timeseries(df, var):
     return traces
 
 
-def make_barplot_timeseries(df, var, color="cadetblue"):
-    columns_regex = rf'{var}$|{var}_member(0[1-9]|[1-9][0-9])$'
+def make_barplot_timeseries(cube, var, color="cadetblue"):
     # Do some pre-processing on the input
-    members = len(df.loc[:, df.columns.str.match(columns_regex)].columns)
-
-    df[f"{var}_prob"] = (
-        ((df.iloc[:, df.columns.str.match(columns_regex)] >= 0.1).sum(axis=1) / members)
-        * 100.0
-    ).astype(int)
-
-    df[f"{var}_mean"] = df.iloc[:, df.columns.str.match(columns_regex)].mean(axis=1)
-
-    df.loc[df[f"{var}_prob"] < 5, [f"{var}_prob", f"{var}_mean"]] = np.nan
+    prob = (cube.exceedance(var, 0.1) * 100.0).astype(int).astype(float)
+    mean = cube.mean(var)
+    mean[prob < 5] = np.nan
+    prob[prob < 5] = np.nan
 
     trace = go.Bar(
-        x=df["time"],
-        y=df[f"{var}_mean"],
-        text=df[f"{var}_prob"],
+        x=cube.time,
+        y=mean,
+        text=prob,
         name=var,
         textposition="outside",
         hovertemplate="<extra></extra><b>%{x|%a %-d %b %H:%M}</b>, "
         + var
         + " = %{y:.1f}",
         showlegend=False,
-        width=(df["time"].diff().dt.seconds * 850).bfill().ffill(),
+        width=(cube.time.to_series().diff().dt.seconds * 850).bfill().ffill().values,
         marker_color=color,
     )
 
-    return trace
+    return trace, np.nanmax(mean, initial=0)
 
 
 def make_barpolar_figure(df, n_partitions=15, bins=np.linspace(0, 360, 15)):
-    columns_regex = r'wind_direction$|wind_direction_member(0[1-9]|[1-9][0-9])$'
     timeSpan = df.time.iloc[-1] - df.time.iloc[0]
     rule = int((timeSpan.total_seconds() / 3600.0) / n_partitions)
-    subset = df.resample(str(rule) + "H", on="time").first()
-    subset = subset.loc[:, subset.columns.str.match(columns_regex)]
-
-    out = []
-    for i, row in subset.iterrows():
-        out.append(pd.cut(row.values, bins=bins).value_counts().values)
-    # Convert to normalized percentage
-    for i, o in enumerate(out):
-        out[i] = (o / len(subset.columns)) * 100.0
+    cube = EnsembleCube.from_frame(df, "wind_direction", dtype=np.float64)
+    subset = cube.to_frame().resample(str(rule) + "H", on="time").first()
+
+    # Normalized percentage of the members in each (right-closed) bin
+    out = bin_percentages(subset.to_numpy(), bins, right=True)
     n_plots = len(out) - 1
     fig = make_subplots(
         rows=1,
@@ -286,29 +261,34 @@ def make_barpolar_figure(df, n_partitions=15, bins=np.linspace(0, 360, 15)):
 
 
 def make_subplot_figure(data, clima=None, title=None, sun=None, additional_plot='clouds'):
+    # Members of every variable, parsed once for all the subplots
+    cube = EnsembleCube.from_frame(data, dtype=np.float64)
     traces_temp = make_lineplot_timeseries(
-        data, "temperature_2m", clima, break_hours="12h"
+        cube, "temperature_2m", clima, break_hours="12h"
     )
-    # traces_temp = make_boxplot_timeseries(data, 'temperature_2m', clima)
+    # traces_temp = make_boxplot_timeseries(cube, 'temperature_2m', clima)
     height_graph = 0.0
     subplot_title = ""
-    if len(data.loc[:, data.columns.str.match(r'temperature_850hPa$|temperature_850hPa_member(0[1-9]|[1-9][0-9])$')].dropna() > 0):
+    # Only if there is at least a time with all the members
+    has_temp_850 = "temperature_850hPa" in cube and (~np.isnan(cube["temperature_850hPa"])).all(axis=0).any()
+    if has_temp_850:
         traces_temp_850 = make_lineplot_timeseries(
-            data, "temperature_850hPa", clima, break_hours="0h"
+            cube, "temperature_850hPa", clima, break_hours="0h"
         )
         height_graph = 0.4
         subplot_title = "<b>850hPa Temp"
-    has_rain = data.loc[:, data.columns.str.match(r'rain$|rain_member(0[1-9]|[1-9][0-9])$')].max().max() >= 0.1
-    has_snow = data.loc[:, data.columns.str.match(r'snowfall$|snowfall_member(0[1-9]|[1-9][0-9])$')].max().max() >= 0.1
+    rain_max = snow_max = 0
+    has_rain = "rain" in cube and np.nanmax(cube["rain"], initial=0) >= 0.1
+    has_snow = "snowfall" in cube and np.nanmax(cube["snowfall"], initial=0) >= 0.1
     if has_rain:
-        trace_rain = make_barplot_timeseries(data, "rain", color="cadetblue")
+        trace_rain, rain_max = make_barplot_timeseries(cube, "rain", color="cadetblue")
     if has_snow:
-        trace_snow = make_barplot_timeseries(data, "snowfall", color="rebeccapurple")
+        trace_snow, snow_max = make_barplot_timeseries(cube, "snowfall", color="rebeccapurple")
     if additional_plot == 'clouds':
-        traces_clouds = make_scatterplot_timeseries(data, "cloudcover")
+        traces_clouds = make_scatterplot_timeseries(cube, "cloudcover")
         additional_title = 'Cloud Cover [%]'
     elif additional_plot == 'winds':
-        traces_winds = make_scatterplot_timeseries(data, "wind_speed_10m")
+        traces_winds = make_scatterplot_timeseries(cube, "wind_speed_10m")
         additional_title = 'Winds [km/h]'
 
     fig = make_subplots(
@@ -350,7 +330,7 @@ def make_subplot_figure(data, clima=None, title=None, sun=None, additional_plot=
 
     for trace_temp in traces_temp:
         fig.add_trace(trace_temp, row=1, col=1)
-    if len(data.loc[:, data.columns.str.match(r'temperature_850hPa$|temperature_850hPa_member(0[1-9]|[1-9][0-9])$')].dropna() > 0):
+    if has_temp_850:
         for trace_temp_850 in traces_temp_850:
             fig.add_trace(trace_temp_850, row=2, col=1)
     if has_rain:
@@ -460,8 +440,6 @@ def make_subplot_figure(data, clima=None, title=None, sun=None, additional_plot=
         zerolinewidth=2,
         zerolinecolor="rgba(0,0,0,0.5)",
     )
-    rain_max = data["rain_mean"].max() if has_rain else 0
-    snow_max = data["snowfall_mean"].max() if has_snow else 0
     fig.update_yaxes(
         row=3,
         col=1,
@@ -2,6 +2,7 @@ from dash import callback, Output, Input, State, no_update, clientside_callback
 from utils.openmeteo_api import get_ensemble_data, weather_code_to_precip_type
 from utils.custom_logger import logging
 from utils.settings import ENSEMBLE_MODELS, ENSEMBLE_VARS, validate_model_selection
+from utils.figures_utils import add_data_age
 from .figures import make_heatmap, make_lineplot
 import pandas as pd
 from io import StringIO
@@ -77,9 +78,9 @@ def generate_figure(n_clicks, locations, location, model, variable, from_now_, d
             f"Ens = <b>{model.upper()}</b></sup>"
         )
         if _is_heatmap:
-            return make_heatmap(data, var=variable, title=loc_label), None, False
+            return add_data_age(make_heatmap(data, var=variable, title=loc_label), data), None, False
         else:
-            return make_lineplot(data, var=variable, title=loc_label), None, False
+            return add_data_age(make_lineplot(data, var=variable, title=loc_label), data), None, False
 
     except Exception as e:
         logging.error(
@@ -1,8 +1,10 @@
 from dash import dcc
 import plotly.express as px
+import numpy as np
 import pandas as pd
 from utils.settings import images_config
 from utils.figures_utils import add_attribution
+from utils.ensemble_cube import EnsembleCube
 import plotly.graph_objects as go
 from copy import deepcopy
 
@@ -44,13 +46,14 @@ def make_heatmap(df, var, title=None):
     else:
         cmap = "RdBu_r"
 
-    columns_regex = rf"{var}$|{var}_member(0[1-9]|[1-9][0-9])$"
-    y_positions = list(range(df.loc[:, df.columns.str.match(columns_regex)].shape[1]))
+    cube = EnsembleCube.from_frame(df, var, dtype=np.float64)
+    members = cube[var] if var in cube else np.empty((0, len(df)))
+    y_positions = list(range(members.shape[0]))
 
     if var == "precipitation_type":
         # Special handling for categorical precipitation type
         fig = px.imshow(
-            df.loc[:, df.columns.str.match(columns_regex)].T,
+            members,
             x=df["time"],
             y=y_positions,
             text_auto=False,  # Don't show numbers for categories
@@ -61,7 +64,7 @@ def make_heatmap(df, var, title=None):
             zmax=4,
         )
         # Custom hover template with category names
-        hover_text = df.loc[:, df.columns.str.match(columns_regex)].T.map(
+        hover_text = pd.DataFrame(members).map(
             lambda x: {
                 1: "Rain",
                 2: "Snow",
@@ -75,7 +78,7 @@ def make_heatmap(df, var, title=None):
         )
     elif var != "weather_code":
         fig = px.imshow(
-            df.loc[:, df.columns.str.match(columns_regex)].T,
+            members,
             x=df["time"],
             y=y_positions,
             text_auto=True,
@@ -101,7 +104,7 @@ def make_heatmap(df, var, title=None):
         df = df.resample(freq, on="time").max().reset_index()
         times = df["time"]
         # Loop through members and times to add images dynamically
-        members_vars = df.loc[:, df.columns.str.match(columns_regex)].columns.to_list()
+        members_vars = cube.columns(var) if var in cube else []
         for i, var in enumerate(members_vars):
             # Extract icons for the current model
             df = get_weather_icons(
@@ -211,7 +214,8 @@ def make_lineplot(
 ):
     fig = go.Figure()
     traces = []
-    columns_regex = rf"{var}$|{var}_member(0[1-9]|[1-9][0-9])$"
+    cube = EnsembleCube.from_frame(df, var, dtype=np.float64)
+    members = zip(cube.columns(var), cube[var]) if var in cube else []
 
     # Special handling for precipitation_type categorical variable
     if var == "precipitation_type":
@@ -222,15 +226,16 @@ def make_lineplot(
             3: "Freezing",
             4: "Hail"
         }
-        for col in df.columns[df.columns.str.match(columns_regex)]:
+        for col, values in members:
             # Map numeric values to category names for hover
-            hover_text = df.loc[:, col].map(
-                lambda x: category_names.get(x, "No precip") if not pd.isna(x) else "No precip"
-            )
+            hover_text = [
+                category_names.get(x, "No precip") if not pd.isna(x) else "No precip"
+                for x in values
+            ]
             traces.append(
                 go.Scatter(
-                    x=df.loc[:, "time"],
-                    y=df.loc[:, col],
+                    x=cube.time,
+                    y=values,
                     mode="lines",
                     name=col,
                     customdata=hover_text,
@@ -240,11 +245,11 @@ def make_lineplot(
                 ),
             )
     else:
-        for col in df.columns[df.columns.str.match(columns_regex)]:
+        for col, values in members:
             traces.append(
                 go.Scatter(
-                    x=df.loc[:, "time"],
-                    y=df.loc[:, col],
+                    x=cube.time,
+                    y=values,
                     mode="lines",
                     name=col,
                     hovertemplate="<extra></extra><b>%{x|%a %-d %b %H:%M}</b>, "
@@ -3,6 +3,7 @@ from utils.openmeteo_api import get_forecast_data
 from utils.suntimes import find_suntimes
 from utils.custom_logger import logging
 from utils.settings import DEFAULT_TEMPLATE, DETERMINISTIC_MODELS, get_valid_values
+from utils.figures_utils import add_data_age
 from .figures import make_subplot_figure
 import pandas as pd
 from io import StringIO
@@ -74,7 +75,7 @@ def generate_figure(n_clicks, locations, location, models, from_now_, days_, min
         )
 
         return (
-            make_subplot_figure(data=data, title=loc_label, sun=sun, models=models),
+            add_data_age(make_subplot_figure(data=data, title=loc_label, sun=sun, models=models), data),
             None,
             False,
         )
@@ -2,6 +2,7 @@ from dash import callback, Output, Input, State, no_update, clientside_callback
 from utils.openmeteo_api import get_forecast_data
 from utils.custom_logger import logging
 from utils.settings import DETERMINISTIC_MODELS, DETERMINISTIC_VARS, get_valid_values
+from utils.figures_utils import add_data_age
 from .figures import make_heatmap, make_lineplot
 import pandas as pd
 from io import StringIO
@@ -75,9 +76,9 @@ def generate_figure(n_clicks, locations, location, model, variable, from_now_, d
             f", {float(data.attrs['latitude']):.1f}N, {float(data.attrs['elevation']):.0f}m)"
         )
         if _is_heatmap:
-            return make_heatmap(data, var=variable, title=loc_label, models=model), None, False
+            return add_data_age(make_heatmap(data, var=variable, title=loc_label, models=model), data), None, False
         else:
-            return make_lineplot(data, var=variable, models=model, title=loc_label), None, False
+            return add_data_age(make_lineplot(data, var=variable, models=model, title=loc_label), data), None, False
 
     except Exception as e:
         logging.error(
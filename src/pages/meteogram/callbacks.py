@@ -1,7 +1,8 @@
 from dash import callback, Output, Input, State, no_update, clientside_callback
 from utils.openmeteo_api import compute_daily_ensemble_meteogram, compute_climatology, compute_predictability_index
 from utils.figures_utils import get_weather_icons
-from utils.settings import ASSETS_DIR, ENSEMBLE_MODELS, filter_options, validate_model_selection
+from utils.settings import ASSETS_DIR, ENSEMBLE_MODELS, PAGE_FETCH_TIMEOUT, filter_options, validate_model_selection
+from utils.concurrent_fetch import Dependency, fetch_all
 from utils.custom_logger import logging
 from .figures import make_subplot_figure
 import pandas as pd
@@ -49,11 +50,27 @@ def generate_figure(n_clicks, locations, location, model):
     loc = locations[locations["id"] == location[0]["value"]]
 
     try:
-        data = compute_daily_ensemble_meteogram(
-            latitude=loc["latitude"].item(),
-            longitude=loc["longitude"].item(),
-            model=model,
-        ).reset_index()
+        # The climatology is downloaded together with the forecast, and
+        # left out if it takes too long
+        results = fetch_all({
+            "data": Dependency(
+                compute_daily_ensemble_meteogram,
+                latitude=loc["latitude"].item(),
+                longitude=loc["longitude"].item(),
+                model=model,
+            ),
+            "clima": Dependency(
+                compute_climatology,
+                timeout=PAGE_FETCH_TIMEOUT,
+                default=None,
+                latitude=loc["latitude"].item(),
+                longitude=loc["longitude"].item(),
+                daily=True,
+                model="era5_seamless",
+                variables="temperature_2m_max,temperature_2m_min,sunshine_duration",
+            ),
+        })
+        data = results["data"].reset_index()
         data = get_weather_icons(
             data,
         )
@@ -65,21 +82,16 @@ def generate_figure(n_clicks, locations, location, model):
         data = data.join(predictability)
         data.attrs = data_attrs
 
-        # Add daily climatology (quite fast)
-        clima = compute_climatology(
-            latitude=loc["latitude"].item(),
-            longitude=loc["longitude"].item(),
-            daily=True,
-            model="era5_seamless",
-            variables="temperature_2m_max,temperature_2m_min,sunshine_duration",
-        )
-        clima = clima.rename(
-            columns={
-                "temperature_2m_max": "t_max_clima",
-                "temperature_2m_min": "t_min_clima",
-                "sunshine_duration": "sunshine_clima",
-            }
-        )
+        # Add daily climatology
+        clima = results["clima"]
+        if clima is not None:
+            clima = clima.rename(
+                columns={
+                    "temperature_2m_max": "t_max_clima",
+                    "temperature_2m_min": "t_min_clima",
+                    "sunshine_duration": "sunshine_clima",
+                }
+            )
 
         loc_label = location[0]["label"].split("|")[0] + (
             f"|📍 {float(data.attrs['longitude']):.1f}E"
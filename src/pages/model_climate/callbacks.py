@@ -8,6 +8,7 @@ from dash import (
     clientside_callback,
 )
 from utils.openmeteo_api import compute_monthly_clima, get_historical_daily_data
+from utils.concurrent_fetch import Dependency, fetch_all
 from utils.custom_logger import logging
 from utils.settings import images_config, REANALYSIS_MODELS, validate_model_selection
 from .figures import (
@@ -83,22 +84,26 @@ def generate_figure(n_clicks, locations, location, model, dates):
     )
 
     try:
-        data = compute_monthly_clima(
-            latitude=loc["latitude"].item(),
-            longitude=loc["longitude"].item(),
-            model=model,
-            start_date=dates[0],
-            end_date=dates[1],
-        )
-
-        wind_rose_data = get_historical_daily_data(
-            variables="wind_direction_10m_dominant",
-            latitude=loc["latitude"].item(),
-            longitude=loc["longitude"].item(),
-            model=model,
-            start_date=dates[0],
-            end_date=dates[1],
-        )
+        results = fetch_all({
+            "data": Dependency(
+                compute_monthly_clima,
+                latitude=loc["latitude"].item(),
+                longitude=loc["longitude"].item(),
+                model=model,
+                start_date=dates[0],
+                end_date=dates[1],
+            ),
+            "wind_rose_data": Dependency(
+                get_historical_daily_data,
+                variables="wind_direction_10m_dominant",
+                latitude=loc["latitude"].item(),
+                longitude=loc["longitude"].item(),
+                model=model,
+                start_date=dates[0],
+                end_date=dates[1],
+            ),
+        })
+        data, wind_rose_data = results["data"], results["wind_rose_data"]
 
         fig_temp_prec = make_temp_prec_climate_figure(data, title=loc_label)
         fig_temperature = make_temperature_climate_figure(data, title=loc_label)
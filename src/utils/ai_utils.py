@@ -1,6 +1,7 @@
 from .openmeteo_api import get_locations, make_request, compute_climatology
 from datetime import datetime, timedelta
 from .settings import OPENAI_KEY, cache
+from .concurrent_fetch import Dependency, fetch_all
 from .custom_logger import logging
 
 try:
@@ -68,36 +69,51 @@ def create_weather_data(location, date):
         "start_date": date,
         "end_date": date,
     }
-    resp = make_request(url="https://api.open-meteo.com/v1/forecast", payload=payload)
-    weather_data = resp.json()
+    # Yesterday data
+    day_before = (datetime.strptime(date, "%Y-%m-%d") - timedelta(days=1)).strftime("%Y-%m-%d")
+    payload_day_before = {
+        key: value for key, value in payload.items() if key not in ['current', 'minutely_15']
+    }
+    payload_day_before["start_date"] = day_before
+    payload_day_before["end_date"] = day_before
+    # Ensemble data
+    payload_ensemble = {
+        "latitude": location["latitude"].item(),
+        "longitude": location["longitude"].item(),
+        "hourly": "temperature_2m,precipitation,rain,snowfall",
+        "timezone": "auto",
+        "models": "icon_seamless",
+        "start_date": date,
+        "end_date": date,
+    }
+    # All the requests are independent, so they're sent together
+    results = fetch_all({
+        "forecast": Dependency(make_request, url="https://api.open-meteo.com/v1/forecast", payload=payload),
+        "day_before": Dependency(make_request, url="https://api.open-meteo.com/v1/forecast", payload=payload_day_before),
+        # TODO, only get data for this day across the 30 years to avoid
+        # processing data we don't need. However I don't think it's possible
+        # to make a request to openmeteo without a range
+        "climatology": Dependency(
+            compute_climatology,
+            latitude=location["latitude"].item(),
+            longitude=location["longitude"].item(),
+            daily=True,
+            model="era5_seamless",
+            variables="temperature_2m_max,temperature_2m_min,sunshine_duration,precipitation_sum,rain_sum,snowfall_sum",
+        ),
+        "ensemble": Dependency(make_request, url="https://ensemble-api.open-meteo.com/v1/ensemble", payload=payload_ensemble),
+    })
+
+    weather_data = results["forecast"].json()
     weather_data["location"] = location["name"]
     # weather_data['country'] = location['country']
     weather_data["doy"] = datetime.strptime(
         weather_data["hourly"]["time"][0], "%Y-%m-%dT%H:%M"
     ).strftime("%m%d")
-    # Add yesterday data
-    payload["start_date"] = (
-        datetime.strptime(date, "%Y-%m-%d") - timedelta(days=1)
-    ).strftime("%Y-%m-%d")
-    payload["end_date"] = (
-        datetime.strptime(date, "%Y-%m-%d") - timedelta(days=1)
-    ).strftime("%Y-%m-%d")
-    for key in ['current', 'minutely_15']:
-        payload.pop(key, None)
-    resp = make_request(url="https://api.open-meteo.com/v1/forecast", payload=payload)
-    weather_data["day_before"] = resp.json()
+    weather_data["day_before"] = results["day_before"].json()
 
     # Add climatology values
-    # TODO, only get data for this day across the 30 years to avoid
-    # processing data we don't need. However I don't think it's possible
-    # to make a request to openmeteo without a range
-    clima = compute_climatology(
-        latitude=location["latitude"].item(),
-        longitude=location["longitude"].item(),
-        daily=True,
-        model="era5_seamless",
-        variables="temperature_2m_max,temperature_2m_min,sunshine_duration,precipitation_sum,rain_sum,snowfall_sum",
-    )
+    clima = results["climatology"]
     clima = clima.loc[clima["doy"] == weather_data["doy"]]
     clima['sunshine_duration'] = clima['sunshine_duration'] * 3600.
 
@@ -110,19 +126,8 @@ def create_weather_data(location, date):
         "snowfall_sum_day": clima["snowfall_sum"].item(),
     }
 
-    # Add ensemble data 
-    payload = {
-        "latitude": location["latitude"].item(),
-        "longitude": location["longitude"].item(),
-        "hourly": "temperature_2m,precipitation,rain,snowfall",
-        "timezone": "auto",
-        "models": "icon_seamless",
-        "start_date": date,
-        "end_date": date,
-    }
-    resp = make_request(url="https://ensemble-api.open-meteo.com/v1/ensemble", payload=payload)
-    ensemble_data = resp.json()
-    weather_data['ensemble_models'] = ensemble_data['hourly']
+    # Add ensemble data
+    weather_data['ensemble_models'] = results["ensemble"].json()['hourly']
 
     return weather_data
 
@@ -0,0 +1,49 @@
+"""
+Maintenance of the cache directory, to be run from src:
+    python -m utils.cache_admin report    # size of the cache per memoized function
+    python -m utils.cache_admin compact   # remove expired entries and evict down to the budget
+"""
+import argparse
+from .settings import get_cache_directory, CACHE_BACKEND_OPTIONS, CACHE_BACKEND
+from .cache_backend import DataFrameFileSystemCache
+
+
+def print_report(backend):
+    rows = backend.report()
+    print(f"{'function':<60} {'entries':>8} {'MB':>10} {'expired MB':>11} {'hits':>8}")
+    for row in rows:
+        print(
+            f"{row['function']:<60} {row['entries']:>8} {row['bytes'] / 2**20:>10.1f} "
+            f"{row['expired_bytes'] / 2**20:>11.1f} {row['hits']:>8}")
+    total = sum(row["bytes"] for row in rows)
+    budget = backend.max_bytes / 2**20 if backend.max_bytes else float("inf")
+    print(f"\nTotal {total / 2**20:.1f} MB in {sum(row['entries'] for row in rows)} entries, budget {budget:.1f} MB")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Inspect and compact the point_wx cache")
+    parser.add_argument("command", choices=["report", "compact"])
+    parser.add_argument("--cache-dir", default=None, help="defaults to the directory used by the app")
+    args = parser.parse_args()
+
+    if CACHE_BACKEND != "filesystem" and args.cache_dir is None:
+        parser.error("Only the filesystem cache can be inspected, Redis evicts entries by itself")
+    cache_dir = args.cache_dir or get_cache_directory()
+    if cache_dir is None:
+        parser.error("No cache directory found")
+    backend = DataFrameFileSystemCache(cache_dir, threshold=0, **CACHE_BACKEND_OPTIONS)
+
+    if args.command == "report":
+        print_report(backend)
+    else:
+        stats = backend.compact()
+        if stats is None:
+            print("Another process is compacting the cache, try again later")
+        else:
+            print(
+                f"Removed {stats['expired']} expired and {stats['evicted']} evicted entries "
+                f"({stats['freed_bytes'] / 2**20:.1f} MB), {stats['size_bytes'] / 2**20:.1f} MB in use")
+
+
+if __name__ == "__main__":
+    main()
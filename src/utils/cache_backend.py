@@ -0,0 +1,611 @@
+"""
+Filesystem cache backend that stores DataFrames in columnar format.
+Results of the fetchers are mostly DataFrames (long hourly archives, wide
+ensemble frames): instead of pickling them we write them as Arrow IPC files,
+with the attrs in the metadata, and read them back through a memory map so
+that no intermediate copy of the file is created in the worker.
+Everything else (and all DataFrames if pyarrow is not installed) is pickled
+as before, and files written by the plain filesystem backend can still be read.
+
+Instead of the entry-count threshold of Flask-Caching the size of the
+directory is kept under a byte budget by a compaction pass that runs in
+the background: expired entries are removed first, then the least valuable
+ones, where the value of an entry is the cost of recomputing it (weight of
+its function) times how recently (LRU) or how often (LFU) it was used.
+Every entry stores its key in a small header, so that entries can be
+attributed to the memoized function that created them. Reads never write
+to the entries: every process counts its hits in memory and appends them
+in batches to a log next to the compaction lock, which the compaction
+pass folds into a totals file.
+Recently used values are also kept in memory in every worker (LocalCache).
+"""
+import datetime
+import glob
+import os
+import pickle
+import struct
+import tempfile
+import threading
+import time
+import pandas as pd
+from cachelib.serializers import FileSystemSerializer
+from flask_caching.backends.filesystemcache import FileSystemCache
+from .local_cache import LocalCache, MISSING, value_size
+from .custom_logger import logging
+
+try:
+    import pyarrow as pa
+    import pyarrow.ipc
+except ImportError:
+    pa = None
+
+try:
+    import fcntl
+except ImportError:  # e.g. Windows: compaction is only serialized inside the process
+    fcntl = None
+
+# First bytes of the entries written in Arrow format. Pickle streams
+# always start with \x80, so old entries are still recognised.
+ARROW_MAGIC = b"PWXA"
+ATTRS_METADATA_KEY = b"pointwx.attrs"
+
+# Header written after the expiry time (4 bytes) of every entry:
+# magic, key length, then the key and padding up to 8 bytes
+ENTRY_MAGIC = b"PWXK"
+ENTRY_HEADER = struct.Struct("<4sH")
+# Hits of every process are appended to HITS_LOG at most every
+# HITS_FLUSH_INTERVAL seconds, and summed into HITS_TOTALS by the compaction
+# (both in the lock directory, as the cache directory only holds entries)
+HITS_LOG = "cache-hits.log"
+HITS_TOTALS = "cache-hits.totals"
+HITS_FLUSH_INTERVAL = 30
+# Keys of the version of every memoized function (see Flask-Caching memoize).
+# They are never evicted, as this would invalidate all the entries of the function
+MEMVER_SUFFIX = "_memver"
+# When over budget, entries are evicted until the cache is this fraction of it
+LOW_WATER_MARK = 0.9
+# Temporary files older than this (seconds) are left over by interrupted writes
+STALE_TEMP_AGE = 3600
+
+
+class DataFrameSerializer:
+    def __init__(self, compression=None, zero_copy=False):
+        """
+        compression: None, 'lz4' or 'zstd' (Arrow buffer compression).
+        zero_copy: return frames whose columns point directly into the
+        memory-mapped file when possible. These columns are read-only, so
+        only enable it if callers never modify the cached frames in place.
+        """
+        self.compression = compression
+        self.zero_copy = zero_copy
+        self.pickle_serializer = FileSystemSerializer()
+
+    def _can_use_arrow(self, value):
+        return (
+            pa is not None
+            and isinstance(value, pd.DataFrame)
+            and not isinstance(value.columns, pd.MultiIndex)
+            and value.columns.is_unique
+            and all(isinstance(col, str) for col in value.columns)
+        )
+
+    def _to_table(self, df):
+        # attrs are pickled in our own metadata key, as they are not always
+        # JSON serializable (e.g. timestamps)
+        plain = df.copy(deep=False)
+        plain.attrs = {}
+        table = pa.Table.from_pandas(plain, preserve_index=True)
+        # from_pandas stores NaN as nulls, which forces a copy when reading back:
+        # keep them as plain float values instead
+        for i, field in enumerate(table.schema):
+            if pa.types.is_floating(field.type) and field.name in df.columns:
+                table = table.set_column(
+                    i, field, pa.array(df[field.name].to_numpy(), type=field.type, from_pandas=False))
+        metadata = dict(table.schema.metadata or {})
+        metadata[ATTRS_METADATA_KEY] = pickle.dumps(df.attrs, protocol=pickle.HIGHEST_PROTOCOL)
+
+        return table.replace_schema_metadata(metadata)
+
+    def dump_arrow(self, value, f):
+        """Write value to f in Arrow format, if possible. Returns whether it was written"""
+        if not self._can_use_arrow(value):
+            return False
+        try:
+            table = self._to_table(value)
+        except (pa.ArrowException, TypeError, ValueError) as e:
+            logging.debug(f"Cannot store DataFrame as Arrow, pickling it: {e}")
+            return False
+
+        f.write(ARROW_MAGIC)
+        options = pa.ipc.IpcWriteOptions(compression=self.compression)
+        with pa.ipc.new_file(f, table.schema, options=options) as writer:
+            writer.write_table(table)
+
+        return True
+
+    def read_arrow(self, buffer):
+        """DataFrame from an Arrow buffer (without the magic bytes)"""
+        table = pa.ipc.open_file(buffer).read_all()
+        if self.zero_copy:
+            df = table.to_pandas(split_blocks=True)
+        else:
+            df = table.to_pandas()
+        metadata = table.schema.metadata or {}
+        if ATTRS_METADATA_KEY in metadata:
+            df.attrs = pickle.loads(metadata[ATTRS_METADATA_KEY])
+
+        return df
+
+    def dump(self, value, f):
+        if not self.dump_arrow(value, f):
+            self.pickle_serializer.dump(value, f)
+
+    def load(self, f):
+        start = f.tell()
+        if f.read(len(ARROW_MAGIC)) != ARROW_MAGIC:
+            f.seek(start)
+            return self.pickle_serializer.load(f)
+
+        if pa is None:
+            logging.warning(f"Cache entry {f.name} needs pyarrow to be read")
+            return None
+
+        # The buffer is a slice of the memory map, the file is never read into memory
+        source = pa.memory_map(f.name, "r")
+        source.seek(f.tell())
+
+        return self.read_arrow(source.read_buffer())
+
+
+class EntrySerializer:
+    """
+    Serializer of DataFrameFileSystemCache: the filesystem backend writes the
+    expiry time, then dump adds the header with the key being written by
+    the thread (writing.key) before the value
+    """
+
+    def __init__(self, serializer, writing):
+        self.serializer = serializer
+        self.writing = writing
+
+    def dump(self, value, f):
+        raw = getattr(self.writing, "key", None) or ""
+        raw = raw.encode("utf-8")[:65535]
+        f.write(ENTRY_HEADER.pack(ENTRY_MAGIC, len(raw)))
+        f.write(raw)
+        # Keep the payload 8-byte aligned, so that Arrow can use the mapped buffers as they are
+        f.write(b"\0" * (-f.tell() % 8))
+        self.serializer.dump(value, f)
+
+    def load(self, f):
+        return self.serializer.load(f)
+
+
+def entry_namespace(key, versions):
+    """
+    Name of the function that created the entry with the given key.
+    versions maps the current version of every memoized function to its name,
+    as memoize keys are a hash of the arguments followed by the version.
+    """
+    if key is None:
+        return "(unknown)"
+    if key.endswith(MEMVER_SUFFIX):
+        return "(memoize versions)"
+    if ":" in key:
+        # Keys of our own entries (variable blocks, grid aliases...)
+        return key.split(":")[0]
+
+    return versions.get(key[16:], "(unknown memoized)")
+
+
+class DataFrameFileSystemCache(FileSystemCache):
+    """
+    Same as the filesystem backend of Flask-Caching but with DataFrames
+    stored as Arrow IPC (see DataFrameSerializer) and a byte budget.
+    Use it with CACHE_TYPE = "utils.cache_backend.DataFrameFileSystemCache",
+    CACHE_OPTIONS can contain:
+    compression, zero_copy: see DataFrameSerializer
+    max_bytes: size of the cache directory above which entries are evicted (0 = no limit)
+    eviction_policy: "lru" or "lfu"
+    cost_weights: recompute cost of the entries of every function (by function
+    name, default 1)
+    compaction_interval: seconds between two compaction passes (0 = never)
+    lock_dir: directory of the lock file that lets only one process compact
+    local_max_bytes, local_ttl: size and maximum lifetime of the in-process
+    cache in front of the directory (see LocalCache)
+    """
+
+    def __init__(self, cache_dir, compression=None, zero_copy=False, max_bytes=0,
+                 eviction_policy="lru", cost_weights=None, compaction_interval=600,
+                 lock_dir=None, local_max_bytes=0, local_ttl=300, **kwargs):
+        super().__init__(cache_dir, **kwargs)
+        self.serializer = DataFrameSerializer(compression=compression, zero_copy=zero_copy)
+        self.max_bytes = max_bytes
+        self.eviction_policy = eviction_policy
+        self.cost_weights = cost_weights or {}
+        self.compaction_interval = compaction_interval
+        self.lock_dir = lock_dir or os.path.join(tempfile.gettempdir(), "pointwx-locks")
+        self._last_compaction_check = 0
+        self._compaction_lock = threading.Lock()
+        # Hits (count, time of the last one) of this process not written yet
+        self._pending_hits = {}
+        self._hits_lock = threading.Lock()
+        self._last_hits_flush = time.time()
+        # Key of the entry being written by every thread (see EntrySerializer)
+        self._writing = threading.local()
+        self.serializer = EntrySerializer(self.serializer, self._writing)
+        self.local = LocalCache(local_max_bytes, local_ttl)
+
+    @staticmethod
+    def _read_header(f):
+        """
+        Key of the entry, with f positioned at the start of the value.
+        Entries written by the plain filesystem backend have no header (None)
+        """
+        start = f.tell()
+        head = f.read(ENTRY_HEADER.size)
+        if len(head) < ENTRY_HEADER.size or head[:4] != ENTRY_MAGIC:
+            f.seek(start)
+            return None
+        _, length = ENTRY_HEADER.unpack(head)
+        key = f.read(length).decode("utf-8", "replace")
+        f.seek(-f.tell() % 8, os.SEEK_CUR)
+
+        return key
+
+    def _record_hit(self, filename):
+        now = time.time()
+        with self._hits_lock:
+            hit = self._pending_hits.setdefault(os.path.basename(filename), [0, now])
+            hit[0] += 1
+            hit[1] = now
+            due = now - self._last_hits_flush >= HITS_FLUSH_INTERVAL
+        if due:
+            self._flush_hits()
+
+    def _flush_hits(self):
+        """Append the hits of this process to the log (a single write, so lines never mix)"""
+        with self._hits_lock:
+            pending, self._pending_hits = self._pending_hits, {}
+            self._last_hits_flush = time.time()
+        if not pending:
+            return
+        lines = "".join(f"{name} {count} {last:.0f}\n" for name, (count, last) in pending.items())
+        try:
+            os.makedirs(self.lock_dir, exist_ok=True)
+            fd = os.open(os.path.join(self.lock_dir, HITS_LOG), os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o600)
+            try:
+                os.write(fd, lines.encode())
+            finally:
+                os.close(fd)
+        except OSError as e:
+            logging.warning(f"Cannot write the cache hits in {self.lock_dir}: {e}")
+
+    def _read_hits(self, consume=False):
+        """
+        Hits (count, time of the last one) of every entry file name, from the
+        totals and the log. With consume the log is moved aside: the files
+        read are returned, to be removed once the totals are written.
+        """
+        log = os.path.join(self.lock_dir, HITS_LOG)
+        if consume:
+            try:
+                os.replace(log, f"{log}.{os.getpid()}.{time.time_ns()}")
+            except FileNotFoundError:
+                pass
+        # Logs moved aside by an interrupted compaction are read again
+        consumed = glob.glob(f"{glob.escape(log)}.*")
+        hits = {}
+        for path in [os.path.join(self.lock_dir, HITS_TOTALS)] + consumed + ([] if consume else [log]):
+            try:
+                with open(path) as f:
+                    for line in f:
+                        try:
+                            name, count, last = line.split()
+                            count, last = int(count), float(last)
+                        except ValueError:
+                            continue
+                        total = hits.setdefault(name, [0, 0.0])
+                        total[0] += count
+                        total[1] = max(total[1], last)
+            except FileNotFoundError:
+                continue
+            except OSError as e:
+                logging.warning(f"Cannot read the cache hits in {path}: {e}")
+
+        return hits, consumed
+
+    def _write_hit_totals(self, hits, names):
+        """Replace the totals with the hits of the entries in names"""
+        path = os.path.join(self.lock_dir, HITS_TOTALS)
+        try:
+            os.makedirs(self.lock_dir, exist_ok=True)
+            fd, tmp = tempfile.mkstemp(dir=self.lock_dir)
+            with os.fdopen(fd, "w") as f:
+                for name in names:
+                    if name in hits:
+                        f.write(f"{name} {hits[name][0]} {hits[name][1]:.0f}\n")
+            os.replace(tmp, path)
+            return True
+        except OSError as e:
+            logging.warning(f"Cannot write the cache hits in {path}: {e}")
+            return False
+
+    def get(self, key):
+        # The versions of memoized functions are always read from the directory,
+        # so that delete_memoized in a worker is seen by all the others
+        use_local = not key.endswith(MEMVER_SUFFIX)
+        if use_local:
+            value = self.local.get(key)
+            if value is not MISSING:
+                # Counted as a hit of the file, so that compaction doesn't
+                # evict the entries that are only read from memory
+                self._record_hit(self._get_filename(key))
+                return value
+
+        filename = self._get_filename(key)
+        try:
+            with self._safe_stream_open(filename, "rb") as f:
+                expires = struct.unpack("I", f.read(4))[0]
+                if expires != 0 and expires < time.time():
+                    return None
+                stored_key = self._read_header(f)
+                value = self.serializer.load(f)
+                size = os.fstat(f.fileno()).st_size
+        except FileNotFoundError:
+            return None
+        except (OSError, EOFError, struct.error):
+            logging.warning(f"Cannot read cache file {filename}", exc_info=True)
+            return None
+
+        if stored_key is None and key.endswith(MEMVER_SUFFIX):
+            # Rewrite the versions written by the plain backend with their key,
+            # otherwise the entries of the function cannot be attributed to it
+            self.set(key, value, timeout=0 if expires == 0 else max(expires - int(time.time()), 1))
+        else:
+            self._record_hit(filename)
+            if use_local and value is not None:
+                self.local.set(key, value, expires, value_size(value, size))
+
+        return value
+
+    def set(self, key, value, timeout=None, mgmt_element=False):
+        # The filesystem backend writes the file, EntrySerializer adds the header
+        if not mgmt_element:
+            self._schedule_compaction()
+        self._writing.key = key
+        try:
+            written = super().set(key, value, timeout=timeout, mgmt_element=mgmt_element)
+        finally:
+            self._writing.key = None
+
+        if not written or mgmt_element or key.endswith(MEMVER_SUFFIX):
+            self.local.delete(key)
+        else:
+            try:
+                size = os.path.getsize(self._get_filename(key))
+            except OSError:
+                size = 0
+            self.local.set(key, value, self._expires(timeout), value_size(value, size))
+
+        return written
+
+    def _expires(self, timeout):
+        """Expiry time (0 = never) stored by the filesystem backend for an entry set now"""
+        if timeout is None:
+            timeout = self.default_timeout
+        if isinstance(timeout, datetime.timedelta):
+            timeout = int(timeout.total_seconds())
+
+        return 0 if timeout == 0 else int(time.time()) + timeout
+
+    def delete(self, key, mgmt_element=False):
+        self.local.delete(key)
+
+        return super().delete(key, mgmt_element=mgmt_element)
+
+    def clear(self):
+        self.local.clear()
+
+        return super().clear()
+
+    def invalidate_local(self, key=None):
+        """
+        Drop key (all the keys if None) from the in-process cache of this
+        worker only, e.g. after the directory was modified from outside
+        """
+        if key is None:
+            self.local.clear()
+        else:
+            self.local.delete(key)
+
+    def _schedule_compaction(self):
+        """Start a compaction pass in the background if one is due"""
+        now = time.time()
+        if self.compaction_interval <= 0 or now - self._last_compaction_check < self.compaction_interval:
+            return
+        self._last_compaction_check = now
+        threading.Thread(
+            target=self._background_compaction, name="cache-compaction", daemon=True).start()
+
+    def _background_compaction(self):
+        try:
+            self.compact(if_older_than=self.compaction_interval)
+        except Exception as e:
+            logging.warning(f"Cache compaction failed: {type(e).__name__}: {e}")
+
+    def _entries(self, hits):
+        """
+        Expiry, key, size, hits and time of last use (last hit or write)
+        of all the entries, read from their header
+        """
+        for fname in self._list_dir():
+            try:
+                stat = os.stat(fname)
+                with open(fname, "rb") as f:
+                    try:
+                        expires = struct.unpack("I", f.read(4))[0]
+                        key = self._read_header(f)
+                        version = self.serializer.load(f) if key and key.endswith(MEMVER_SUFFIX) else None
+                    except (EOFError, struct.error, pickle.UnpicklingError):
+                        # Truncated or corrupted: treat it as expired
+                        expires, key, version = 1, None, None
+            except FileNotFoundError:
+                continue
+            except OSError:
+                logging.warning(f"Cannot read cache file {fname}", exc_info=True)
+                continue
+
+            count, last = hits.get(os.path.basename(fname), (0, 0.0))
+            yield {
+                "path": fname,
+                "size": stat.st_size,
+                "mtime": stat.st_mtime,
+                "used": max(stat.st_mtime, last),
+                "expires": expires,
+                "key": key,
+                "hits": count,
+                "version": version,
+            }
+
+    @staticmethod
+    def _versions(entries):
+        """Current version of every memoized function -> name of the function"""
+        return {
+            e["version"]: e["key"][:-len(MEMVER_SUFFIX)]
+            for e in entries if isinstance(e["version"], str)
+        }
+
+    def _value(self, entry, namespace, now):
+        """Entries with the lowest value are evicted first"""
+        weight = self.cost_weights.get(namespace.rsplit(".", 1)[-1], 1)
+        if self.eviction_policy == "lfu":
+            return weight * (entry["hits"] + 1)
+
+        return weight / (now - entry["used"] + 60)
+
+    def _remove(self, path):
+        try:
+            os.remove(path)
+            return True
+        except FileNotFoundError:
+            return False
+        except OSError:
+            logging.warning(f"Cannot remove cache file {path}", exc_info=True)
+            return False
+
+    def _compact(self):
+        now = time.time()
+        self._flush_hits()
+        hits, consumed = self._read_hits(consume=True)
+        entries = list(self._entries(hits))
+        versions = self._versions(entries)
+        stats = {"expired": 0, "evicted": 0, "temporary": 0, "freed_bytes": 0}
+
+        alive = []
+        for entry in entries:
+            if entry["expires"] != 0 and entry["expires"] < now:
+                if self._remove(entry["path"]):
+                    stats["expired"] += 1
+                    stats["freed_bytes"] += entry["size"]
+            else:
+                alive.append(entry)
+
+        for fname in os.listdir(self._path):
+            path = os.path.join(self._path, fname)
+            try:
+                stale = fname.endswith(self._fs_transaction_suffix) and now - os.path.getmtime(path) > STALE_TEMP_AGE
+            except OSError:
+                continue
+            if stale and self._remove(path):
+                stats["temporary"] += 1
+
+        total = sum(entry["size"] for entry in alive)
+        evicted = set()
+        if self.max_bytes and total > self.max_bytes:
+            candidates = sorted(
+                (e for e in alive if not (e["key"] or "").endswith(MEMVER_SUFFIX)),
+                key=lambda e: (self._value(e, entry_namespace(e["key"], versions), now), e["used"]),
+            )
+            for entry in candidates:
+                if total <= self.max_bytes * LOW_WATER_MARK:
+                    break
+                if self._remove(entry["path"]):
+                    stats["evicted"] += 1
+                    stats["freed_bytes"] += entry["size"]
+                    evicted.add(entry["path"])
+                total -= entry["size"]
+
+        # Hits of the removed entries are dropped
+        kept = [os.path.basename(entry["path"]) for entry in alive if entry["path"] not in evicted]
+        if self._write_hit_totals(hits, kept):
+            for path in consumed:
+                self._remove(path)
+
+        if self._threshold != 0:
+            self._update_count(value=len(list(self._list_dir())))
+        stats["size_bytes"] = total
+
+        return stats
+
+    def compact(self, if_older_than=None):
+        """
+        Remove expired entries and leftover temporary files, then evict
+        entries until the cache is within max_bytes. Only one process at a
+        time compacts: returns None if another one is doing it or, with
+        if_older_than, if the last pass was less than if_older_than seconds ago.
+        Otherwise returns some statistics.
+        """
+        if not self._compaction_lock.acquire(blocking=False):
+            return None
+        fd = None
+        try:
+            if fcntl is not None:
+                os.makedirs(self.lock_dir, exist_ok=True)
+                fd = os.open(os.path.join(self.lock_dir, "cache-compaction.lock"), os.O_RDWR | os.O_CREAT, 0o600)
+                try:
+                    fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except BlockingIOError:
+                    return None
+                # The lock file holds the time of the last pass
+                last = float(os.pread(fd, 32, 0) or 0)
+                if if_older_than is not None and time.time() - last < if_older_than:
+                    return None
+
+            started = time.time()
+            stats = self._compact()
+            if fd is not None:
+                os.ftruncate(fd, 0)
+                os.pwrite(fd, str(time.time()).encode(), 0)
+            logging.info(
+                f"Cache compaction in {time.time() - started:.1f}s: {stats['expired']} expired and "
+                f"{stats['evicted']} evicted entries removed, {stats['freed_bytes'] / 2**20:.1f} MB freed, "
+                f"{stats['size_bytes'] / 2**20:.1f} MB in use")
+
+            return stats
+        finally:
+            if fd is not None:
+                os.close(fd)  # also releases the flock
+            self._compaction_lock.release()
+
+    def report(self):
+        """
+        Number of entries, size (also of the expired entries) and hits
+        of the entries of every function, biggest first
+        """
+        now = time.time()
+        self._flush_hits()
+        entries = list(self._entries(self._read_hits()[0]))
+        versions = self._versions(entries)
+        rows = {}
+        for entry in entries:
+            namespace = entry_namespace(entry["key"], versions)
+            row = rows.setdefault(namespace, {
+                "function": namespace, "entries": 0, "bytes": 0, "expired_bytes": 0, "hits": 0})
+            row["entries"] += 1
+            row["bytes"] += entry["size"]
+            row["hits"] += entry["hits"]
+            if entry["expires"] != 0 and entry["expires"] < now:
+                row["expired_bytes"] += entry["size"]
+
+        return sorted(rows.values(), key=lambda row: row["bytes"], reverse=True)
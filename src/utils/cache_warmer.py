@@ -0,0 +1,139 @@
+"""
+Cache warmer: keeps the data of the most popular locations (see
+utils.popularity) fresh in the cache, so that their users never wait for
+an upstream download. To be run as its own process from src, next to the
+app (it never takes a gunicorn worker and runs with a lower priority):
+    python -m utils.cache_warmer          # run forever
+    python -m utils.cache_warmer --once   # a single pass, e.g. from cron
+    python -m utils.cache_warmer --show   # print the popularity ranking
+A pass starts every time one of the warmed models publishes a new run,
+or every CACHE_WARMER_INTERVAL seconds, and stops after CACHE_WARMER_BUDGET
+upstream requests. Entries that are already fresh cost nothing.
+"""
+import argparse
+import os
+import time
+from flask import Flask
+from .settings import (
+    cache,
+    MODEL_META_MAP,
+    MODEL_META_TIMEOUT,
+    CACHE_WARMER_TOP_LOCATIONS,
+    CACHE_WARMER_INTERVAL,
+    CACHE_WARMER_BUDGET,
+    CACHE_WARMER_ENSEMBLE_MODELS,
+)
+from .openmeteo_api import (
+    ENSEMBLE_API,
+    latest_model_run,
+    get_forecast_data,
+    get_ensemble_data,
+    compute_daily_ensemble_meteogram,
+    compute_climatology,
+)
+from .popularity import popular_locations
+from .http_session import requests_sent
+from .variable_cache import is_current_run, wait_for_refreshes
+from .custom_logger import logging
+
+# Same variables requested by the pages, as the cache is split by variable
+FORECAST_VARIABLES = "temperature_2m,precipitation,rain,snowfall,windgusts_10m,cloudcover,winddirection_10m"
+ENSEMBLE_VARIABLES = "temperature_2m,temperature_850hPa,rain,snowfall,cloudcover,wind_speed_10m"
+CLIMATOLOGY_VARIABLES = "temperature_2m_max,temperature_2m_min,sunshine_duration"
+
+
+def warm_tasks(latitude, longitude):
+    """(name, function, kwargs) of the calls made by the pages for a location"""
+    coords = {"latitude": latitude, "longitude": longitude}
+    yield "forecast", get_forecast_data, dict(coords, model="best_match", variables=FORECAST_VARIABLES)
+    for model in CACHE_WARMER_ENSEMBLE_MODELS:
+        yield f"ensemble {model}", get_ensemble_data, dict(
+            coords, model=model, variables=ENSEMBLE_VARIABLES, decimate=True, from_now=True)
+        yield f"meteogram {model}", compute_daily_ensemble_meteogram, dict(coords, model=model)
+    yield "daily climatology", compute_climatology, dict(
+        coords, daily=True, model="era5_seamless", variables=CLIMATOLOGY_VARIABLES)
+
+
+def current_runs():
+    return {
+        model: latest_model_run(model, ENSEMBLE_API)
+        for model in CACHE_WARMER_ENSEMBLE_MODELS if model in MODEL_META_MAP
+    }
+
+
+def run_task(function, kwargs, runs):
+    data = function(**kwargs)
+    wait_for_refreshes()
+    # Aggregations memoized before the last run came out are computed again
+    run = runs.get(kwargs.get("model"))
+    if function is compute_daily_ensemble_meteogram and run is not None and not is_current_run(data, run):
+        cache.delete_memoized(function, **kwargs)
+        function(**kwargs)
+
+
+def warm(top=CACHE_WARMER_TOP_LOCATIONS, budget=CACHE_WARMER_BUDGET):
+    """Single pass over the most popular locations, returns the number of requests sent"""
+    started, start_requests = time.time(), requests_sent()
+    runs = current_runs()
+    locations = popular_locations(top=top)
+    warmed = 0
+    for loc in locations:
+        for name, function, kwargs in warm_tasks(loc["latitude"], loc["longitude"]):
+            if requests_sent() - start_requests >= budget:
+                logging.info(f"Cache warmer: budget of {budget} requests used after {warmed} locations")
+                return requests_sent() - start_requests
+            try:
+                run_task(function, kwargs, runs)
+            except Exception as e:
+                logging.warning(f"Cache warmer: {name} failed for {loc['label']} ({loc['latitude']}, {loc['longitude']}): {type(e).__name__}: {e}")
+        warmed += 1
+
+    used = requests_sent() - start_requests
+    logging.info(f"Cache warmer: {warmed} locations warmed with {used} requests in {time.time() - started:.0f}s")
+
+    return used
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Keep the cache of the most popular locations fresh")
+    parser.add_argument("--once", action="store_true", help="run a single pass and exit")
+    parser.add_argument("--show", action="store_true", help="print the most popular locations and exit")
+    parser.add_argument("--top", type=int, default=CACHE_WARMER_TOP_LOCATIONS)
+    parser.add_argument("--budget", type=int, default=CACHE_WARMER_BUDGET, help="upstream requests per pass")
+    args = parser.parse_args()
+
+    if args.show:
+        for loc in popular_locations(top=args.top):
+            print(f"{loc['score']:8.1f}  {loc['latitude']:9.4f} {loc['longitude']:9.4f}  {loc['label']}")
+        return
+
+    try:
+        # Leave the CPU to the app when running on the same host
+        os.nice(10)
+    except (AttributeError, OSError):
+        pass
+
+    app = Flask(__name__)
+    cache.init_app(app)
+    with app.app_context():
+        if args.once:
+            warm(top=args.top, budget=args.budget)
+            return
+
+        last_runs, last_pass = None, None
+        while True:
+            try:
+                runs = current_runs()
+                if runs != last_runs or last_pass is None or time.monotonic() - last_pass >= CACHE_WARMER_INTERVAL:
+                    if last_runs is not None and runs != last_runs:
+                        logging.info(f"Cache warmer: new runs available {runs}")
+                    last_runs, last_pass = runs, time.monotonic()
+                    warm(top=args.top, budget=args.budget)
+            except Exception as e:
+                logging.warning(f"Cache warmer pass failed: {type(e).__name__}: {e}")
+            # New runs are not seen before the model metadata expires anyway
+            time.sleep(MODEL_META_TIMEOUT)
+
+
+if __name__ == "__main__":
+    main()
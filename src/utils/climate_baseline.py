@@ -0,0 +1,103 @@
+"""
+Climate baseline of a location: statistics of daily variables over a base
+period (usually 1991-2020), computed once and cached as a single object
+(see compute_climate_baseline in utils.openmeteo_api). The pages derive
+their climatologies from it, so that showing another year only needs the
+data of that year.
+"""
+import numpy as np
+import pandas as pd
+from .climate_kernels import calendar_stats, centered_mean
+
+# Quantiles of the daily values kept for every calendar day
+BASELINE_QUANTILES = (0.05, 0.1, 0.25, 0.5, 0.75, 0.9, 0.95)
+
+
+def without_leap_day(data):
+    return data[~((data.time.dt.month == 2) & (data.time.dt.day == 29))]
+
+
+class ClimateBaseline:
+    """
+    Statistics of every variable of a daily frame:
+    days: mean and BASELINE_QUANTILES per calendar day (index doy, "%m%d")
+    accumulated: yearly cumulative sums (29 February excluded), to compute
+    the quantiles of the accumulation on any day
+    monthly: mean over the years of the monthly mean, sum, min and max
+    """
+
+    def __init__(self, variables, start_date, end_date, days, accumulated, monthly, attrs=None):
+        self.variables = variables
+        self.start_date = start_date
+        self.end_date = end_date
+        self.days = days
+        self.accumulated = accumulated
+        self.monthly = monthly
+        self.attrs = attrs or {}
+
+    @classmethod
+    def from_daily(cls, daily, variables, start_date, end_date):
+        daily = daily.sort_values("time").reset_index(drop=True)
+        no_leap = without_leap_day(daily)
+        days, accumulated, monthly = {}, {}, {}
+        for var in variables:
+            days[var] = calendar_stats(daily.time, daily[var], quantiles=BASELINE_QUANTILES)
+            accumulated[var] = pd.DataFrame({
+                "time": no_leap.time.values,
+                "acc": no_leap.groupby(no_leap.time.dt.year)[var].cumsum().values,
+            })
+            months = daily.resample("1ME", on="time")[var]
+            months = pd.DataFrame({
+                "mean": months.mean(),
+                "sum": months.sum(),
+                "min": months.min(),
+                "max": months.max(),
+            })
+            monthly[var] = months.groupby(months.index.month).mean()
+
+        return cls(variables, start_date, end_date, days, accumulated, monthly, attrs=daily.attrs)
+
+    def daily_means(self, variables=None):
+        """Mean of the variables per calendar day, with doy as a column"""
+        variables = variables or self.variables
+        means = pd.DataFrame({"doy": self.days[variables[0]].index.values})
+        for var in variables:
+            means[var] = self.days[var]["mean"].values
+
+        return means
+
+    def daily_climatology(self, var, quantiles=(0.05, 0.95), window=10):
+        """
+        Frame indexed by doy (29 February excluded) with the mean of var
+        ({var}_clima) and its quantiles (q05, q95...) smoothed with a centered
+        rolling mean of window days
+        """
+        days = self.days[var].drop(index="0229", errors="ignore")
+        clima = pd.DataFrame({f"{var}_clima": days["mean"]})
+        for q in quantiles:
+            clima[f"q{round(q * 100):02d}"] = centered_mean(days[q], window=window)
+
+        return clima
+
+    def accumulation_quantiles(self, var, quantiles=(0.05, 0.5, 0.95), window=10):
+        """
+        Quantiles of the yearly accumulation of var on every day of the
+        year (columns day, month and one per quantile) smoothed with a
+        centered rolling mean of window days
+        """
+        accumulated = self.accumulated[var]
+        stats = calendar_stats(accumulated.time, accumulated.acc, quantiles=quantiles)
+        months = stats.index.str[:2].astype(np.int32)
+        days = stats.index.str[2:].astype(np.int32)
+        result = pd.DataFrame({"day": days, "month": months})
+        for q in quantiles:
+            result[q] = centered_mean(stats[q].values, window=window)
+
+        return result
+
+    def monthly_stats(self, var):
+        """Frame indexed by month with the mean monthly mean, sum, min and max of var"""
+        return self.monthly[var]
+
+    def __repr__(self):
+        return f"ClimateBaseline({','.join(self.variables)}, {self.start_date} to {self.end_date})"
@@ -0,0 +1,114 @@
+"""
+NumPy kernels shared by the climatologies.
+Timestamps are mapped once to integer calendar days (and hours), which are
+then used as bins: means come from np.bincount and all the quantiles of all
+the bins from a single sort, instead of grouping on "%m%d" strings and
+running a groupby for every statistic. Results are laid out as the frames
+the pandas versions returned (doy labels as "%m%d").
+"""
+import numpy as np
+import pandas as pd
+
+# Labels of the calendar days, 29 February included
+CALENDAR_DAYS = np.asarray(pd.date_range("2000-01-01", "2000-12-31", freq="1D").strftime("%m%d"))
+CALENDAR_MONTHS = np.asarray([int(doy[:2]) for doy in CALENDAR_DAYS], dtype=np.int32)
+CALENDAR_DAYS_OF_MONTH = np.asarray([int(doy[2:]) for doy in CALENDAR_DAYS], dtype=np.int32)
+
+
+def calendar_day_index(time):
+    """
+    Position (0-365) of every timestamp in CALENDAR_DAYS, so that the same
+    date has the same position in leap and non leap years
+    """
+    time = pd.DatetimeIndex(time)
+    after_february = ~time.is_leap_year & (time.month > 2)
+
+    return np.asarray(time.dayofyear - 1 + after_february, dtype=np.int64)
+
+
+def calendar_day_labels(time):
+    """Same as time.dt.strftime("%m%d")"""
+    return CALENDAR_DAYS[calendar_day_index(time)]
+
+
+def binned_stats(values, bins, nbins, quantiles=()):
+    """
+    Number of values, mean and quantiles (linear interpolation, as pandas)
+    of values in every bin, NaNs excluded. Returns (count, mean, {q: array}),
+    with NaN for the empty bins. All the quantiles come from a single sort.
+    """
+    values = np.asarray(values, dtype=np.float64)
+    valid = ~np.isnan(values)
+    values, bins = values[valid], np.asarray(bins)[valid]
+    count = np.bincount(bins, minlength=nbins)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        mean = np.where(count > 0, np.bincount(bins, weights=values, minlength=nbins) / count, np.nan)
+
+    result = {}
+    if len(quantiles) > 0:
+        # Values sorted by bin and then by value: bin i is at starts[i]:starts[i] + count[i]
+        ordered = values[np.lexsort((values, bins))]
+        starts = np.concatenate(([0], np.cumsum(count)[:-1]))
+        for q in quantiles:
+            position = q * np.maximum(count - 1, 0)
+            below = np.floor(position).astype(np.int64)
+            above = np.ceil(position).astype(np.int64)
+            if ordered.size == 0:
+                result[q] = np.full(nbins, np.nan)
+                continue
+            low = ordered.take(starts + below, mode="clip")
+            high = ordered.take(starts + above, mode="clip")
+            result[q] = np.where(count > 0, low + (high - low) * (position - below), np.nan)
+
+    return count, mean, result
+
+
+def calendar_stats(time, values, quantiles=()):
+    """
+    Mean and quantiles of values per calendar day, as a frame indexed by doy
+    (only the days present in time) with a mean column and one column per quantile
+    """
+    bins = calendar_day_index(time)
+    present = np.flatnonzero(np.bincount(bins, minlength=len(CALENDAR_DAYS)))
+    _, mean, result = binned_stats(values, bins, len(CALENDAR_DAYS), quantiles)
+    stats = pd.DataFrame({"mean": mean[present]}, index=pd.Index(CALENDAR_DAYS[present], name="doy"))
+    for q in quantiles:
+        stats[q] = result[q][present]
+
+    return stats
+
+
+def calendar_means(data, columns=None):
+    """
+    Same as data.groupby(data.time.dt.strftime("%m%d")).mean(numeric_only=True)
+    with doy as a column
+    """
+    if columns is None:
+        columns = [
+            col for col in data.columns
+            if col not in ("time", "doy") and pd.api.types.is_numeric_dtype(data[col])
+        ]
+    bins = calendar_day_index(data["time"])
+    present = np.flatnonzero(np.bincount(bins, minlength=len(CALENDAR_DAYS)))
+    means = pd.DataFrame({"doy": CALENDAR_DAYS[present]})
+    for col in columns:
+        means[col] = binned_stats(data[col], bins, len(CALENDAR_DAYS))[1][present]
+
+    return means
+
+
+def centered_mean(values, window):
+    """
+    Same as pd.Series(values).rolling(window, center=True, min_periods=1).mean(),
+    with cumulative sums
+    """
+    values = np.asarray(values, dtype=np.float64)
+    valid = ~np.isnan(values)
+    sums = np.concatenate(([0.0], np.cumsum(np.where(valid, values, 0.0))))
+    counts = np.concatenate(([0], np.cumsum(valid)))
+    positions = np.arange(values.size)
+    start = np.clip(positions - window // 2, 0, values.size)
+    stop = np.clip(positions + (window - 1) // 2 + 1, 0, values.size)
+    n = counts[stop] - counts[start]
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return np.where(n > 0, (sums[stop] - sums[start]) / n, np.nan)
@@ -0,0 +1,109 @@
+"""
+Streaming computation of the hourly climatology.
+Instead of loading the whole base period (30 years of hourly data) in a
+single frame, the period is downloaded one year at a time and every year is
+folded, as soon as it arrives, into running sums and counts per calendar day
+and hour held in small NumPy arrays (366 x 24 per variable). Memory stays
+bounded by the few years being downloaded, whatever the length of the period.
+"""
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from itertools import islice
+import numpy as np
+import pandas as pd
+from .settings import thread_app_context, HISTORICAL_DOWNLOAD_WORKERS
+from .climate_kernels import CALENDAR_DAYS, calendar_day_index
+
+
+def year_periods(start_date, end_date):
+    """(start, end) dates of every year between start_date and end_date"""
+    start, end = pd.Timestamp(start_date), pd.Timestamp(end_date)
+
+    return [
+        (max(start, pd.Timestamp(year=year, month=1, day=1)).strftime("%Y-%m-%d"),
+         min(end, pd.Timestamp(year=year, month=12, day=31)).strftime("%Y-%m-%d"))
+        for year in range(start.year, end.year + 1)
+    ]
+
+
+class HourlyClimatology:
+    """Running sums and counts of every variable per calendar day and hour"""
+
+    def __init__(self, hourly_freq="1h"):
+        self.hourly_freq = hourly_freq
+        self.variables = None
+        self.sums = None
+        self.counts = None
+        self.rows = np.zeros(len(CALENDAR_DAYS) * 24, dtype=np.int64)
+
+    def add(self, data):
+        """Fold a chunk of data (time column plus one column per variable)"""
+        if self.hourly_freq != "1h":
+            data = data.resample(self.hourly_freq, on="time").first().reset_index()
+        if self.variables is None:
+            self.variables = [
+                col for col in data.columns
+                if col != "time" and pd.api.types.is_numeric_dtype(data[col])
+            ]
+            self.sums = np.zeros((len(self.variables), self.rows.size))
+            self.counts = np.zeros((len(self.variables), self.rows.size), dtype=np.int64)
+        if data.empty:
+            return
+
+        bins = calendar_day_index(data["time"]) * 24 + data["time"].dt.hour.to_numpy()
+        self.rows += np.bincount(bins, minlength=self.rows.size)
+        for i, var in enumerate(self.variables):
+            values = data[var].to_numpy(dtype=np.float64)
+            valid = ~np.isnan(values)
+            self.sums[i] += np.bincount(bins[valid], weights=values[valid], minlength=self.rows.size)
+            self.counts[i] += np.bincount(bins[valid], minlength=self.rows.size)
+
+    def result(self):
+        """Means as a frame with doy (mmdd), hour and one column per variable"""
+        present = np.flatnonzero(self.rows)
+        mean = pd.DataFrame({
+            "doy": CALENDAR_DAYS[present // 24],
+            "hour": (present % 24).astype(np.int32),
+        })
+        for i, var in enumerate(self.variables or []):
+            with np.errstate(invalid="ignore", divide="ignore"):
+                mean[var] = np.where(self.counts[i, present] > 0,
+                                     self.sums[i, present] / self.counts[i, present],
+                                     np.nan)
+
+        return mean.round(1)
+
+
+def fold_periods(fetch, periods, fold, workers=HISTORICAL_DOWNLOAD_WORKERS):
+    """
+    Call fetch(start_date, end_date) for every period, with at most workers
+    downloads at a time, and fold(data) every result as soon as it arrives
+    """
+    periods = iter(periods)
+    # Downloads read and write the cache, which needs the app of the caller
+    app_context = thread_app_context()
+
+    def task(start_date, end_date):
+        with app_context():
+            return fetch(start_date, end_date)
+
+    with ThreadPoolExecutor(max_workers=max(workers, 1)) as pool:
+        pending = {pool.submit(task, *period) for period in islice(periods, max(workers, 1))}
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                fold(future.result())
+                period = next(periods, None)
+                if period is not None:
+                    pending.add(pool.submit(task, *period))
+
+
+def stream_hourly_climatology(fetch, start_date, end_date, hourly_freq="1h"):
+    """
+    Mean of every variable per calendar day and hour between start_date and
+    end_date, where fetch(start_date, end_date) downloads the hourly data of
+    a period (at most a year)
+    """
+    climatology = HourlyClimatology(hourly_freq)
+    fold_periods(fetch, year_periods(start_date, end_date), climatology.add)
+
+    return climatology.result()
@@ -0,0 +1,108 @@
+"""
+Concurrent fetching of the data a page depends on.
+A callback declares its independent dependencies (fetcher plus arguments) and
+fetch_all runs them together in a thread pool, so that a cold request takes
+as long as the slowest download instead of the sum of all of them.
+Dependencies that are already in the cache are called inline, without
+spawning threads. A dependency can have a timeout and a default: when it
+is not ready in time the default is used and the download goes on in the
+background, filling the cache for the next request.
+"""
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from .settings import cache, thread_app_context, PAGE_FETCH_WORKERS
+from .custom_logger import logging
+
+# Default of the dependencies that have to succeed
+REQUIRED = object()
+
+
+class Dependency:
+    """function(**kwargs), with an optional timeout (seconds) and default"""
+
+    def __init__(self, function, timeout=None, default=REQUIRED, **kwargs):
+        self.function = function
+        self.timeout = timeout
+        self.default = default
+        self.kwargs = kwargs
+
+    def __call__(self):
+        return self.function(**self.kwargs)
+
+    @property
+    def name(self):
+        return getattr(self.function, "__name__", repr(self.function))
+
+    def is_cached(self):
+        """
+        Whether the result is already in the cache (only known for the
+        functions decorated with cache.memoize, False otherwise)
+        """
+        function = self.function
+        if not (hasattr(function, "make_cache_key") and hasattr(function, "uncached")):
+            return False
+        try:
+            return cache.has(function.make_cache_key(function.uncached, **self.kwargs))
+        except Exception:
+            return False
+
+
+def _fallback(name, dependency, error):
+    if dependency.default is REQUIRED:
+        raise error
+    logging.warning(f"Dependency {name} ({dependency.name}) failed, using its default: "
+                    f"{type(error).__name__}: {error}")
+
+    return dependency.default
+
+
+def fetch_all(dependencies, workers=PAGE_FETCH_WORKERS):
+    """
+    Results of a dict of Dependency by name. The ones not in the cache run
+    concurrently (at most workers at a time; sequentially, without
+    timeouts, if workers <= 1).
+    Errors and timeouts of dependencies without a default are raised.
+    """
+    cold = [name for name, dependency in dependencies.items() if not dependency.is_cached()]
+    # A single download only needs a thread to be given up after its timeout
+    if workers <= 1 or (len(cold) == 1 and dependencies[cold[0]].timeout is None):
+        cold = []
+
+    results = {}
+    # Fetchers read and write the cache, which needs the app
+    app_context = thread_app_context()
+
+    def run(dependency):
+        with app_context():
+            return dependency()
+
+    pool = ThreadPoolExecutor(max_workers=min(workers, len(cold))) if cold else None
+    try:
+        # Downloads are started first, cached values are read meanwhile
+        start = time.monotonic()
+        futures = {name: pool.submit(run, dependencies[name]) for name in cold}
+        for name, dependency in dependencies.items():
+            if name not in futures:
+                try:
+                    results[name] = dependency()
+                except Exception as e:
+                    results[name] = _fallback(name, dependency, e)
+
+        for name, future in futures.items():
+            dependency = dependencies[name]
+            timeout = None
+            if dependency.timeout is not None:
+                timeout = max(dependency.timeout - (time.monotonic() - start), 0)
+            try:
+                results[name] = future.result(timeout=timeout)
+            except FutureTimeoutError:
+                results[name] = _fallback(
+                    name, dependency, FutureTimeoutError(f"{dependency.name} not ready after {dependency.timeout}s"))
+            except Exception as e:
+                results[name] = _fallback(name, dependency, e)
+    finally:
+        if pool is not None:
+            # Timed out downloads are left running, they will fill the cache
+            pool.shutdown(wait=False)
+
+    return {name: results[name] for name in dependencies}
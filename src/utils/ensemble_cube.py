@@ -0,0 +1,185 @@
+"""
+Ensemble data as a single float32 array of shape (variable, member, time).
+The API returns ensembles as wide frames (temperature_2m for the control run,
+temperature_2m_member01, ... for the other members): EnsembleCube.from_frame
+parses the column names once and copies all the members in one block, so that
+consumers index a variable instead of matching columns with regexes, and the
+statistics over the members (percentiles, exceedance probabilities, daily
+reductions) are single NumPy calls on the member axis.
+"""
+import re
+import warnings
+from contextlib import contextmanager
+import numpy as np
+import pandas as pd
+
+# Control run (member 0) is the bare variable name
+MEMBER_COLUMN = re.compile(r"(?P<var>.+?)(?:_member(?P<member>0[1-9]|[1-9][0-9]))?$")
+
+
+def member_column(var, member):
+    return var if member == 0 else f"{var}_member{member:02d}"
+
+
+class EnsembleCube:
+    """
+    values: float32 array (variable, member, time), NaN where a member is missing
+    available: bool array (variable, member), False for the members of a
+    variable that were not in the frame
+    members: member numbers along the member axis, 0 is the control run
+    """
+
+    def __init__(self, values, variables, members, time, available=None, attrs=None):
+        self.values = values
+        self.variables = list(variables)
+        self.members = np.asarray(members, dtype=np.int64)
+        self.time = pd.DatetimeIndex(time)
+        self.available = np.ones(values.shape[:2], dtype=bool) if available is None else available
+        self.attrs = attrs or {}
+        self._index = {var: i for i, var in enumerate(self.variables)}
+
+    @classmethod
+    def from_frame(cls, df, variables=None, dtype=np.float32):
+        """
+        Cube of variables (all the numeric ones by default) of a wide ensemble
+        frame. Variables that are not in the frame have no members (all NaN).
+        Use dtype=np.float64 to keep the values exactly as in the frame (e.g.
+        for labels and hover texts).
+        """
+        if isinstance(variables, str):
+            variables = [variables]
+        found = {}
+        for col in df.columns:
+            # Variables without any value come as columns of None
+            if col == "time" or not (pd.api.types.is_numeric_dtype(df[col]) or df[col].isna().all()):
+                continue
+            match = MEMBER_COLUMN.match(col)
+            var, member = match["var"], int(match["member"] or 0)
+            if variables is None or var in variables:
+                found.setdefault(var, {})[member] = col
+        variables = list(variables or found)
+        members = sorted({member for columns in found.values() for member in columns})
+        position = {member: i for i, member in enumerate(members)}
+
+        columns, var_index, member_index = [], [], []
+        for i, var in enumerate(variables):
+            for member, col in found.get(var, {}).items():
+                columns.append(col)
+                var_index.append(i)
+                member_index.append(position[member])
+
+        values = np.full((len(variables), len(members), len(df)), np.nan, dtype=dtype)
+        available = np.zeros((len(variables), len(members)), dtype=bool)
+        if columns:
+            values[var_index, member_index] = df[columns].to_numpy(dtype=dtype).T
+            available[var_index, member_index] = True
+        time = df["time"] if "time" in df.columns else df.index
+
+        return cls(values, variables, members, time, available, attrs=dict(df.attrs))
+
+    def to_frame(self, variables=None):
+        """Wide frame with time and one column per member, named as the API does"""
+        variables = variables or self.variables
+        blocks, columns = [], []
+        for var in variables:
+            i = self._index[var]
+            blocks.append(self.values[i][self.available[i]])
+            columns += [member_column(var, member) for member in self.members[self.available[i]]]
+        data = pd.DataFrame(np.concatenate(blocks).T if blocks else None, columns=columns)
+        data.insert(0, "time", self.time)
+        data.attrs = dict(self.attrs)
+
+        return data
+
+    def __contains__(self, var):
+        return var in self._index
+
+    def __getitem__(self, var):
+        """(member, time) array of the members of var (all NaN if it has none)"""
+        i = self._index[var]
+        if self.available[i].all() or not self.available[i].any():
+            return self.values[i]
+
+        return self.values[i][self.available[i]]
+
+    def columns(self, var):
+        """Names of the columns of var in the wide frame"""
+        i = self._index[var]
+
+        return [member_column(var, member) for member in self.members[self.available[i]]]
+
+    def size(self, var):
+        """Number of members of var"""
+        return int(self.available[self._index[var]].sum())
+
+    @property
+    def control(self):
+        """Position of the control run along the member axis (None if missing)"""
+        position = np.flatnonzero(self.members == 0)
+
+        return int(position[0]) if position.size else None
+
+    def reduce(self, var, how="mean"):
+        """mean, min, max or sum over the members (float64, NaNs skipped)"""
+        reductions = {"mean": np.nanmean, "min": np.nanmin, "max": np.nanmax, "sum": np.nansum}
+        with empty_rows():
+            return reductions[how](self[var].astype(np.float64), axis=0)
+
+    def mean(self, var):
+        return self.reduce(var, "mean")
+
+    def percentiles(self, var, q):
+        """
+        Quantiles q (a number or a list, linear interpolation as pandas) over
+        the members, with shape (time,) or (len(q), time)
+        """
+        with empty_rows():
+            return np.nanquantile(self[var].astype(np.float64), q, axis=0)
+
+    def exceedance(self, var, threshold, inclusive=True):
+        """Fraction of the members of var above (or equal to) threshold"""
+        values = self[var]
+        above = values >= threshold if inclusive else values > threshold
+
+        return above.sum(axis=0) / values.shape[0]
+
+    def daily(self, how="mean", variables=None):
+        """
+        Cube with one value per local day and member, reduced with how (mean,
+        min, max or sum; NaNs skipped, sum of no values is 0 as in pandas).
+        Only the days with data are kept; times have to be sorted.
+        """
+        variables = variables or self.variables
+        index = [self._index[var] for var in variables]
+        values = self.values[index]
+        days = self.time.normalize()
+        starts = np.flatnonzero(np.r_[True, days[1:] != days[:-1]]) if len(days) else np.array([], dtype=np.int64)
+        if starts.size == 0:
+            reduced = values[..., :0]
+        elif how == "min":
+            reduced = np.fmin.reduceat(values, starts, axis=-1)
+        elif how == "max":
+            reduced = np.fmax.reduceat(values, starts, axis=-1)
+        else:
+            valid = ~np.isnan(values)
+            reduced = np.add.reduceat(np.where(valid, values, 0), starts, axis=-1, dtype=np.float64)
+            if how == "mean":
+                with np.errstate(invalid="ignore", divide="ignore"):
+                    reduced = reduced / np.add.reduceat(valid, starts, axis=-1)
+            elif how != "sum":
+                raise ValueError(f"Unknown daily reduction {how}")
+
+        return EnsembleCube(reduced.astype(values.dtype), variables, self.members, days[starts],
+                            self.available[index], attrs=dict(self.attrs))
+
+    def __repr__(self):
+        return (f"EnsembleCube({','.join(self.variables)}, {self.values.shape[1]} members, "
+                f"{len(self.time)} times)")
+
+
+@contextmanager
+def empty_rows():
+    """Times without members give NaN, as in pandas, without a RuntimeWarning"""
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", RuntimeWarning)
+        yield
@@ -0,0 +1,147 @@
+"""
+Decimation of the ensemble data to a coarser (3 hourly) resolution, used when
+showing long timeseries. Every column is reduced according to the group of
+its variable in ENSEMBLE_VARS (DECIMATION_TABLE): instantaneous variables keep
+the first value of every period, accumulated ones the sum over the preceding
+hours and preceding hour maxima the maximum, as pandas would do with
+rolling(window, on="time") followed by resample(window, origin=first time).first().
+When the times are whole hours the columns of every aggregation are reduced
+together as a single (hour, column) array reshaped to (period, hour, column),
+otherwise the pandas version is used.
+"""
+from functools import lru_cache
+import numpy as np
+import pandas as pd
+from .settings import ENSEMBLE_VARS
+from .ensemble_cube import MEMBER_COLUMN
+
+# Aggregation of every group of ENSEMBLE_VARS. Preceding hour minima have
+# always been shown as instantaneous values
+GROUP_AGGREGATION = {
+    "Instantaneous": "first",
+    "Accumulated": "sum",
+    "Preceding hour maximum": "max",
+    "Preceding hour minimum": "first",
+}
+DECIMATION_TABLE = {
+    item["value"]: GROUP_AGGREGATION[group["group"]]
+    for group in ENSEMBLE_VARS
+    for item in group["items"]
+}
+# Order of the columns in the decimated frame
+AGGREGATIONS = ("first", "sum", "max")
+
+
+@lru_cache(maxsize=4096)
+def aggregation(column):
+    """Aggregation of a column (None to drop it)"""
+    var = MEMBER_COLUMN.match(column)["var"]
+    if var in DECIMATION_TABLE:
+        return DECIMATION_TABLE[var]
+    # Other variables go with the first one contained in their name
+    # (e.g. precipitation_probability is accumulated)
+    return next((how for name, how in DECIMATION_TABLE.items() if name in column), None)
+
+
+def _hour_offsets(time):
+    """Hours since the first time, None if they are not whole and increasing"""
+    hours = ((time - time.iloc[0]) / pd.Timedelta("1h")).to_numpy()
+    if np.isnan(hours).any() or (np.diff(hours) <= 0).any() or (hours != np.round(hours)).any():
+        return None
+
+    return hours.astype(np.int64)
+
+
+def _window(grid, how, hours):
+    """
+    Sum or maximum over the last hours (times in (t - hours, t]) of every
+    hour of grid, NaN if no values
+    """
+    shifted = np.full((hours,) + grid.shape, np.nan)
+    for lag in range(hours):
+        shifted[hours - 1 - lag, lag:] = grid[:grid.shape[0] - lag]
+    if how == "max":
+        return np.fmax.reduce(shifted, axis=0)
+    valid = ~np.isnan(shifted).all(axis=0)
+
+    return np.where(valid, np.nansum(shifted, axis=0), np.nan)
+
+
+def _decimate_grid(data, columns, offsets, hours):
+    """(periods, columns) block of every aggregation"""
+    periods = offsets[-1] // hours + 1
+    blocks = {}
+    for how, cols in columns.items():
+        grid = np.full((periods * hours, len(cols)), np.nan)
+        grid[offsets] = data[cols].to_numpy(dtype=np.float64)
+        if how != "first":
+            # Aggregated values only exist at the times of the data
+            present = np.zeros(grid.shape[0], dtype=bool)
+            present[offsets] = True
+            grid = _window(grid, how, hours)
+            grid[~present] = np.nan
+        # First value (not NaN) of every period
+        grid = grid.reshape(periods, hours, len(cols))
+        first = grid[:, hours - 1]
+        for hour in range(hours - 2, -1, -1):
+            first = np.where(np.isnan(grid[:, hour]), first, grid[:, hour])
+        blocks[how] = first
+
+    return blocks
+
+
+def _decimate_pandas(data, columns, hours):
+    window = f"{hours}h"
+    frames = []
+    for how, cols in columns.items():
+        frame = data[["time"] + cols]
+        if how != "first":
+            frame = frame.rolling(window=window, on="time").agg(how)
+        frames.append(frame.resample(window, on="time", origin=data["time"].iloc[0]).first())
+
+    return pd.concat(frames, axis=1).reset_index()
+
+
+def decimate(data, hours=3):
+    """
+    Data every hours, starting from the first time, with the columns
+    reduced according to DECIMATION_TABLE
+    """
+    if data.empty:
+        return data
+    columns = {}
+    for col in data.columns:
+        how = aggregation(col) if col != "time" else None
+        if how is not None:
+            columns.setdefault(how, []).append(col)
+    columns = {how: columns[how] for how in AGGREGATIONS if how in columns}
+
+    offsets = _hour_offsets(data["time"])
+    if offsets is None:
+        return _decimate_pandas(data, columns, hours)
+
+    blocks = _decimate_grid(data, columns, offsets, hours)
+    names = [col for cols in columns.values() for col in cols]
+    result = pd.DataFrame(np.hstack(list(blocks.values())) if blocks else None, columns=names)
+    # Instantaneous values keep their type (as resample.first) unless periods are missing
+    dtypes = dict(zip(data.columns, data.dtypes))
+    for i, col in enumerate(columns.get("first", [])):
+        if dtypes[col] != np.float64 and (dtypes[col].kind == "f" or not np.isnan(blocks["first"][:, i]).any()):
+            result[col] = result[col].astype(dtypes[col])
+    time = data["time"].iloc[0] + pd.to_timedelta(np.arange(len(result)) * hours, unit="h")
+    result.insert(0, "time", time)
+
+    return result
+
+
+def decimate_after(data, keep="48h", hours=3):
+    """
+    Keep the first keep of data untouched, and decimate what comes
+    hours later with decimate
+    """
+    if data.empty:
+        return data
+    start = data["time"].iloc[0] + pd.to_timedelta(keep)
+    after = data.loc[data.time >= start + pd.to_timedelta(hours, unit="h"), :]
+
+    return pd.concat([data.loc[data.time <= start, :], decimate(after, hours)]).reset_index(drop=True)
@@ -2,6 +2,7 @@ import json
 import dash_leaflet as dl
 from utils.settings import MAPBOX_API_KEY, ASSETS_DIR
 import numpy as np
+import pandas as pd
 
 def estimate_legend_rows(items, avail_px=1300, entry_overhead_px=45, char_px=6.5):
     """Greedily pack a horizontal legend's entries into rows sized by each
@@ -64,6 +65,22 @@ def add_attribution(fig, text="Created with PointWx - hh.guidocioni.it/pointwx")
     )
     return fig
 
+
+def add_data_age(fig, data):
+    """
+    Record in the figure metadata (layout.meta) when the data shown was
+    downloaded and how old it is, as cached data may be served while it is
+    being refreshed. Returns the same fig, like add_attribution.
+    """
+    fetched_at = data.attrs.get("fetched_at")
+    if fetched_at is not None:
+        fig.update_layout(meta={
+            "data_fetched_at": fetched_at.isoformat(),
+            "data_age_seconds": int((pd.Timestamp.now(tz="UTC") - fetched_at).total_seconds()),
+        })
+    return fig
+
+
 def get_weather_icons(
     df,
     icons_path=f"{ASSETS_DIR}/yrno_png_reduced/",
@@ -115,6 +132,31 @@ def get_precip_yaxis_max(value, padding=1.1):
     return padded
 
 
+def bin_counts(values, bins, right=False):
+    """
+    Number of values in every bin for every row of a (time, member) array,
+    as an array (time, len(bins) - 1), computed for all the rows at once.
+    Bins are [a, b) with the last one closed, as np.histogram, or (a, b]
+    with right=True, as pd.cut. NaNs and values outside the bins are not counted.
+    """
+    values = np.asarray(values)
+    edges = np.asarray(bins)
+    n_bins = len(edges) - 1
+    index = np.searchsorted(edges, values, side="left" if right else "right") - 1
+    if not right:
+        index[(index == n_bins) & (values == edges[-1])] = n_bins - 1
+    valid = (index >= 0) & (index < n_bins)
+    rows = np.broadcast_to(np.arange(values.shape[0])[:, None], values.shape)
+    counts = np.bincount(rows[valid] * n_bins + index[valid], minlength=values.shape[0] * n_bins)
+
+    return counts.reshape(values.shape[0], n_bins)
+
+
+def bin_percentages(values, bins, right=False):
+    """bin_counts as percentage of the members (NaNs included)"""
+    return bin_counts(values, bins, right) / np.shape(values)[1] * 100
+
+
 def attach_alpha_to_hex_color(alpha, color):
     """Apply opacity to an hex color
 
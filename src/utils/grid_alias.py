@@ -0,0 +1,102 @@
+"""
+Cache aliasing of nearby coordinates.
+Open-Meteo snaps every requested point to a cell of the model grid, so
+two clicks a few hundred metres apart usually return exactly the same data
+but end up in two different cache entries. For models on a regular grid
+(MODEL_GRID_SPACING) we keep, for every grid cell, the coordinates of the
+first request that hit it: later requests in the same cell, with a similar
+elevation, are sent with those coordinates and so reuse the cached data.
+"""
+from functools import wraps
+from .settings import (
+    cache,
+    MODEL_GRID_SPACING,
+    GRID_ALIAS_ELEVATION_TOLERANCE,
+    GRID_ALIAS_TIMEOUT,
+)
+from .single_flight import canonical_arguments
+from .custom_logger import logging
+
+
+def grid_cell(latitude, longitude, spacing):
+    """
+    Nearest node of the regular grid(s) with the given spacing (degrees).
+    Seamless models combine more grids, so a cell is identified by the
+    nearest node on each of them.
+    """
+    nodes = []
+    for step in spacing:
+        lat = round(round(float(latitude) / step) * step, 4)
+        lon = round(round(float(longitude) / step) * step, 4)
+        lon = round((lon + 180) % 360 - 180, 4)
+        nodes.append(f"{lat}/{lon}")
+
+    return "|".join(nodes)
+
+
+def resolve_alias(model, latitude, longitude, elevation, cell_selection):
+    """
+    Return the coordinates (latitude, longitude) to be used in place of
+    the given ones: either the ones of a previous request in the same grid cell
+    with an elevation within GRID_ALIAS_ELEVATION_TOLERANCE, or the input
+    ones (which are then registered for the next requests).
+    """
+    key = f"grid-alias:{model}:{cell_selection}:{grid_cell(latitude, longitude, MODEL_GRID_SPACING[model])}"
+    entries = cache.get(key) or []
+    for entry in entries:
+        if abs(entry["elevation"] - elevation) <= GRID_ALIAS_ELEVATION_TOLERANCE:
+            return entry["latitude"], entry["longitude"]
+
+    entries.append({"latitude": latitude, "longitude": longitude, "elevation": elevation})
+    cache.set(key, entries, timeout=GRID_ALIAS_TIMEOUT)
+
+    return latitude, longitude
+
+
+def cached_elevation(get_elevation, latitude, longitude):
+    """
+    Elevation of the point if the memoized get_elevation already has it
+    in the cache, None otherwise (no request is sent)
+    """
+    if not hasattr(get_elevation, "make_cache_key"):
+        return None
+
+    return cache.get(get_elevation.make_cache_key(get_elevation.uncached, latitude=latitude, longitude=longitude))
+
+
+def grid_aliased(get_elevation):
+    """
+    Decorator to be placed on top of the functions with latitude, longitude
+    and model arguments. When the call doesn't specify an elevation (the API
+    downscales the data to it) the one cached by get_elevation(latitude,
+    longitude) is used: if it is not cached the alias is skipped, so that
+    uncached calls don't wait for an additional request.
+    """
+    def decorator(f):
+        @wraps(f)
+        def wrapper(*args, **kwargs):
+            arguments = canonical_arguments(f, args, kwargs)
+            model = arguments.get("model")
+            if model not in MODEL_GRID_SPACING:
+                return f(**arguments)
+
+            try:
+                # The API uses the elevation of the point when not given (or 0)
+                elevation = arguments.get("elevation") or cached_elevation(
+                    get_elevation, arguments["latitude"], arguments["longitude"])
+                if elevation is not None:
+                    arguments["latitude"], arguments["longitude"] = resolve_alias(
+                        model,
+                        arguments["latitude"],
+                        arguments["longitude"],
+                        float(elevation),
+                        arguments.get("cell_selection", "land"),
+                    )
+            except Exception as e:
+                logging.warning(f"Cannot resolve grid cell alias, using the original coordinates: {type(e).__name__}: {e}")
+
+            return f(**arguments)
+
+        return wrapper
+
+    return decorator
@@ -0,0 +1,152 @@
+"""
+Harmonic (Fourier) representation of the hourly climatology.
+Instead of a 366 x 24 table, every variable is described by a few dozen
+coefficients of annual and diurnal harmonics (plus their products, so that
+the daily cycle can change with the season), fitted by least squares over
+the base period. The normal equations are accumulated year by year, like
+the table in utils.climatology, so the hourly data is never in memory at once.
+The coefficients can also be built from daily max, min and mean only (no
+hourly download) with a cosine daily cycle peaking at DIURNAL_PEAK_HOUR.
+Evaluating them at any time is a vectorized sum of cosines.
+"""
+import numpy as np
+import pandas as pd
+from .climate_kernels import calendar_day_labels
+
+# Local hour of the maximum of the daily cycle, when built from daily data
+DIURNAL_PEAK_HOUR = 15
+
+
+def phases(time):
+    """Annual and diurnal phase (radians) of every timestamp (local time)"""
+    time = pd.DatetimeIndex(time)
+    hours = time.hour + time.minute / 60
+
+    return (2 * np.pi * (time.dayofyear - 1 + hours / 24) / 365.25,
+            2 * np.pi * hours / 24)
+
+
+def design_matrix(time, annual, diurnal, mixed):
+    """
+    Columns: constant, cos/sin of the annual harmonics 1..annual, of the
+    diurnal harmonics 1..diurnal, and the products of the annual harmonics
+    1..mixed with all the diurnal ones
+    """
+    year, day = phases(time)
+    columns = [np.ones(len(year))]
+    for k in range(1, annual + 1):
+        columns += [np.cos(k * year), np.sin(k * year)]
+    for j in range(1, diurnal + 1):
+        columns += [np.cos(j * day), np.sin(j * day)]
+    for k in range(1, mixed + 1):
+        for j in range(1, diurnal + 1):
+            columns += [
+                np.cos(k * year) * np.cos(j * day),
+                np.cos(k * year) * np.sin(j * day),
+                np.sin(k * year) * np.cos(j * day),
+                np.sin(k * year) * np.sin(j * day),
+            ]
+
+    return np.column_stack(columns)
+
+
+class HarmonicClimatology:
+    """Coefficients of design_matrix for every variable"""
+
+    def __init__(self, coefficients, annual, diurnal, mixed, attrs=None):
+        self.coefficients = coefficients
+        self.annual = annual
+        self.diurnal = diurnal
+        self.mixed = mixed
+        self.attrs = attrs or {}
+
+    @property
+    def variables(self):
+        return list(self.coefficients)
+
+    def evaluate(self, time, variables=None):
+        """Frame with time and the climatological value of every variable"""
+        X = design_matrix(time, self.annual, self.diurnal, self.mixed)
+        data = pd.DataFrame({"time": pd.DatetimeIndex(time)})
+        for var in variables or self.variables:
+            data[var] = X @ self.coefficients[var]
+
+        return data
+
+    def table(self, variables=None):
+        """Same layout as compute_climatology(daily=False): doy, hour and the variables"""
+        data = self.evaluate(pd.date_range("2000-01-01", "2000-12-31 23:00", freq="1h"), variables)
+        table = pd.DataFrame({
+            "doy": calendar_day_labels(data["time"]),
+            "hour": data["time"].dt.hour.astype(np.int32),
+        })
+
+        return pd.concat([table, data.drop(columns="time").round(1)], axis=1)
+
+
+class HarmonicFit:
+    """Normal equations of the least squares fit, accumulated chunk by chunk"""
+
+    def __init__(self, annual=3, diurnal=2, mixed=2):
+        self.annual, self.diurnal, self.mixed = annual, diurnal, mixed
+        self.normal = {}
+        self.attrs = {}
+
+    def add(self, data):
+        """Fold a chunk of hourly data (time column plus one column per variable)"""
+        if not self.attrs:
+            self.attrs = dict(data.attrs)
+        if data.empty:
+            return
+        X = design_matrix(data["time"], self.annual, self.diurnal, self.mixed)
+        for var in data.columns:
+            if var == "time" or not pd.api.types.is_numeric_dtype(data[var]):
+                continue
+            y = data[var].to_numpy(dtype=np.float64)
+            valid = ~np.isnan(y)
+            XtX, Xty = self.normal.get(var, (0.0, 0.0))
+            self.normal[var] = (XtX + X[valid].T @ X[valid], Xty + X[valid].T @ y[valid])
+
+    def result(self):
+        coefficients = {
+            var: np.linalg.lstsq(XtX, Xty, rcond=None)[0]
+            for var, (XtX, Xty) in self.normal.items()
+        }
+
+        return HarmonicClimatology(coefficients, self.annual, self.diurnal, self.mixed, self.attrs)
+
+
+def from_daily(daily, variables, annual=3, peak_hour=DIURNAL_PEAK_HOUR):
+    """
+    HarmonicClimatology of hourly variables built from their daily
+    {var}_mean, {var}_max and {var}_min columns: annual harmonics of the
+    mean, plus a cosine daily cycle peaking at peak_hour with an amplitude
+    given by the annual harmonics of the daily range
+    """
+    # Daily values are centered at noon
+    time = pd.DatetimeIndex(daily["time"]) + pd.Timedelta(hours=12)
+    X = design_matrix(time, annual, 0, 0)
+    peak = 2 * np.pi * peak_hour / 24
+    coefficients = {}
+    for var in variables:
+        columns = [f"{var}_mean", f"{var}_max", f"{var}_min"]
+        missing = [col for col in columns if col not in daily.columns]
+        if missing:
+            raise ValueError(f"Cannot build the daily cycle of {var} without {', '.join(missing)}")
+        valid = daily[columns].notna().all(axis=1).to_numpy()
+        mean = np.linalg.lstsq(X[valid], daily.loc[valid, f"{var}_mean"].to_numpy(), rcond=None)[0]
+        half_range = np.linalg.lstsq(
+            X[valid], (daily.loc[valid, f"{var}_max"] - daily.loc[valid, f"{var}_min"]).to_numpy() / 2,
+            rcond=None)[0]
+        # range(t) * cos(day - peak) expanded on the terms of design_matrix
+        diurnal = half_range[0] * np.array([np.cos(peak), np.sin(peak)])
+        mixed = [
+            c * np.array([np.cos(peak), np.sin(peak)])
+            for c in half_range[1:]
+        ]
+        mixed = np.concatenate([
+            np.concatenate([mixed[2 * k], mixed[2 * k + 1]]) for k in range(annual)
+        ]) if annual else np.array([])
+        coefficients[var] = np.concatenate([mean, diurnal, mixed])
+
+    return HarmonicClimatology(coefficients, annual, 1, annual, dict(daily.attrs))
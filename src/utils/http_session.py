@@ -0,0 +1,78 @@
+"""
+Shared HTTP transport for all the upstream APIs (open-meteo, mapbox, ...).
+Every worker keeps a single requests.Session with a keep-alive connection
+pool per upstream host, so that consecutive requests don't pay a new
+TCP+TLS handshake every time.
+"""
+import os
+import threading
+import requests as r
+from requests.adapters import HTTPAdapter
+from .settings import (
+    HTTP_CONNECT_TIMEOUT,
+    HTTP_READ_TIMEOUT,
+    HTTP_DEFAULT_POOL_SIZE,
+    HTTP_POOL_SIZES,
+)
+
+_session = None
+_session_pid = None
+_session_lock = threading.Lock()
+_requests_sent = 0
+
+
+def _create_session():
+    session = r.Session()
+    session.headers.update({
+        "Accept-Encoding": "gzip, deflate",
+        "User-Agent": "point_wx",
+    })
+    default_adapter = HTTPAdapter(
+        pool_connections=HTTP_DEFAULT_POOL_SIZE,
+        pool_maxsize=HTTP_DEFAULT_POOL_SIZE,
+    )
+    session.mount("https://", default_adapter)
+    session.mount("http://", default_adapter)
+    for host, pool_size in HTTP_POOL_SIZES.items():
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        # The commercial API is served from the same hosts prefixed with customer-
+        session.mount(f"https://{host}", adapter)
+        session.mount(f"https://customer-{host}", adapter)
+
+    return session
+
+
+def get_session():
+    """
+    Return the session of the current worker process.
+    The session is re-created after a fork (e.g. gunicorn --preload)
+    so that workers never share sockets with the parent process.
+    """
+    global _session, _session_pid
+    pid = os.getpid()
+    if _session is None or _session_pid != pid:
+        with _session_lock:
+            if _session is None or _session_pid != pid:
+                _session = _create_session()
+                _session_pid = pid
+
+    return _session
+
+
+def http_get(url, params=None, timeout=None, **kwargs):
+    """
+    Drop-in replacement for requests.get that goes through the shared session.
+    timeout defaults to (HTTP_CONNECT_TIMEOUT, HTTP_READ_TIMEOUT).
+    """
+    global _requests_sent
+    if timeout is None:
+        timeout = (HTTP_CONNECT_TIMEOUT, HTTP_READ_TIMEOUT)
+    with _session_lock:
+        _requests_sent += 1
+
+    return get_session().get(url, params=params, timeout=timeout, **kwargs)
+
+
+def requests_sent():
+    """Number of upstream requests sent by this process (e.g. to enforce a budget)"""
+    return _requests_sent
@@ -0,0 +1,98 @@
+"""
+In-process cache (L1) in front of the shared cache backend (L2).
+Every worker keeps the most recently used values in memory, bounded
+by size, so that hot entries are served without reading and deserializing
+the cache file. Entries never outlive the L2 entry they were read from
+and are dropped when the key is set or deleted through this worker.
+Hits served from memory are still counted by the L2 backend, so that its
+eviction sees the entries as used.
+Values are copied on the way in and on the way out, as callers are free
+to modify what they get.
+"""
+import copy
+import threading
+import time
+from collections import OrderedDict
+import pandas as pd
+
+MISSING = object()
+
+
+def value_size(value, default):
+    """Memory used by value, when we can tell, otherwise default (e.g. size on disk)"""
+    if isinstance(value, pd.DataFrame):
+        return int(value.memory_usage(deep=True).sum())
+    if isinstance(value, pd.Series):
+        return int(value.memory_usage(deep=True))
+
+    return default
+
+
+class LocalCache:
+    def __init__(self, max_bytes, ttl):
+        """
+        max_bytes: memory budget of the values (0 disables the cache)
+        ttl: maximum lifetime (seconds) of an entry, even if the L2 entry lives longer.
+        Entries set by other workers are only seen after this.
+        """
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.size = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self):
+        return self.max_bytes > 0 and self.ttl > 0
+
+    def get(self, key):
+        """A copy of the value, or MISSING"""
+        if not self.enabled:
+            return MISSING
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return MISSING
+            value, expires, nbytes = entry
+            if expires < time.time():
+                del self._entries[key]
+                self.size -= nbytes
+                return MISSING
+            self._entries.move_to_end(key)
+
+        return copy.deepcopy(value)
+
+    def set(self, key, value, expires, nbytes):
+        """
+        Store a copy of value. expires is the expiry time (epoch) of the L2
+        entry, 0 if it never expires. Values bigger than a quarter of the
+        budget are not kept, as they would push out everything else.
+        """
+        if not self.enabled:
+            return
+        if nbytes > self.max_bytes / 4:
+            self.delete(key)
+            return
+        limit = time.time() + self.ttl
+        expires = limit if expires == 0 else min(expires, limit)
+        value = copy.deepcopy(value)
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self.size -= old[2]
+            self._entries[key] = (value, expires, nbytes)
+            self.size += nbytes
+            while self.size > self.max_bytes and self._entries:
+                _, (_, _, evicted) = self._entries.popitem(last=False)
+                self.size -= evicted
+
+    def delete(self, key):
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self.size -= old[2]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.size = 0
@@ -1,13 +1,13 @@
-import requests as r
 import json
 import hashlib
 from .settings import cache, MAPBOX_API_KEY, MAPBOX_API_PLACES_URL
+from .http_session import http_get
 
 
 @cache.memoize(3600)
 def get_place_address_reverse(lon, lat):
     url = f"{MAPBOX_API_PLACES_URL}/{lon},{lat}.json?&access_token={MAPBOX_API_KEY}&limit=1"
-    response = r.get(url)
+    response = http_get(url)
     json_data = json.loads(response.text)
 
     # Latitude and longitude will always be in the response
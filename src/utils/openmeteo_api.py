@@ -1,10 +1,32 @@
 import pandas as pd
-import requests as r
 import numpy as np
 import re
-from functools import reduce
-from .settings import cache, OPENMETEO_KEY, ENSEMBLE_VARS, MODEL_META_MAP
+import copy
+from .settings import (
+    cache,
+    OPENMETEO_KEY,
+    OPENMETEO_BATCH_SIZE,
+    OPENMETEO_FORMAT,
+    MODEL_META_MAP,
+    FORECAST_MODEL_META_MAP,
+    MODEL_META_TIMEOUT,
+    FORECAST_MAX_DAYS,
+)
 from .custom_logger import logging, time_this_func
+from .http_session import http_get
+from .single_flight import single_flight
+from .variable_cache import cache_by_variable, split_variables
+from .year_segments import cache_by_year
+from .point_archive import point_archived
+from .climatology import stream_hourly_climatology, fold_periods, year_periods
+from .harmonic_climatology import HarmonicFit, from_daily as harmonics_from_daily
+from .climate_kernels import calendar_day_labels
+from .climate_baseline import ClimateBaseline
+from .ensemble_cube import EnsembleCube
+from .ensemble_decimation import decimate, decimate_after
+from .grid_alias import grid_aliased
+from .concurrent_fetch import Dependency, fetch_all
+from . import openmeteo_binary
 
 
 def weather_code_to_precip_type(weather_code):
@@ -53,12 +75,55 @@ def make_request(url, payload):
         payload['apikey'] = OPENMETEO_KEY
 
     logging.debug(f"{'Commercial' if OPENMETEO_KEY else 'Free'} API | Sending request, payload={payload}, url={url}")
-    resp = r.get(url=url, params=payload)
+    resp = http_get(url, params=payload)
     resp.raise_for_status()
 
     return resp
 
 
+def fetch_data(url, payload, response_format=None):
+    """
+    Send the request and return the decoded response, a dict (or a list of
+    dicts for multiple locations) shaped like the JSON output.
+    response_format is either 'json' or 'flatbuffers' (defaults to OPENMETEO_FORMAT).
+    If the binary response cannot be obtained or decoded we fall back to JSON.
+    """
+    if (response_format or OPENMETEO_FORMAT) == "flatbuffers":
+        if not openmeteo_binary.is_available():
+            logging.warning("openmeteo-sdk is not installed, falling back to JSON")
+        else:
+            try:
+                resp = openmeteo_binary.decode_response(
+                    make_request(url, dict(payload, format="flatbuffers")).content,
+                    payload)
+                return resp[0] if len(resp) == 1 else resp
+            except Exception as e:
+                logging.warning(
+                    f"Cannot use flatbuffers response, falling back to JSON: {type(e).__name__}: {e}")
+
+    return make_request(url, payload).json()
+
+
+FORECAST_API = "https://api.open-meteo.com"
+ENSEMBLE_API = "https://ensemble-api.open-meteo.com"
+
+
+def latest_model_run(model, base_url=ENSEMBLE_API):
+    """
+    Availability time of the latest run of model, or None if the
+    model has no run metadata (or it cannot be fetched right now)
+    """
+    try:
+        meta = get_model_meta(model, base_url=base_url)
+    except Exception as e:
+        logging.warning(f"Cannot get run metadata for model={model}: {type(e).__name__}: {e}")
+        return None
+    if not meta:
+        return None
+
+    return meta.get("last_run_availability_time")
+
+
 @cache.memoize(86400)
 def get_locations(name, count=10, language='en'):
     """
@@ -114,7 +179,7 @@ def get_elevation(latitude=53.55, longitude=9.99):
         return None
 
 
-@cache.memoize(1800)
+@grid_aliased(get_elevation)
 def get_forecast_data(latitude=53.55,
                       longitude=9.99,
                       variables="temperature_2m",
@@ -127,15 +192,110 @@ def get_forecast_data(latitude=53.55,
                       end_date=None,
                       minutes_15=False,
                       cell_selection='land',
-                      elevation=None):
-    # For the accumulated variables
-    if "accumulated_precip" in variables:
-        variables = variables.replace("accumulated_precip", "precipitation")
-    if "accumulated_liquid" in variables:
-        variables = variables.replace("accumulated_liquid", "rain")
-    if "accumulated_snow" in variables:
-        variables = variables.replace("accumulated_snow", "snowfall")
+                      elevation=None,
+                      response_format=None,
+                      download_max_days=True):
+    """
+    Get the forecast data.
+    Unless a date range is requested, the data is always downloaded (and cached)
+    for FORECAST_MAX_DAYS days and then cut to forecast_days, so that changing
+    forecast_days or from_now doesn't trigger a new download.
+    Callers whose result is cached by forecast_days anyway (e.g. the many
+    variables of get_vertical_data) set download_max_days=False to only
+    download the days they show.
+    """
+    download_days, view_days = _forecast_days_split(
+        forecast_days, start_date, end_date, download_max_days)
+
+    data = _download_forecast_data(latitude=latitude,
+                                   longitude=longitude,
+                                   variables=_api_variables(variables),
+                                   timezone=timezone,
+                                   model=model,
+                                   forecast_days=download_days,
+                                   past_days=past_days,
+                                   start_date=start_date,
+                                   end_date=end_date,
+                                   minutes_15=minutes_15,
+                                   cell_selection=cell_selection,
+                                   elevation=elevation,
+                                   response_format=response_format)
+
+    return _forecast_view(data,
+                          forecast_days=view_days,
+                          past_days=past_days,
+                          from_now=from_now)
+
+
+def _api_variables(variables, daily=False):
+    """
+    Variables as they are downloaded: the accumulated ones are computed
+    from the corresponding hourly variable (or daily sum)
+    """
+    accumulated = {
+        "accumulated_precip": "precipitation",
+        "accumulated_liquid": "rain",
+        "accumulated_snow": "snowfall",
+    }
+    suffix = "_sum" if daily else ""
+
+    return ",".join(split_variables(
+        [accumulated[var] + suffix if var in accumulated else var
+         for var in split_variables(variables)]))
+
+
+def _forecast_days_split(forecast_days, start_date, end_date, download_max_days=True):
+    """
+    Return the number of days to download and the number of days
+    to show (None to show everything that was downloaded)
+    """
+    if start_date or end_date or not download_max_days:
+        return forecast_days, None
+
+    # 7 is the default of the API when forecast_days is not given
+    return FORECAST_MAX_DAYS, forecast_days or 7
+
+
+@single_flight
+@cache_by_variable(1800, get_run=lambda kwargs: latest_model_run(kwargs["model"], FORECAST_API))
+def _download_forecast_data(latitude,
+                            longitude,
+                            variables,
+                            timezone,
+                            model,
+                            forecast_days,
+                            past_days,
+                            start_date,
+                            end_date,
+                            minutes_15,
+                            cell_selection,
+                            elevation,
+                            response_format):
+    payload = _forecast_payload(latitude=latitude,
+                                longitude=longitude,
+                                variables=variables,
+                                timezone=timezone,
+                                model=model,
+                                forecast_days=forecast_days,
+                                past_days=past_days,
+                                start_date=start_date,
+                                end_date=end_date,
+                                minutes_15=minutes_15,
+                                cell_selection=cell_selection,
+                                elevation=elevation)
+
+    resp = fetch_data(
+        "https://api.open-meteo.com/v1/forecast",
+        payload,
+        response_format)
+
+    return _forecast_frame(resp, payload, minutes_15=minutes_15)
+
 
+def _forecast_payload(latitude, longitude, variables, timezone, model,
+                      forecast_days, past_days, start_date, end_date,
+                      minutes_15, cell_selection, elevation):
+    # The accumulated variables are already mapped by _api_variables
     payload = {
         "latitude": latitude,
         "longitude": longitude,
@@ -156,24 +316,20 @@ def get_forecast_data(latitude=53.55,
     if elevation:
         payload['elevation'] = elevation
 
-    resp = make_request(
-        "https://api.open-meteo.com/v1/forecast",
-        payload).json()
+    return payload
 
+
+def _forecast_frame(resp, payload, minutes_15):
+    """
+    Frame as downloaded, cached by _download_forecast_data.
+    Everything that depends on how the data is shown is done in _forecast_view.
+    """
     data = pd.DataFrame.from_dict(resp["hourly" if not minutes_15 else "minutely_15"])
     data['time'] = pd.to_datetime(
         data['time']).dt.tz_localize(resp['timezone'], ambiguous='NaT', nonexistent='NaT')
 
     data = data.dropna(subset=data.columns[data.columns != 'time'],
                        how='all')
-    # Optionally subset data to start only from previous hour
-    if from_now:
-        data = data[
-            data.time
-            >= (pd.to_datetime("now", utc=True) - pd.to_timedelta("1hour"))
-            .tz_convert(resp["timezone"])
-            .floor("h")
-        ]
 
     # Units conversion
     for col in data.columns[data.columns.str.contains('snow_depth')]:
@@ -181,29 +337,6 @@ def get_forecast_data(latitude=53.55,
     for col in data.columns[data.columns.str.contains('sunshine_duration')]:
         data[col] = data[col] / 3600.  # s to hrs
 
-
-    # Compute accumulated variables
-    # Comment if not needed
-    # Note that we have to change the name of the resulting accumulated variables
-    # so as not to conflict with the functions that always request data using columns.str.contains()
-    if data.columns.str.contains("precipitation").any():
-        prec_acc = data.loc[:, data.columns.str.contains("precipitation")].cumsum()
-        prec_acc.columns = prec_acc.columns.str.replace(
-            "precipitation", "accumulated_precip"
-        )
-        data = data.merge(prec_acc, left_index=True, right_index=True)
-    if data.columns.str.contains("rain").any():
-        rain_acc = data.loc[:, data.columns.str.contains("rain")].cumsum()
-        rain_acc.columns = rain_acc.columns.str.replace("rain", "accumulated_liquid")
-        data = data.merge(rain_acc, left_index=True, right_index=True)
-    if data.columns.str.contains("snowfall").any():
-        snowfall_acc = data.loc[:, data.columns.str.contains("snowfall")].cumsum()
-        snowfall_acc.columns = snowfall_acc.columns.str.replace(
-            "snowfall", "accumulated_snow"
-        )
-        data = data.merge(snowfall_acc, left_index=True, right_index=True)
-
-
     # Add metadata (experimental)
     data.attrs = {x: resp[x] for x in resp if x not in [
         "hourly", "daily"]}
@@ -212,6 +345,61 @@ def get_forecast_data(latitude=53.55,
     return data
 
 
+def _select_days(data, forecast_days, past_days):
+    """
+    Keep the same days that the API would have returned for
+    forecast_days and past_days if the request was sent now
+    """
+    today = pd.to_datetime("now", utc=True).tz_convert(data.attrs["timezone"]).tz_localize(None).normalize()
+    days = data['time'].dt.tz_localize(None).dt.normalize()
+    selected = (days >= today - pd.to_timedelta(past_days or 0, unit='D')) & (
+        days < today + pd.to_timedelta(forecast_days, unit='D'))
+
+    return data[selected | data['time'].isna()]
+
+
+def _add_accumulated(data, variables):
+    """
+    Add the accumulated version of some variables (precipitation, rain, snowfall...)
+    as running sum over the whole period shown.
+    variables maps the name of the variable to the name of the accumulated one.
+    Note that we have to change the name of the resulting accumulated variables
+    so as not to conflict with the functions that always request data using columns.str.contains()
+    """
+    for var, acc_name in variables.items():
+        if data.columns.str.contains(var).any():
+            acc = data.loc[:, data.columns.str.contains(var)].cumsum()
+            acc.columns = acc.columns.str.replace(var, acc_name)
+            data = data.merge(acc, left_index=True, right_index=True)
+
+    return data
+
+
+def _forecast_view(data, forecast_days, past_days, from_now):
+    attrs = data.attrs
+    if forecast_days:
+        data = _select_days(data, forecast_days, past_days)
+    # Optionally subset data to start only from previous hour
+    if from_now:
+        data = data[
+            data.time
+            >= (pd.to_datetime("now", utc=True) - pd.to_timedelta("1hour"))
+            .tz_convert(attrs["timezone"])
+            .floor("h")
+        ]
+
+    # Compute accumulated variables
+    # Comment if not needed
+    data = _add_accumulated(data, {
+        "precipitation": "accumulated_precip",
+        "rain": "accumulated_liquid",
+        "snowfall": "accumulated_snow",
+    })
+    data.attrs = copy.deepcopy(attrs)
+
+    return data
+
+
 @cache.memoize(1800)
 def get_vertical_data(
         latitude=53.55,
@@ -243,7 +431,8 @@ def get_vertical_data(
                            past_days=past_days,
                            start_date=start_date,
                            end_date=end_date,
-                           variables=vars)
+                           variables=vars,
+                           download_max_days=False)
     # Drop columns that contain all missing values
     df = df.dropna(axis=1, how='all')
     # Create array representation useful to plot
@@ -263,7 +452,9 @@ def get_vertical_data(
     return df, variables, time_axis, vertical_levels, arrs
 
 
-@cache.memoize(21600)
+@grid_aliased(get_elevation)
+@single_flight
+@cache_by_variable(21600, get_run=lambda kwargs: latest_model_run(kwargs["model"], FORECAST_API))
 def get_forecast_daily_data(latitude=53.55,
                             longitude=9.99,
                             variables="precipitation_sum",
@@ -274,7 +465,31 @@ def get_forecast_daily_data(latitude=53.55,
                             start_date=None,
                             end_date=None,
                             cell_selection='land',
-                            elevation=None):
+                            elevation=None,
+                            response_format=None):
+    payload = _forecast_daily_payload(latitude=latitude,
+                                      longitude=longitude,
+                                      variables=variables,
+                                      timezone=timezone,
+                                      model=model,
+                                      forecast_days=forecast_days,
+                                      past_days=past_days,
+                                      start_date=start_date,
+                                      end_date=end_date,
+                                      cell_selection=cell_selection,
+                                      elevation=elevation)
+
+    resp = fetch_data(
+        "https://api.open-meteo.com/v1/forecast",
+        payload,
+        response_format)
+
+    return _forecast_daily_frame(resp, payload)
+
+
+def _forecast_daily_payload(latitude, longitude, variables, timezone, model,
+                            forecast_days, past_days, start_date, end_date,
+                            cell_selection, elevation):
     payload = {
         "latitude": latitude,
         "longitude": longitude,
@@ -295,10 +510,10 @@ def get_forecast_daily_data(latitude=53.55,
     if elevation:
         payload['elevation'] = elevation
 
-    resp = make_request(
-        "https://api.open-meteo.com/v1/forecast",
-        payload).json()
+    return payload
+
 
+def _forecast_daily_frame(resp, payload):
     data = pd.DataFrame.from_dict(resp['daily'])
     data['time'] = pd.to_datetime(
         data['time']).dt.tz_localize(resp['timezone'], ambiguous='NaT', nonexistent='NaT')
@@ -317,7 +532,7 @@ def get_forecast_daily_data(latitude=53.55,
     return data
 
 
-@cache.memoize(43200)
+@grid_aliased(get_elevation)
 def get_ensemble_daily_data(latitude=53.55,
                             longitude=9.99,
                             variables="precipitation_sum",
@@ -328,7 +543,13 @@ def get_ensemble_daily_data(latitude=53.55,
                             start_date=None,
                             end_date=None,
                             cell_selection='land',
-                            elevation=None):
+                            elevation=None,
+                            response_format=None):
+    """
+    Get the daily ensemble data.
+    The accumulated variables are computed, after the cache, from the
+    corresponding daily sums.
+    """
     if not forecast_days and not start_date and not end_date:
         # Adjust forecast_days depending on the model
         if model == "icon_eu":
@@ -341,14 +562,37 @@ def get_ensemble_daily_data(latitude=53.55,
             forecast_days = 11
         else: # icon_seamlss and global fall in this category!
             forecast_days = 8
-    # For the accumulated variables
-    if "accumulated_precip" in variables:
-        variables = variables.replace("accumulated_precip", "precipitation_sum")
-    if "accumulated_liquid" in variables:
-        variables = variables.replace("accumulated_liquid", "rain_sum")
-    if "accumulated_snow" in variables:
-        variables = variables.replace("accumulated_snow", "snowfall_sum")
 
+    data = _download_ensemble_daily_data(latitude=latitude,
+                                         longitude=longitude,
+                                         variables=_api_variables(variables, daily=True),
+                                         timezone=timezone,
+                                         model=model,
+                                         forecast_days=forecast_days,
+                                         past_days=past_days,
+                                         start_date=start_date,
+                                         end_date=end_date,
+                                         cell_selection=cell_selection,
+                                         elevation=elevation,
+                                         response_format=response_format)
+
+    return _ensemble_daily_accumulated(data)
+
+
+@single_flight
+@cache_by_variable(43200, get_run=lambda kwargs: latest_model_run(kwargs["model"], ENSEMBLE_API))
+def _download_ensemble_daily_data(latitude,
+                                  longitude,
+                                  variables,
+                                  timezone,
+                                  model,
+                                  forecast_days,
+                                  past_days,
+                                  start_date,
+                                  end_date,
+                                  cell_selection,
+                                  elevation,
+                                  response_format):
     payload = {
         "latitude": latitude,
         "longitude": longitude,
@@ -369,9 +613,10 @@ def get_ensemble_daily_data(latitude=53.55,
     if elevation:
         payload['elevation'] = elevation
 
-    resp = make_request(
+    resp = fetch_data(
         "https://ensemble-api.open-meteo.com/v1/ensemble",
-        payload).json()
+        payload,
+        response_format)
 
     data = pd.DataFrame.from_dict(resp['daily'])
     data['time'] = pd.to_datetime(
@@ -383,10 +628,20 @@ def get_ensemble_daily_data(latitude=53.55,
     for col in data.columns[data.columns.str.contains('sunshine_duration')]:
         data[col] = data[col] / 3600.  # s to hrs
 
+    # Add metadata (experimental)
+    data.attrs = {x: resp[x] for x in resp if x not in [
+        "hourly", "daily"]}
+    data.attrs["request"] = payload
+
+    return data
+
+
+def _ensemble_daily_accumulated(data):
     # Compute accumulated variables
     # Comment if not needed
     # Note that we have to change the name of the resulting accumulated variables
     # so as not to conflict with the functions that always request data using columns.str.contains()
+    attrs = data.attrs
     if data.columns.str.contains("precipitation_sum").any():
         prec_acc = data.loc[:, data.columns.str.contains("precipitation_sum")].cumsum()
         prec_acc.columns = prec_acc.columns.str.replace(
@@ -403,23 +658,20 @@ def get_ensemble_daily_data(latitude=53.55,
             "snowfall_sum", "accumulated_snow"
         )
         data = data.merge(snowfall_acc, left_index=True, right_index=True)
-
-    # Add metadata (experimental)
-    data.attrs = {x: resp[x] for x in resp if x not in [
-        "hourly", "daily"]}
-    data.attrs["request"] = payload
+    data.attrs = attrs
 
     return data
 
 
-@cache.memoize(1800)
-def get_model_meta(model, base_url="https://ensemble-api.open-meteo.com"):
+@cache.memoize(MODEL_META_TIMEOUT)
+def get_model_meta(model, base_url=ENSEMBLE_API):
     """
     Get run metadata (e.g. last initialisation time) for a model, with
     epoch-seconds fields parsed into UTC timestamps.
     Returns None if the model has no meta.json (e.g. seamless models).
     """
-    meta_model = MODEL_META_MAP.get(model)
+    meta_map = MODEL_META_MAP if base_url == ENSEMBLE_API else FORECAST_MODEL_META_MAP
+    meta_model = meta_map.get(model)
     if meta_model is None:
         return None
 
@@ -439,7 +691,7 @@ def get_model_meta(model, base_url="https://ensemble-api.open-meteo.com"):
     return resp
 
 
-@cache.memoize(3600)
+@grid_aliased(get_elevation)
 def get_ensemble_data(
     latitude=53.55,
     longitude=9.99,
@@ -452,29 +704,100 @@ def get_ensemble_data(
     elevation=None,
     forecast_days=None,
     start_date=None,
-    end_date=None
+    end_date=None,
+    response_format=None
 ):
     """
-    Get the ensemble data
+    Get the ensemble data.
+    The data is downloaded (and cached) for the whole horizon of the model,
+    from_now, decimate and forecast_days are applied afterwards so that
+    changing them doesn't trigger a new download.
+    """
+    forecast_days, view_days = _ensemble_days_split(model, forecast_days, start_date, end_date)
+
+    data = _download_ensemble_data(latitude=latitude,
+                                   longitude=longitude,
+                                   variables=_api_variables(variables),
+                                   timezone=timezone,
+                                   model=model,
+                                   cell_selection=cell_selection,
+                                   elevation=elevation,
+                                   forecast_days=forecast_days,
+                                   start_date=start_date,
+                                   end_date=end_date,
+                                   response_format=response_format)
+
+    return _ensemble_view(data, model=model, forecast_days=view_days,
+                          from_now=from_now, decimate=decimate)
+
+
+@single_flight
+@cache_by_variable(3600, get_run=lambda kwargs: latest_model_run(kwargs["model"], ENSEMBLE_API))
+def _download_ensemble_data(latitude,
+                            longitude,
+                            variables,
+                            timezone,
+                            model,
+                            cell_selection,
+                            elevation,
+                            forecast_days,
+                            start_date,
+                            end_date,
+                            response_format):
+    payload = _ensemble_payload(latitude=latitude,
+                                longitude=longitude,
+                                variables=variables,
+                                timezone=timezone,
+                                model=model,
+                                cell_selection=cell_selection,
+                                elevation=elevation,
+                                forecast_days=forecast_days,
+                                start_date=start_date,
+                                end_date=end_date)
+
+    resp = fetch_data("https://ensemble-api.open-meteo.com/v1/ensemble", payload, response_format)
+
+    return _ensemble_frame(resp, payload)
+
+
+def _ensemble_days_split(model, forecast_days, start_date, end_date):
+    """
+    Return the number of days to download (None for the whole horizon
+    of the model) and the number of days to show (None to show everything)
     """
+    if not start_date and not end_date and forecast_days and forecast_days <= _ensemble_max_days(model):
+        return None, forecast_days
+
+    return forecast_days, None
+
+
+def _ensemble_max_days(model):
+    """
+    Number of forecast days available for an ensemble model
+    """
+    if model == "icon_eu":
+        return 6
+    elif model in ["icon_d2",  "ukmo_uk_ensemble_2km"]:
+        return 3
+    elif model == "gfs05":
+        return 35
+    elif model in ["gfs_seamless", "gem_global", "ncep_aigefs025", "google_weathernext2_ensemble", "ecmwf_ifs025", "ecmwf_aifs025"]:
+        return 16
+    elif model in ["gfs025", "bom_access_global_ensemble"]:
+        return 11
+    elif model == "meteoswiss_icon_ch1":
+        return 2
+    elif model == "meteoswiss_icon_ch2":
+        return 1
+    else: # icon_seamlss and global fall in this category!
+        return 8
+
+
+def _ensemble_payload(latitude, longitude, variables, timezone, model,
+                      cell_selection, elevation, forecast_days, start_date, end_date):
     if not forecast_days and not start_date and not end_date:
         # Adjust forecast_days depending on the model
-        if model == "icon_eu":
-            forecast_days = 6
-        elif model in ["icon_d2",  "ukmo_uk_ensemble_2km"]:
-            forecast_days = 3
-        elif model == "gfs05":
-            forecast_days = 35
-        elif model in ["gfs_seamless", "gem_global", "ncep_aigefs025", "google_weathernext2_ensemble", "ecmwf_ifs025", "ecmwf_aifs025"]:
-            forecast_days = 16
-        elif model in ["gfs025", "bom_access_global_ensemble"]:
-            forecast_days = 11
-        elif model == "meteoswiss_icon_ch1":
-            forecast_days = 2
-        elif model == "meteoswiss_icon_ch2":
-            forecast_days = 1
-        else: # icon_seamlss and global fall in this category!
-            forecast_days = 8
+        forecast_days = _ensemble_max_days(model)
     # For the accumulated variables
     if "accumulated_precip" in variables:
         variables = variables.replace("accumulated_precip", "precipitation")
@@ -498,8 +821,14 @@ def get_ensemble_data(
     if elevation:
         payload["elevation"] = elevation
 
-    resp = make_request("https://ensemble-api.open-meteo.com/v1/ensemble", payload).json()
+    return payload
+
 
+def _ensemble_frame(resp, payload):
+    """
+    Frame as downloaded, cached by _download_ensemble_data.
+    Everything that depends on how the data is shown is done in _ensemble_view.
+    """
     data = pd.DataFrame.from_dict(resp["hourly"])
     data["time"] = pd.to_datetime(data["time"]).dt.tz_localize(
         resp["timezone"], ambiguous="NaT", nonexistent="NaT"
@@ -507,249 +836,94 @@ def get_ensemble_data(
 
     data = data.dropna(subset=data.columns[data.columns != "time"], how="all")
 
+    # Units conversion
+    for col in data.columns[data.columns.str.contains("snow_depth")]:
+        data[col] = data[col] * 100.0  # m to cm
+    for col in data.columns[data.columns.str.contains("sunshine_duration")]:
+        data[col] = data[col] / 3600.0  # s to hrs
+
+    # Add metadata (experimental)
+    data.attrs = {
+        x: resp[x] for x in resp if x not in ["hourly", "daily"]
+    }
+    data.attrs["request"] = payload
+
+    return data
+
+
+def _ensemble_view(data, model, forecast_days, from_now, decimate):
+    attrs = data.attrs
+    if forecast_days:
+        data = _select_days(data, forecast_days, past_days=None)
     # Optionally subset data to start only from previous hour
     if from_now:
         data = data[
             data.time
             >= (pd.to_datetime("now", utc=True) - pd.to_timedelta('1hour'))
-            .tz_convert(resp["timezone"])
+            .tz_convert(attrs["timezone"])
             .floor("h")
         ]
 
     # Optionally decimate data to a 3 hourly resolution
     # This is useful when visualising a long timeseries
     if decimate:
-        if model in [
-            "gfs_seamless",
-            "gfs05",
-            "gfs025",
-            "ecmwf_ifs025",
-            "ecmwf_aifs025",
-            "gem_global",
-            "bom_access_global_ensemble",
-            "ncep_aigefs025"
-        ]:
-            # The original data for all these models is 3 hourly, so there is no added
-            # value in showing hourly data. Here we decimate every 3 hours considering
-            # as starting point the first time value
-            # which means that, in case the from_now option is activated, it will start
-            # resampling every 3 hours from that starting point, otherwise it will resample
-            # at 0, 3, 6, 9, 12, 18, as the data always starts at 00 UTC.
-            #
-            acc_vars = None
-            acc_vars_regex = "|".join(
-                [
-                    item["value"]
-                    for group in ENSEMBLE_VARS
-                    if group["group"] == "Accumulated"
-                    for item in group["items"]
-                ]
-            )
-            if any(data.columns.str.contains(acc_vars_regex)):
-                # Consider only the variables that are defined as accumulation over the last hour
-                # First we do a rolling sum over the same period (3 hours) and then take only the
-                # first value
-                acc_vars = (
-                    data.loc[
-                        :,
-                        data.columns.str.contains("time|" + acc_vars_regex),
-                    ]
-                    .rolling(window="3h", on="time")
-                    .sum()
-                    .resample("3h", on="time", origin=data.iloc[0]["time"])
-                    .first()
-                )
-            inst_vars = None
-            inst_vars_regex = "|".join(
-                [
-                    item["value"]
-                    for group in ENSEMBLE_VARS
-                    if group["group"] == "Instantaneous"
-                    for item in group["items"]
-                ]
-            )
-            if any(data.columns.str.contains(inst_vars_regex)):
-                # Now the variables that are instantaneous
-                # In this case we can just take the first value directly every 3 hours
-                inst_vars = (
-                    data.loc[
-                        :,
-                        data.columns.str.contains(
-                            "time|" + inst_vars_regex
-                        ),
-                    ]
-                    .resample("3h", on="time", origin=data.iloc[0]["time"])
-                    .first()
-                )
-            max_vars = None
-            max_vars_regex = "|".join(
-                [
-                    item["value"]
-                    for group in ENSEMBLE_VARS
-                    if group["group"] == "Preceding hour maximum"
-                    for item in group["items"]
-                ]
-            )
-            if any(data.columns.str.contains(max_vars_regex)):
-                # Now variables with different aggregations (like preceding hour maximum)
-                max_vars = (
-                    data.loc[:, data.columns.str.contains("time|" + max_vars_regex)]
-                    .rolling(window="3h", on="time")
-                    .max()
-                    .resample("3h", on="time", origin=data.iloc[0]["time"])
-                    .first()
-                )
-            # Now merge everything together and overwrite the original data
-            dfs = [inst_vars, acc_vars, max_vars]
-            # Remove None objects
-            dfs = [df for df in dfs if df is not None]
-            # Merge all dataframes
-            data = reduce(
-                lambda left, right: pd.merge(
-                    left, right, left_index=True, right_index=True
-                ),
-                dfs,
-            )
-            data = data.reset_index()
-        elif model in ["icon_seamless", "icon_global", "icon_eu", "ukmo_global_ensemble_20km", "ukmo_uk_ensemble_2km"]:
-            # For these models we want to preserve the original hourly resolution
-            # because it is the original one! Actually, for ICON-EPS the data
-            # is every 6 hours, but I don't want to implement a different logic
-            # just for that....
-            # We leave the first 48 hrs untouched, and then decimate every 3 hours
-            # NOTE that we count 48 hrs from the first time value. In case from_now = True
-            # is activated, it could mean
-            # NOTE icon_d2 is not here because we don't need to do anything in that case
-            t48_start_date = data.iloc[0]["time"] + pd.to_timedelta("48h")
-            after_48_hrs = data.loc[
-                data.time >= t48_start_date + pd.to_timedelta("3h"), :
-            ]
-            # For this section does the same trick as before
-            acc_vars = None
-            acc_vars_regex = "|".join(
-                [
-                    item["value"]
-                    for group in ENSEMBLE_VARS
-                    if group["group"] == "Accumulated"
-                    for item in group["items"]
-                ]
-            )
-            if any(
-                after_48_hrs.columns.str.contains(
-                    acc_vars_regex
-                )
-            ):
-                acc_vars = (
-                    after_48_hrs.loc[
-                        :,
-                        after_48_hrs.columns.str.contains(
-                            "time|" + acc_vars_regex
-                        ),
-                    ]
-                    .rolling(window="3h", on="time")
-                    .sum()
-                    .resample("3h", on="time", origin=after_48_hrs.iloc[0]["time"])
-                    .first()
-                )
-            inst_vars = None
-            inst_vars_regex = "|".join(
-                [
-                    item["value"]
-                    for group in ENSEMBLE_VARS
-                    if group["group"] == "Instantaneous"
-                    for item in group["items"]
-                ]
-            )
-            if any(
-                after_48_hrs.columns.str.contains(
-                    inst_vars_regex
-                )
-            ):
-                inst_vars = (
-                    after_48_hrs.loc[
-                        :,
-                        after_48_hrs.columns.str.contains(
-                            "time|" + inst_vars_regex
-                        ),
-                    ]
-                    .resample("3h", on="time", origin=after_48_hrs.iloc[0]["time"])
-                    .first()
-                )
-            max_vars = None
-            max_vars_regex = "|".join(
-                [
-                    item["value"]
-                    for group in ENSEMBLE_VARS
-                    if group["group"] == "Preceding hour maximum"
-                    for item in group["items"]
-                ]
-            )
-            if any(after_48_hrs.columns.str.contains(max_vars_regex)):
-                max_vars = (
-                    after_48_hrs.loc[
-                        :, after_48_hrs.columns.str.contains("time|" + max_vars_regex)
-                    ]
-                    .rolling(window="3h", on="time")
-                    .max()
-                    .resample("3h", on="time", origin=after_48_hrs.iloc[0]["time"])
-                    .first()
-                )
-            # Now merge everything together and overwrite the original data
-            dfs = [inst_vars, acc_vars, max_vars]
-            # Remove None objects
-            dfs = [df for df in dfs if df is not None]
-            # Merge all dataframes
-            after_48_hrs = reduce(
-                lambda left, right: pd.merge(
-                    left, right, left_index=True, right_index=True
-                ),
-                dfs,
-            )
-            after_48_hrs = after_48_hrs.reset_index()
-            data = pd.concat(
-                [data.loc[data.time <= t48_start_date, :], after_48_hrs]
-            ).reset_index(drop=True)
-
-    # Units conversion
-    for col in data.columns[data.columns.str.contains("snow_depth")]:
-        data[col] = data[col] * 100.0  # m to cm
-    for col in data.columns[data.columns.str.contains("sunshine_duration")]:
-        data[col] = data[col] / 3600.0  # s to hrs
+        data = _decimate_ensemble(data, model)
 
     # Compute accumulated variables
     # Comment if not needed
-    # Note that we have to change the name of the resulting accumulated variables
-    # so as not to conflict with the functions that always request data using columns.str.contains()
-    if data.columns.str.contains("precipitation").any():
-        prec_acc = data.loc[:, data.columns.str.contains("precipitation")].cumsum()
-        prec_acc.columns = prec_acc.columns.str.replace(
-            "precipitation", "accumulated_precip"
-        )
-        data = data.merge(prec_acc, left_index=True, right_index=True)
-    if data.columns.str.contains("rain").any():
-        rain_acc = data.loc[:, data.columns.str.contains("rain")].cumsum()
-        rain_acc.columns = rain_acc.columns.str.replace("rain", "accumulated_liquid")
-        data = data.merge(rain_acc, left_index=True, right_index=True)
-    if data.columns.str.contains("snowfall").any():
-        snowfall_acc = data.loc[:, data.columns.str.contains("snowfall")].cumsum()
-        snowfall_acc.columns = snowfall_acc.columns.str.replace(
-            "snowfall", "accumulated_snow"
-        )
-        data = data.merge(snowfall_acc, left_index=True, right_index=True)
+    data = _add_accumulated(data, {
+        "precipitation": "accumulated_precip",
+        "rain": "accumulated_liquid",
+        "snowfall": "accumulated_snow",
+    })
+    data.attrs = copy.deepcopy(attrs)
 
-    # Add metadata (experimental)
-    data.attrs = {
-        x: resp[x] for x in resp if x not in ["hourly", "daily"]
-    }
-    data.attrs["request"] = payload
+    return data
+
+
+def _decimate_ensemble(data, model):
+    """
+    Decimate data to a 3 hourly resolution.
+    This is useful when visualising a long timeseries
+    """
+    if model in [
+        "gfs_seamless",
+        "gfs05",
+        "gfs025",
+        "ecmwf_ifs025",
+        "ecmwf_aifs025",
+        "gem_global",
+        "bom_access_global_ensemble",
+        "ncep_aigefs025"
+    ]:
+        # The original data for all these models is 3 hourly, so there is no added
+        # value in showing hourly data. Here we decimate every 3 hours considering
+        # as starting point the first time value
+        # which means that, in case the from_now option is activated, it will start
+        # resampling every 3 hours from that starting point, otherwise it will resample
+        # at 0, 3, 6, 9, 12, 18, as the data always starts at 00 UTC.
+        data = decimate(data, hours=3)
+    elif model in ["icon_seamless", "icon_global", "icon_eu", "ukmo_global_ensemble_20km", "ukmo_uk_ensemble_2km"]:
+        # For these models we want to preserve the original hourly resolution
+        # because it is the original one! Actually, for ICON-EPS the data
+        # is every 6 hours, but I don't want to implement a different logic
+        # just for that....
+        # We leave the first 48 hrs untouched, and then decimate every 3 hours
+        # NOTE that we count 48 hrs from the first time value. In case from_now = True
+        # is activated, it could mean
+        # NOTE icon_d2 is not here because we don't need to do anything in that case
+        data = decimate_after(data, keep="48h", hours=3)
 
     return data
 
 
-# As historical data is in the past, it never changes
-# so we can safely set these functions to infinite timeout
-# They will only be re-computed if the parameters change
-@cache.memoize(31536000)
+# As historical data is in the past, it never changes: it is cached
+# by year, so that only the current year is ever downloaded again,
+# and kept in the point archive, so that only the new days are downloaded
+@grid_aliased(get_elevation)
+@single_flight
+@cache_by_year()
+@point_archived("hourly")
 def get_historical_data(latitude=53.55,
                         longitude=9.99,
                         variables='temperature_2m',
@@ -758,7 +932,8 @@ def get_historical_data(latitude=53.55,
                         start_date='1991-01-01',
                         end_date='2020-12-31',
                         elevation=None,
-                        cell_selection='land'):
+                        cell_selection='land',
+                        response_format=None):
     """
     Get historical data for a point
     """
@@ -776,9 +951,10 @@ def get_historical_data(latitude=53.55,
     if elevation:
         payload['elevation'] = elevation
 
-    resp = make_request(
+    resp = fetch_data(
         "https://archive-api.open-meteo.com/v1/archive",
-        payload).json()
+        payload,
+        response_format)
 
     data = pd.DataFrame.from_dict(resp['hourly'])
     data['time'] = pd.to_datetime(
@@ -798,7 +974,10 @@ def get_historical_data(latitude=53.55,
     return data
 
 
-@cache.memoize(86400)
+@grid_aliased(get_elevation)
+@single_flight
+@cache_by_year()
+@point_archived("daily")
 def get_historical_daily_data(latitude=53.55,
                               longitude=9.99,
                               variables='precipitation_sum',
@@ -807,10 +986,31 @@ def get_historical_daily_data(latitude=53.55,
                               start_date='1991-01-01',
                               end_date='2020-12-31',
                               elevation=None,
-                              cell_selection='land'):
+                              cell_selection='land',
+                              response_format=None):
     """
     Get historical data for a point
     """
+    payload = _historical_daily_payload(latitude=latitude,
+                                        longitude=longitude,
+                                        variables=variables,
+                                        timezone=timezone,
+                                        model=model,
+                                        start_date=start_date,
+                                        end_date=end_date,
+                                        elevation=elevation,
+                                        cell_selection=cell_selection)
+
+    resp = fetch_data(
+        "https://archive-api.open-meteo.com/v1/archive",
+        payload,
+        response_format)
+
+    return _historical_daily_frame(resp, payload)
+
+
+def _historical_daily_payload(latitude, longitude, variables, timezone, model,
+                              start_date, end_date, elevation, cell_selection):
     payload = {
         "latitude": latitude,
         "longitude": longitude,
@@ -825,10 +1025,10 @@ def get_historical_daily_data(latitude=53.55,
     if elevation:
         payload['elevation'] = elevation
 
-    resp = make_request(
-        "https://archive-api.open-meteo.com/v1/archive",
-        payload).json()
+    return payload
+
 
+def _historical_daily_frame(resp, payload):
     data = pd.DataFrame.from_dict(resp['daily'])
     data['time'] = pd.to_datetime(data['time'])
 
@@ -845,6 +1045,269 @@ def get_historical_daily_data(latitude=53.55,
     return data
 
 
+def _memoized_accessors(memoized_fn):
+    """
+    Functions to read and write the cache entry of a call to a
+    function decorated with @cache.memoize
+    """
+    def get_cached(**kwargs):
+        return cache.get(memoized_fn.make_cache_key(memoized_fn.uncached, **kwargs))
+
+    def set_cached(data, **kwargs):
+        cache.set(
+            memoized_fn.make_cache_key(memoized_fn.uncached, **kwargs),
+            data,
+            timeout=memoized_fn.cache_timeout)
+
+        return data
+
+    return get_cached, set_cached
+
+
+def _fetch_batch(memoized_fn, url, locations, make_payload, make_frame,
+                 make_view=None, long_format=False, response_format=None, **kwargs):
+    """
+    Shared implementation of the *_batch functions.
+    Every location is first looked up in the cache under the same key
+    that a single-point call of memoized_fn would use. The missing ones are
+    downloaded using comma-separated coordinates (OPENMETEO_BATCH_SIZE
+    locations per request) and stored back under their single-point key.
+    locations can be a DataFrame or a list of dicts with latitude, longitude
+    and optionally id and elevation.
+    make_view, if given, is applied to every frame after the cache.
+    Returns a list of DataFrames (same order as locations) or, if long_format,
+    a single DataFrame with a location_id column.
+    """
+    if isinstance(locations, pd.DataFrame):
+        locations = locations.to_dict(orient="records")
+
+    if hasattr(memoized_fn, "get_cached"):
+        # Functions cached by variable (see cache_by_variable)
+        get_cached, set_cached = memoized_fn.get_cached, memoized_fn.set_cached
+    else:
+        get_cached, set_cached = _memoized_accessors(memoized_fn)
+
+    results = [None] * len(locations)
+    missing = []
+    for i, loc in enumerate(locations):
+        call_kwargs = dict(kwargs, latitude=loc["latitude"], longitude=loc["longitude"], elevation=None)
+        if loc.get("elevation") is not None and not pd.isna(loc["elevation"]):
+            call_kwargs["elevation"] = loc["elevation"]
+        data = get_cached(response_format=response_format, **call_kwargs)
+        if data is not None:
+            results[i] = data
+        else:
+            missing.append((i, call_kwargs))
+
+    # The API wants either an elevation for every location or none at all
+    groups = [
+        [m for m in missing if m[1]["elevation"] is None],
+        [m for m in missing if m[1]["elevation"] is not None],
+    ]
+    for group in groups:
+        for start in range(0, len(group), OPENMETEO_BATCH_SIZE):
+            chunk = group[start:start + OPENMETEO_BATCH_SIZE]
+            payloads = [make_payload(call_kwargs) for _, call_kwargs in chunk]
+            batch_payload = dict(payloads[0])
+            for coord in ["latitude", "longitude", "elevation"]:
+                if coord in batch_payload:
+                    batch_payload[coord] = ",".join(str(p[coord]) for p in payloads)
+
+            resp = fetch_data(url, batch_payload, response_format)
+            # A single location is returned as an object instead of a list
+            if isinstance(resp, dict):
+                resp = [resp]
+
+            for (i, call_kwargs), payload, loc_resp in zip(chunk, payloads, resp):
+                results[i] = set_cached(
+                    make_frame(loc_resp, payload, call_kwargs),
+                    response_format=response_format,
+                    **call_kwargs)
+
+    if make_view is not None:
+        results = [make_view(data) for data in results]
+
+    if long_format:
+        return pd.concat(
+            [data.assign(location_id=loc.get("id", i))
+             for i, (loc, data) in enumerate(zip(locations, results))],
+            ignore_index=True,
+        )
+
+    return results
+
+
+def get_forecast_data_batch(locations,
+                            variables="temperature_2m",
+                            timezone='auto',
+                            model="best_match",
+                            forecast_days=7,
+                            from_now=True,
+                            past_days=None,
+                            start_date=None,
+                            end_date=None,
+                            minutes_15=False,
+                            cell_selection='land',
+                            long_format=False,
+                            response_format=None):
+    """
+    Multi-location version of get_forecast_data
+    """
+    download_days, view_days = _forecast_days_split(forecast_days, start_date, end_date)
+
+    return _fetch_batch(
+        _download_forecast_data,
+        "https://api.open-meteo.com/v1/forecast",
+        locations,
+        make_payload=lambda kw: _forecast_payload(**kw),
+        make_frame=lambda resp, payload, kw: _forecast_frame(
+            resp, payload, minutes_15=kw['minutes_15']),
+        make_view=lambda data: _forecast_view(
+            data, forecast_days=view_days, past_days=past_days, from_now=from_now),
+        long_format=long_format,
+        response_format=response_format,
+        variables=_api_variables(variables),
+        timezone=timezone,
+        model=model,
+        forecast_days=download_days,
+        past_days=past_days,
+        start_date=start_date,
+        end_date=end_date,
+        minutes_15=minutes_15,
+        cell_selection=cell_selection,
+    )
+
+
+def get_forecast_daily_data_batch(locations,
+                                  variables="precipitation_sum",
+                                  timezone='auto',
+                                  model="best_match",
+                                  forecast_days=7,
+                                  past_days=None,
+                                  start_date=None,
+                                  end_date=None,
+                                  cell_selection='land',
+                                  long_format=False,
+                                  response_format=None):
+    """
+    Multi-location version of get_forecast_daily_data
+    """
+    return _fetch_batch(
+        get_forecast_daily_data,
+        "https://api.open-meteo.com/v1/forecast",
+        locations,
+        make_payload=lambda kw: _forecast_daily_payload(**kw),
+        make_frame=lambda resp, payload, kw: _forecast_daily_frame(resp, payload),
+        long_format=long_format,
+        response_format=response_format,
+        variables=variables,
+        timezone=timezone,
+        model=model,
+        forecast_days=forecast_days,
+        past_days=past_days,
+        start_date=start_date,
+        end_date=end_date,
+        cell_selection=cell_selection,
+    )
+
+
+def get_ensemble_data_batch(locations,
+                            variables="temperature_2m",
+                            timezone="auto",
+                            model="icon_seamless",
+                            from_now=False,
+                            decimate=False,
+                            cell_selection="land",
+                            forecast_days=None,
+                            start_date=None,
+                            end_date=None,
+                            long_format=False,
+                            response_format=None):
+    """
+    Multi-location version of get_ensemble_data
+    """
+    download_days, view_days = _ensemble_days_split(model, forecast_days, start_date, end_date)
+
+    return _fetch_batch(
+        _download_ensemble_data,
+        "https://ensemble-api.open-meteo.com/v1/ensemble",
+        locations,
+        make_payload=lambda kw: _ensemble_payload(**kw),
+        make_frame=lambda resp, payload, kw: _ensemble_frame(resp, payload),
+        make_view=lambda data: _ensemble_view(
+            data, model=model, forecast_days=view_days, from_now=from_now, decimate=decimate),
+        long_format=long_format,
+        response_format=response_format,
+        variables=_api_variables(variables),
+        timezone=timezone,
+        model=model,
+        cell_selection=cell_selection,
+        forecast_days=download_days,
+        start_date=start_date,
+        end_date=end_date,
+    )
+
+
+def get_historical_daily_data_batch(locations,
+                                    variables='precipitation_sum',
+                                    timezone='GMT',
+                                    model='best_match',
+                                    start_date='1991-01-01',
+                                    end_date='2020-12-31',
+                                    cell_selection='land',
+                                    long_format=False,
+                                    response_format=None):
+    """
+    Multi-location version of get_historical_daily_data
+    """
+    return _fetch_batch(
+        get_historical_daily_data,
+        "https://archive-api.open-meteo.com/v1/archive",
+        locations,
+        make_payload=lambda kw: _historical_daily_payload(**kw),
+        make_frame=lambda resp, payload, kw: _historical_daily_frame(resp, payload),
+        long_format=long_format,
+        response_format=response_format,
+        variables=variables,
+        timezone=timezone,
+        model=model,
+        start_date=start_date,
+        end_date=end_date,
+        cell_selection=cell_selection,
+    )
+
+
+@grid_aliased(get_elevation)
+@single_flight
+@cache.memoize(31536000)
+@time_this_func
+def compute_climate_baseline(latitude=53.55,
+                             longitude=9.99,
+                             variables='temperature_2m_mean',
+                             timezone='GMT',
+                             model='era5',
+                             start_date='1991-01-01',
+                             end_date='2020-12-31'):
+    """
+    Statistics of daily variables over the base period (see ClimateBaseline).
+    All the daily climatologies are derived from it, so that the base period
+    is reduced only once per location, model and variables.
+    """
+    daily = get_historical_daily_data(
+        latitude=latitude,
+        longitude=longitude,
+        variables=variables,
+        timezone=timezone,
+        model=model,
+        start_date=start_date,
+        end_date=end_date,
+    )
+
+    return ClimateBaseline.from_daily(daily, split_variables(variables), start_date, end_date)
+
+
+@grid_aliased(get_elevation)
+@single_flight
 @cache.memoize(31536000)
 @time_this_func
 def compute_climatology(latitude=53.55,
@@ -862,65 +1325,110 @@ def compute_climatology(latitude=53.55,
     Compute climatology.
     This is a very expensive operation (5-6 seconds for the full 30 years)
     so it should be cached!
+    The hourly one is computed year by year (see utils.climatology),
+    so that 30 years of hourly data are never in memory at once.
+    """
+    if not daily:
+        # Compute mean over day of the year AND hour
+        return stream_hourly_climatology(
+            lambda start, end: get_historical_data(
+                latitude=latitude,
+                longitude=longitude,
+                variables=variables,
+                timezone=timezone,
+                model=model,
+                start_date=start,
+                end_date=end,
+            ),
+            start_date,
+            end_date,
+            hourly_freq=hourly_freq,
+        )
+
+    baseline = compute_climate_baseline(
+        latitude=latitude,
+        longitude=longitude,
+        variables=variables,
+        timezone=timezone,
+        model=model,
+        start_date=start_date,
+        end_date=end_date,
+    )
+
+    # Mean by calendar day, doy is a string (mmdd) to allow for leap years
+    mean = baseline.daily_means().round(1)
+
+    return mean
+
+
+@grid_aliased(get_elevation)
+@single_flight
+@cache.memoize(31536000)
+@time_this_func
+def compute_harmonic_climatology(latitude=53.55,
+                                 longitude=9.99,
+                                 variables='temperature_2m',
+                                 timezone='auto',
+                                 model='best_match',
+                                 start_date='1991-01-01',
+                                 end_date='2020-12-31',
+                                 source='hourly'):
     """
-    if daily:
-        data = get_historical_daily_data(
+    Compact alternative to compute_climatology(daily=False): a
+    HarmonicClimatology with a few dozen coefficients per variable.
+    With source='daily' it is built from the daily max, min and mean of the
+    variables, so that no hourly data has to be downloaded.
+    """
+    if source == 'daily':
+        daily = get_historical_daily_data(
             latitude=latitude,
             longitude=longitude,
-            variables=variables,
+            variables=",".join(
+                f"{var}_{stat}" for var in split_variables(variables) for stat in ("max", "min", "mean")),
             timezone=timezone,
             model=model,
             start_date=start_date,
             end_date=end_date,
         )
-    else:
-        data = get_historical_data(
+        return harmonics_from_daily(daily, split_variables(variables))
+
+    fit = HarmonicFit()
+    fold_periods(
+        lambda start, end: get_historical_data(
             latitude=latitude,
             longitude=longitude,
             variables=variables,
             timezone=timezone,
             model=model,
-            start_date=start_date,
-            end_date=end_date,
-        )
-
-    # Add doy not as integer but as string to allow for leap years
-    data['doy'] = data.time.dt.strftime("%m%d")
-    if daily:
-        mean = data.groupby(data.doy).mean(
-            numeric_only=True).round(1).rename_axis(['doy']).reset_index()
-    else:
-        # Compute mean over day of the year AND hour
-        mean = (
-            data.resample(hourly_freq, on="time")
-            .first()
-            .reset_index()
-            .groupby([data.doy, data.time.dt.hour])
-            .mean(numeric_only=True)
-            .round(1)
-            .rename_axis(["doy", "hour"])
-            .reset_index()
-        )
+            start_date=start,
+            end_date=end,
+        ),
+        year_periods(start_date, end_date),
+        fit.add,
+    )
 
-    return mean
+    return fit.result()
 
 
+@grid_aliased(get_elevation)
+@single_flight
 @cache.memoize(31536000)
 @time_this_func
 def compute_monthly_clima(latitude=53.55, longitude=9.99, model='era5',
                           start_date='1991-01-01', end_date='2020-12-31'):
     """Takes a 30 years hourly dataframe as input and compute
     some monthly statistics by aggregating many times"""
+    variables = (
+        'temperature_2m_max,temperature_2m_min,temperature_2m_mean,'
+        'precipitation_sum,snowfall_sum,wind_speed_10m_max,cloudcover_mean'
+    )
     daily = get_historical_daily_data(
         latitude=latitude,
         longitude=longitude,
         model=model,
         start_date=start_date,
         end_date=end_date,
-        variables=(
-            'temperature_2m_max,temperature_2m_min,temperature_2m_mean,'
-            'precipitation_sum,snowfall_sum,wind_speed_10m_max,cloudcover_mean'
-        ) 
+        variables=variables,
     ).set_index('time')
 
     daily['overcast'] = daily['cloudcover_mean'] >= 80
@@ -967,12 +1475,22 @@ def compute_monthly_clima(latitude=53.55, longitude=9.99, model='era5',
     bool_cols = daily.dtypes[daily.dtypes == np.bool_].index
     # Compute monthly stats
     monthly = daily[bool_cols].resample('1ME').sum().add_suffix('_days')
-    monthly['monthly_rain'] = daily['precipitation_sum'].resample('1ME').sum()
-    monthly['t2m_max_mean'] = daily['temperature_2m_max'].resample('1ME').mean()
-    monthly['t2m_min_mean'] = daily['temperature_2m_min'].resample('1ME').mean()
-    monthly['t2m_min_min'] = daily['temperature_2m_min'].resample('1ME').min()
-    monthly['t2m_max_max'] = daily['temperature_2m_max'].resample('1ME').max()
-    stats = monthly.groupby(monthly.index.month).mean().round(1)
+    stats = monthly.groupby(monthly.index.month).mean()
+    # The statistics of the variables themselves come from the baseline
+    baseline = compute_climate_baseline(
+        latitude=latitude,
+        longitude=longitude,
+        model=model,
+        start_date=start_date,
+        end_date=end_date,
+        variables=variables,
+    )
+    stats['monthly_rain'] = baseline.monthly_stats('precipitation_sum')['sum']
+    stats['t2m_max_mean'] = baseline.monthly_stats('temperature_2m_max')['mean']
+    stats['t2m_min_mean'] = baseline.monthly_stats('temperature_2m_min')['mean']
+    stats['t2m_min_min'] = baseline.monthly_stats('temperature_2m_min')['min']
+    stats['t2m_max_max'] = baseline.monthly_stats('temperature_2m_max')['max']
+    stats = stats.round(1)
 
     return stats
 
@@ -988,29 +1506,24 @@ def compute_yearly_accumulation(latitude=53.55,
                                 q3=0.95):
     """Compute cumulative sum of some variable over the year"""
     current_year = pd.to_datetime("now", utc=True).year
-    
-    # Download static base period for quantiles (fully cacheable)
-    base_daily = get_historical_daily_data(
-            latitude=latitude,
-            longitude=longitude,
-            model=model,
-            start_date='1991-01-01',
-            end_date='2020-12-31',
-            variables=var)
-
-    # Conditionally download the target year if outside the base period
-    if year < 1991 or year > 2020:
-        end_dt = (pd.to_datetime("now", utc=True) - pd.to_timedelta("1 day")).strftime("%Y-%m-%d") if year == current_year else f"{year}-12-31"
-        target_daily = get_historical_daily_data(
-            latitude=latitude,
-            longitude=longitude,
-            model=model,
-            start_date=f"{year}-01-01",
-            end_date=end_dt,
-            variables=var)
-        daily = pd.concat([base_daily, target_daily]).drop_duplicates(subset=['time']).reset_index(drop=True)
-    else:
-        daily = base_daily.copy()
+
+    # Quantiles over the base period (1991-2020) come from the baseline,
+    # which is the same for all the years
+    baseline = compute_climate_baseline(
+        latitude=latitude,
+        longitude=longitude,
+        model=model,
+        variables=var)
+
+    # So only the target year has to be downloaded
+    end_dt = (pd.to_datetime("now", utc=True) - pd.to_timedelta("1 day")).strftime("%Y-%m-%d") if year == current_year else f"{year}-12-31"
+    daily = get_historical_daily_data(
+        latitude=latitude,
+        longitude=longitude,
+        model=model,
+        start_date=f"{year}-01-01",
+        end_date=end_dt,
+        variables=var)
 
     if year == pd.to_datetime("now", utc=True).year:
         try:
@@ -1026,20 +1539,15 @@ def compute_yearly_accumulation(latitude=53.55,
                 start_date=forecast_start.strftime("%Y-%m-%d"),
                 end_date=forecast_end.strftime("%Y-%m-%d"),
             )
-            ensemble = ensemble.set_index('time')
-            ensemble = ensemble.dropna(how='all')
             # Only select the right variable
-            ensemble = ensemble.loc[:, ensemble.columns.str.match(rf'{var}$|{var}_member(0[1-9]|[1-9][0-9])$')]
-            # 
-            ensemble = ensemble.mean(axis=1).to_frame(name=var).merge(
-                ensemble.quantile(0.15, axis=1).to_frame(name=f"{var}_min"),
-                left_index=True,
-                right_index=True,
-            ).merge(
-                ensemble.quantile(0.95, axis=1).to_frame(name=f"{var}_max"),
-                left_index=True,
-                right_index=True,
-            ).reset_index()
+            cube = EnsembleCube.from_frame(ensemble, var, dtype=np.float64)
+            low, high = cube.percentiles(var, [0.15, 0.95])
+            ensemble = pd.DataFrame({
+                'time': cube.time,
+                var: cube.mean(var),
+                f"{var}_min": low,
+                f"{var}_max": high,
+            }).dropna(subset=[var]).reset_index(drop=True)
             ensemble['time'] = ensemble['time'].dt.tz_localize(
                 None, ambiguous='NaT', nonexistent='NaT')
             daily = pd.concat([daily, ensemble]).drop_duplicates(subset=['time']).reset_index(drop=True)
@@ -1081,28 +1589,11 @@ def compute_yearly_accumulation(latitude=53.55,
                 f"Cannot add forecast data: {type(e).__name__} at line {e.__traceback__.tb_lineno} of {__file__}: {e}"
             )
 
-    # Only compute quantiles on a subset of data
-    period = (daily['time'] >= '1991-01-01') & (daily['time'] <= '2020-12-31')
-
-    quantiles = (
-        daily.loc[period]
-        .groupby([daily.loc[period].time.dt.day, daily.loc[period].time.dt.month])[f'{var}_yearly_acc']
-        .quantile([q1, q2, q3])
-        .unstack()
-        .rename(columns={q1: 'q1', q2: 'q2', q3: 'q3'})
-        .rename_axis(index=['day', 'month'])  # Rename index levels
-        .reset_index()  # Reset index to convert 'day' and 'month' into columns
-        .assign(
-            dummy_date=lambda x: pd.to_datetime(
-                f'{year}-' + x['month'].astype(str) + "-" + x['day'].astype(str)
-            )
-        )
-        .sort_values(by='dummy_date')
-    )
-
-    # Smooth quantiles with a centered 15-day rolling window, extend to avoid gaps
-    for col in ['q1', 'q2', 'q3']:
-        quantiles[col] = quantiles[col].rolling(window=10, center=True, min_periods=1).mean()
+    # Quantiles of the accumulation in calendar order, smoothed with a
+    # centered 10-day rolling window, extend to avoid gaps
+    quantiles = baseline.accumulation_quantiles(var, quantiles=(q1, q2, q3), window=10)
+    quantiles = quantiles.rename(columns={q1: 'q1', q2: 'q2', q3: 'q3'})
+    quantiles['dummy_date'] = pd.to_datetime(quantiles[['month', 'day']].assign(year=year))
 
     # Filter to the target year first
     daily_year = daily[daily.time.dt.year == year].copy()
@@ -1131,30 +1622,24 @@ def compute_yearly_comparison(
     over a certain year"""
     current_year = pd.to_datetime("now", utc=True).year
 
-    # Download static base period for climatology (fully cacheable)
-    base_daily = get_historical_daily_data(
+    # Climatology of the base period (1991-2020), the same for all the years
+    baseline = compute_climate_baseline(
         latitude=latitude,
         longitude=longitude,
         model=model,
-        start_date="1991-01-01",
-        end_date="2020-12-31",
         variables=var,
     )
 
-    # Conditionally download the target year if outside the base period
-    if year < 1991 or year > 2020:
-        end_dt = (pd.to_datetime("now", utc=True) - pd.to_timedelta("1 day")).strftime("%Y-%m-%d") if year == current_year else f"{year}-12-31"
-        target_daily = get_historical_daily_data(
-            latitude=latitude,
-            longitude=longitude,
-            model=model,
-            start_date=f"{year}-01-01",
-            end_date=end_dt,
-            variables=var,
-        )
-        daily = pd.concat([base_daily, target_daily]).drop_duplicates(subset=["time"]).reset_index(drop=True)
-    else:
-        daily = base_daily.copy()
+    # So only the target year has to be downloaded
+    end_dt = (pd.to_datetime("now", utc=True) - pd.to_timedelta("1 day")).strftime("%Y-%m-%d") if year == current_year else f"{year}-12-31"
+    daily = get_historical_daily_data(
+        latitude=latitude,
+        longitude=longitude,
+        model=model,
+        start_date=f"{year}-01-01",
+        end_date=end_dt,
+        variables=var,
+    )
 
     if year == pd.to_datetime("now", utc=True).year:
         # Add missing dates and forecasts
@@ -1188,18 +1673,10 @@ def compute_yearly_comparison(
     # Remove leap years
     daily = daily[~((daily.time.dt.month == 2) & (daily.time.dt.day == 29))]
 
-    # Although the data starts from 1981 (or 1991 depending on base), we compute the quantiles and mean only over the 1991-2020 period
-    daily['doy'] = daily.time.dt.strftime("%m%d")
-    clima = daily.loc[(daily.time >= '1991-01-01') & (daily.time <= '2020-12-31')
-                      ].groupby('doy').mean(numeric_only=True).add_suffix("_clima")
-    clima['q05'] = daily.loc[(daily.time >= '1991-01-01') & (daily.time <= '2020-12-31')
-                             ].groupby('doy').quantile(q=0.05, numeric_only=True).add_suffix("_q05").values
-    clima['q95'] = daily.loc[(daily.time >= '1991-01-01') & (daily.time <= '2020-12-31')
-                             ].groupby('doy').quantile(q=0.95, numeric_only=True).add_suffix("_q95").values
-
-    # Smooth quantiles with a centered 15-day rolling window, extend to avoid gaps
-    for col in ['q05', 'q95']:
-        clima[col] = pd.Series(clima[col]).rolling(window=10, center=True, min_periods=1).mean().values
+    daily = daily.assign(doy=calendar_day_labels(daily.time))
+    # Mean and quantiles over the 1991-2020 period, quantiles smoothed
+    # with a centered 10-day rolling window, extend to avoid gaps
+    clima = baseline.daily_climatology(var, quantiles=(0.05, 0.95), window=10)
 
     clima['dummy_date'] = pd.to_datetime(
         str(year) + clima.index, format='%Y%m%d')
@@ -1216,23 +1693,42 @@ def compute_yearly_comparison(
     return daily
 
 
+def _daily_weather_code(data, min_hours=2):
+    """
+    Daily weather code: the most frequent code of every day (the lowest
+    in case of ties), computed for all the days at once from the counts
+    of every (day, code)
+    """
+    days = data["time"].dt.normalize()
+    index = pd.date_range(days.min(), days.max(), freq="1D", name="time")
+    codes = data["weather_code"].to_numpy(dtype=np.float64)
+    valid = ~np.isnan(codes)
+    values, code_index = np.unique(codes[valid], return_inverse=True)
+    if len(values) == 0:
+        return pd.DataFrame({"weather_code": np.full(len(index), np.nan)}, index=index)
+    counts = np.bincount(
+        index.get_indexer(days[valid]) * len(values) + code_index,
+        minlength=len(index) * len(values),
+    ).reshape(len(index), len(values))
+    weather_code = np.where(counts.any(axis=1), values[counts.argmax(axis=1)], np.nan)
+
+    # Severity-based override: if severe weather appears for ≥2 hours, prioritize it
+    # Ordered by severity (most severe first); when more codes qualify
+    # in the same day the last one of the list is kept
+    severe_codes = np.array([99, 95, 96, 82, 67, 65, 81, 63, 80, 75, 73, 71, 66, 61, 56, 53, 51])
+    position = np.searchsorted(values, severe_codes).clip(max=len(values) - 1)
+    found = values[position] == severe_codes
+    severe = np.where(found, counts[:, position], 0) >= min_hours
+    last = len(severe_codes) - 1 - severe[:, ::-1].argmax(axis=1)
+    weather_code = np.where(severe.any(axis=1), severe_codes[last], weather_code)
+
+    return pd.DataFrame({"weather_code": weather_code}, index=index)
+
+
 @cache.memoize(3600)
 def compute_daily_ensemble_meteogram(latitude=53.55,
                                      longitude=9.99,
                                      model='gfs_seamless'):
-    data = get_ensemble_data(
-        latitude=latitude,
-        longitude=longitude,
-        model=model,
-        variables="temperature_2m,precipitation,snowfall,wind_speed_10m,wind_gusts_10m",
-        from_now=False,
-        decimate=False)
-    # Only select days with enough data
-    # We use a more relaxed constraint to avoid issues when there are
-    # daylight saving time changes
-    data = data.groupby(data['time'].dt.date).filter(lambda x: len(x) > 21)
-    # Ensure time column is proper datetime for resampling
-    data['time'] = pd.to_datetime(data['time'])
     # Best match ensemble/deterministic models
     # when the naming is different
     deterministic_model = model
@@ -1246,74 +1742,84 @@ def compute_daily_ensemble_meteogram(latitude=53.55,
         deterministic_model = "ecmwf_aifs025_single"
     elif model == "ncep_aigefs025":
         deterministic_model = "gfs_seamless"
-    data_deterministic = get_forecast_data(
-        latitude=latitude,
-        longitude=longitude,
-        model=deterministic_model,
-        variables="weather_code",
-        from_now=False,
-        forecast_days=14
-    )
-    data_deterministic_daily = get_forecast_daily_data(
-        latitude=latitude,
-        longitude=longitude,
-        model=deterministic_model,
-        variables="sunshine_duration,wind_speed_10m_max,wind_direction_10m_dominant,wind_gusts_10m_max",
-        forecast_days=14
-    ).dropna(subset=["wind_speed_10m_max","wind_direction_10m_dominant","sunshine_duration","wind_gusts_10m_max"], how='all').set_index('time')
-
-    # This computes a daily aggregation for all ensemble members
-    daily_tmin = data.loc[:, data.columns.str.contains(
-        'temperature_2m|time')].resample('1D', on='time').min()
-    daily_tmax = data.loc[:, data.columns.str.contains(
-        'temperature_2m|time')].resample('1D', on='time').max()
-    daily_prec = data.loc[:, data.columns.str.contains(
-        'precipitation|time')].resample('1D', on='time').sum()
-    daily_snow = data.loc[:, data.columns.str.contains(
-        'snowfall|time')].resample('1D', on='time').sum()
-    daily_wind_speed = data.loc[:, data.columns.str.contains(
-        'wind_speed_10m|time')].resample('1D', on='time').max()
-    daily_wind_gusts = data.loc[:, data.columns.str.contains(
-        'wind_gusts_10m|time')].resample('1D', on='time').max()
-
-    # Compute daily weather code using mode (most frequent) instead of median
-    # First, use resample to get mode for each day
-    daily_wcode_deterministic = data_deterministic.loc[:, data_deterministic.columns.str.contains(
-        'weather_code|time')].resample('1D', on='time').apply(
-            lambda x: x.mode()[0] if len(x.mode()) > 0 else np.nan
-        )
-
-    # Severity-based override: if severe weather appears for ≥2 hours, prioritize it
-    # Ordered by severity (most severe first)
-    severe_codes = [99, 95, 96, 82, 67, 65, 81, 63, 80, 75, 73, 71, 66, 61, 56, 53, 51]
-
-    for code in severe_codes:
-        severe_days = data_deterministic[data_deterministic['weather_code'] == code]
-        severe_days = severe_days.groupby(severe_days.time.dt.date).weather_code.count()
-        severe_days = severe_days[severe_days >= 2].index
-        if len(severe_days) > 0:
-            daily_wcode_deterministic.loc[severe_days.astype(str).to_list(), 'weather_code'] = code
-
-    daily = daily_tmin.mean(axis=1).to_frame(name='t_min_mean')\
-    .merge(daily_tmax.mean(axis=1).to_frame(name='t_max_mean'), left_index=True, right_index=True)\
-    .merge(daily_tmin.min(axis=1).to_frame(name='t_min_min'), left_index=True, right_index=True)\
-    .merge(daily_tmin.max(axis=1).to_frame(name='t_min_max'), left_index=True, right_index=True)\
-    .merge(daily_tmax.max(axis=1).to_frame(name='t_max_max'), left_index=True, right_index=True)\
-    .merge(daily_tmax.min(axis=1).to_frame(name='t_max_min'), left_index=True, right_index=True)\
-    .merge(daily_tmax.quantile(0.25, axis=1).to_frame(name='t_max_q25'), left_index=True, right_index=True)\
-    .merge(daily_tmax.quantile(0.75, axis=1).to_frame(name='t_max_q75'), left_index=True, right_index=True)\
-    .merge(daily_tmin.quantile(0.25, axis=1).to_frame(name='t_min_q25'), left_index=True, right_index=True)\
-    .merge(daily_tmin.quantile(0.75, axis=1).to_frame(name='t_min_q75'), left_index=True, right_index=True)\
-    .merge(daily_wcode_deterministic, left_index=True, right_index=True)\
-    .merge(daily_prec.mean(axis=1).to_frame(name='daily_prec_mean'), left_index=True, right_index=True)\
-    .merge(daily_prec.quantile(0.15, axis=1).to_frame(name='daily_prec_min'), left_index=True, right_index=True)\
-    .merge(daily_prec.quantile(0.95, axis=1).to_frame(name='daily_prec_max'), left_index=True, right_index=True)\
-    .merge(((daily_prec[daily_prec > 0.1].count(axis=1) / daily_prec.shape[1]) * 100.).to_frame(name='prec_prob'), left_index=True, right_index=True)\
-    .merge(((daily_snow[daily_snow > 0.1].count(axis=1) / daily_snow.shape[1]) * 100.).to_frame(name='snow_prob'), left_index=True, right_index=True)\
-    .merge(daily_wind_speed.min(axis=1).to_frame(name='wind_speed_min'), left_index=True, right_index=True)\
-    .merge(daily_wind_speed.max(axis=1).to_frame(name='wind_speed_max'), left_index=True, right_index=True)\
-    .merge(daily_wind_gusts.min(axis=1).to_frame(name='wind_gusts_min'), left_index=True, right_index=True)\
-    .merge(daily_wind_gusts.max(axis=1).to_frame(name='wind_gusts_max'), left_index=True, right_index=True)\
+    # The three downloads are independent
+    results = fetch_all({
+        "ensemble": Dependency(
+            get_ensemble_data,
+            latitude=latitude,
+            longitude=longitude,
+            model=model,
+            variables="temperature_2m,precipitation,snowfall,wind_speed_10m,wind_gusts_10m",
+            from_now=False,
+            decimate=False),
+        "deterministic": Dependency(
+            get_forecast_data,
+            latitude=latitude,
+            longitude=longitude,
+            model=deterministic_model,
+            variables="weather_code",
+            from_now=False,
+            forecast_days=14),
+        "deterministic_daily": Dependency(
+            get_forecast_daily_data,
+            latitude=latitude,
+            longitude=longitude,
+            model=deterministic_model,
+            variables="sunshine_duration,wind_speed_10m_max,wind_direction_10m_dominant,wind_gusts_10m_max",
+            forecast_days=14),
+    })
+    data = results["ensemble"]
+    # Only select days with enough data
+    # We use a more relaxed constraint to avoid issues when there are
+    # daylight saving time changes
+    data = data[data.groupby(data['time'].dt.date)['time'].transform('size') > 21]
+    # Ensure time column is proper datetime for resampling
+    data['time'] = pd.to_datetime(data['time'])
+    data_deterministic = results["deterministic"]
+    data_deterministic_daily = results["deterministic_daily"].dropna(subset=["wind_speed_10m_max","wind_direction_10m_dominant","sunshine_duration","wind_gusts_10m_max"], how='all').set_index('time')
+
+    # This computes a daily aggregation for all ensemble members:
+    # a (member, day) array per variable, with one pass for every reduction
+    cube = EnsembleCube.from_frame(
+        data,
+        ["temperature_2m", "precipitation", "snowfall", "wind_speed_10m", "wind_gusts_10m"],
+        dtype=np.float64)
+    daily_min = cube.daily("min", ["temperature_2m"])
+    daily_max = cube.daily("max", ["temperature_2m", "wind_speed_10m", "wind_gusts_10m"])
+    daily_sum = cube.daily("sum", ["precipitation", "snowfall"])
+    days = pd.Index(daily_min.time, name='time')
+    t_min_q25, t_min_q75 = daily_min.percentiles("temperature_2m", [0.25, 0.75])
+    t_max_q25, t_max_q75 = daily_max.percentiles("temperature_2m", [0.25, 0.75])
+    prec_q15, prec_q95 = daily_sum.percentiles("precipitation", [0.15, 0.95])
+
+    temperature = pd.DataFrame({
+        't_min_mean': daily_min.mean("temperature_2m"),
+        't_max_mean': daily_max.mean("temperature_2m"),
+        't_min_min': daily_min.reduce("temperature_2m", "min"),
+        't_min_max': daily_min.reduce("temperature_2m", "max"),
+        't_max_max': daily_max.reduce("temperature_2m", "max"),
+        't_max_min': daily_max.reduce("temperature_2m", "min"),
+        't_max_q25': t_max_q25,
+        't_max_q75': t_max_q75,
+        't_min_q25': t_min_q25,
+        't_min_q75': t_min_q75,
+    }, index=days)
+    precipitation_wind = pd.DataFrame({
+        'daily_prec_mean': daily_sum.mean("precipitation"),
+        'daily_prec_min': prec_q15,
+        'daily_prec_max': prec_q95,
+        'prec_prob': daily_sum.exceedance("precipitation", 0.1, inclusive=False) * 100.,
+        'snow_prob': daily_sum.exceedance("snowfall", 0.1, inclusive=False) * 100.,
+        'wind_speed_min': daily_max.reduce("wind_speed_10m", "min"),
+        'wind_speed_max': daily_max.reduce("wind_speed_10m", "max"),
+        'wind_gusts_min': daily_max.reduce("wind_gusts_10m", "min"),
+        'wind_gusts_max': daily_max.reduce("wind_gusts_10m", "max"),
+    }, index=days)
+
+    # Days in common with the deterministic data
+    daily = temperature\
+    .merge(_daily_weather_code(data_deterministic), left_index=True, right_index=True)\
+    .merge(precipitation_wind, left_index=True, right_index=True)\
     .merge(data_deterministic_daily.rename(columns={'sunshine_duration': 'sunshine_mean'}), left_index=True, right_index=True)
 
     # Some models don't provide wind gusts: fall back to wind speed so
@@ -0,0 +1,231 @@
+"""
+Decoder for the binary (format=flatbuffers) output of the open-meteo API.
+The response is turned into the same dict structure that the JSON output
+has, so that the frame builders in openmeteo_api don't need to know which
+transport was used. Values are kept as the float32 arrays that point
+directly into the downloaded buffer, no Python floats are ever created.
+Needs the optional openmeteo-sdk package.
+"""
+import numpy as np
+import pandas as pd
+
+try:
+    from openmeteo_sdk.WeatherApiResponse import WeatherApiResponse
+    from openmeteo_sdk.Unit import Unit
+    from openmeteo_sdk.Model import Model
+except ImportError:
+    WeatherApiResponse = None
+    Unit = None
+    Model = None
+
+# Sections of the payload that can be decoded, with the name
+# of the corresponding accessor in WeatherApiResponse
+SECTIONS = {
+    "hourly": "Hourly",
+    "daily": "Daily",
+    "minutely_15": "Minutely15",
+}
+
+# Same unit strings returned by the JSON API for the most common units
+UNIT_LABELS = {
+    "celsius": "°C",
+    "fahrenheit": "°F",
+    "kelvin": "K",
+    "centimetre": "cm",
+    "millimetre": "mm",
+    "metre": "m",
+    "inch": "inch",
+    "feet": "ft",
+    "kilometres_per_hour": "km/h",
+    "metre_per_second": "m/s",
+    "miles_per_hour": "mp/h",
+    "knots": "kn",
+    "percentage": "%",
+    "hectopascal": "hPa",
+    "pascal": "Pa",
+    "degree_direction": "°",
+    "seconds": "s",
+    "hours": "h",
+    "watt_per_square_metre": "W/m²",
+    "megajoule_per_square_metre": "MJ/m²",
+    "joule_per_kilogram": "J/kg",
+    "wmo_code": "wmo code",
+    "iso8601": "iso8601",
+    "unix_time": "unixtime",
+}
+
+
+def is_available():
+    return WeatherApiResponse is not None
+
+
+def _unit_label(code):
+    if not hasattr(_unit_label, "names"):
+        _unit_label.names = {
+            v: k for k, v in vars(Unit).items() if not k.startswith("_")
+        }
+    name = _unit_label.names.get(code, "undefined")
+
+    return UNIT_LABELS.get(name, name)
+
+
+def _model_name(code):
+    if not hasattr(_model_name, "names"):
+        _model_name.names = {
+            v: k for k, v in vars(Model).items() if not k.startswith("_")
+        }
+
+    return _model_name.names.get(code)
+
+
+def _split_names(names):
+    if isinstance(names, str):
+        return [v.strip() for v in names.split(",") if v.strip()]
+
+    return list(names)
+
+
+def _decode_variables(block, requested, length):
+    """
+    Variables are not returned with their name but with an enum plus some
+    attributes (altitude, pressure level, aggregation...). They come in
+    the same order as requested, with all the ensemble members of a
+    variable next to each other, so a new variable starts every time these
+    attributes change.
+    """
+    columns, units = {}, {}
+    index, previous = -1, None
+    for i in range(block.VariablesLength()):
+        var = block.Variables(i)
+        signature = (
+            var.Variable(),
+            var.Altitude(),
+            var.PressureLevel(),
+            var.Depth(),
+            var.DepthTo(),
+            var.Aggregation(),
+            var.PreviousDay(),
+        )
+        if signature != previous:
+            index += 1
+            previous = signature
+        if index >= len(requested):
+            raise ValueError(
+                f"Got more variables than requested ({len(requested)})")
+        member = var.EnsembleMember()
+        name = requested[index] if member == 0 else f"{requested[index]}_member{member:02d}"
+        if var.ValuesIsNone():
+            columns[name] = np.full(length, np.nan, dtype="float32")
+        else:
+            columns[name] = var.ValuesAsNumpy()
+        units[requested[index]] = _unit_label(var.Unit())
+
+    if any(len(values) != length for values in columns.values()):
+        raise ValueError("Variables have different length than the time axis")
+    if index + 1 != len(requested):
+        raise ValueError(
+            f"Got {index + 1} variables but {len(requested)} were requested")
+
+    return columns, units
+
+
+def _to_str(value, default="GMT"):
+    if value is None:
+        return default
+
+    return value.decode() if isinstance(value, bytes) else value
+
+
+def _decode_location(message, payload):
+    utc_offset = message.UtcOffsetSeconds()
+    resp = {
+        "latitude": message.Latitude(),
+        "longitude": message.Longitude(),
+        "generationtime_ms": message.GenerationTimeMilliseconds(),
+        "utc_offset_seconds": utc_offset,
+        "timezone": _to_str(message.Timezone()),
+        "timezone_abbreviation": _to_str(message.TimezoneAbbreviation()),
+        "elevation": message.Elevation(),
+    }
+    for section, accessor in SECTIONS.items():
+        if section not in payload:
+            continue
+        block = getattr(message, accessor)()
+        if block is None:
+            continue
+        # As in the JSON output, timestamps are local wall time
+        time = pd.to_datetime(
+            np.arange(block.Time(), block.TimeEnd(), block.Interval(), dtype="int64") + utc_offset,
+            unit="s")
+        columns, units = _decode_variables(block, _split_names(payload[section]), len(time))
+        resp[section] = {"time": time, **columns}
+        resp[f"{section}_units"] = {"time": "iso8601", **units}
+
+    return resp
+
+
+def _merge_models(decoded):
+    """
+    Merge the responses of the models of a location into a single dict,
+    with the columns suffixed by the model name as in the JSON output
+    """
+    resp = dict(decoded[0][1])
+    for section in SECTIONS:
+        if section not in resp:
+            continue
+        time = resp[section]["time"]
+        columns, units = {"time": time}, {"time": "iso8601"}
+        for model, model_resp in decoded:
+            if section not in model_resp or not model_resp[section]["time"].equals(time):
+                raise ValueError(f"Models of the same location have a different {section} time axis")
+            for name, values in model_resp[section].items():
+                if name != "time":
+                    columns[f"{name}_{model}"] = values
+            for name, unit in model_resp[f"{section}_units"].items():
+                if name != "time":
+                    units[f"{name}_{model}"] = unit
+        resp[section] = columns
+        resp[f"{section}_units"] = units
+
+    return resp
+
+
+def decode_response(content, payload):
+    """
+    Decode a flatbuffers response into a list of dicts (one per location)
+    shaped like the JSON output. Every message is prefixed by its length
+    (4 bytes little endian). There is one message per location and model:
+    the models of a location are merged as in the JSON output.
+    Raises ValueError if the content does not match the payload.
+    """
+    messages = []
+    position = 0
+    while position < len(content):
+        length = int.from_bytes(content[position:position + 4], byteorder="little")
+        messages.append(WeatherApiResponse.GetRootAs(content, position + 4))
+        position += length + 4
+
+    if not messages:
+        raise ValueError("Empty flatbuffers response")
+    locations = len(_split_names(str(payload["latitude"])))
+    models = _split_names(payload.get("models") or "") or [None]
+    if len(messages) != locations * len(models):
+        raise ValueError(
+            f"Got {len(messages)} messages for {locations} locations and {len(models)} models")
+
+    responses = []
+    for start in range(0, len(messages), len(models)):
+        decoded = []
+        for position, message in enumerate(messages[start:start + len(models)]):
+            # Models come in the requested order, the name is checked when known
+            model = _model_name(message.Model())
+            decoded.append((model if model in models else models[position],
+                            _decode_location(message, payload)))
+        if len(models) == 1:
+            responses.append(decoded[0][1])
+        elif len({model for model, _ in decoded}) != len(models):
+            raise ValueError("Got the same model more than once for a location")
+        else:
+            responses.append(_merge_models(decoded))
+
+    return responses
@@ -0,0 +1,268 @@
+"""
+Local store of the archive (reanalysis) series of every location and model.
+Climate pages asked again for the same point read decades of data from disk
+and only download the days added to the archive since the last request.
+Every variable has its own directory of Parquet files, one per download,
+named after the period they cover (first_last.parquet). Only the days that
+no file covers are downloaded (usually the new ones at the end), reads only
+open the files overlapping the requested dates, and the files of a
+variable are merged when there are more than POINT_ARCHIVE_MAX_PARTS.
+Needs pyarrow: without it, or with an empty POINT_ARCHIVE_DIR, every call
+is downloaded as before.
+"""
+import hashlib
+import json
+import os
+import uuid
+from functools import wraps
+import pandas as pd
+from .settings import POINT_ARCHIVE_DIR, POINT_ARCHIVE_MAX_PARTS
+from .single_flight import process_lock
+from .variable_cache import split_variables, split_blocks, assemble
+from .custom_logger import logging
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+
+# Arguments that do not identify the series of a location
+IGNORED_ARGUMENTS = ("variables", "start_date", "end_date", "response_format")
+ONE_DAY = pd.Timedelta(days=1)
+
+
+class StoreError(Exception):
+    """The files of a location cannot be read"""
+
+
+def location_dir(kind, params, root=POINT_ARCHIVE_DIR):
+    raw = f"{kind}{sorted(params.items())}"
+
+    return os.path.join(root, kind, str(params.get("model")), hashlib.sha1(raw.encode("utf-8")).hexdigest()[:20])
+
+
+def list_parts(var_dir):
+    """(first day, last day, path) of the files of a variable, sorted by period"""
+    try:
+        names = os.listdir(var_dir)
+    except FileNotFoundError:
+        return []
+    parts = []
+    for name in names:
+        if not name.endswith(".parquet"):
+            continue
+        try:
+            first, last = (pd.Timestamp(day) for day in name[:-len(".parquet")].split("_"))
+        except ValueError:
+            continue
+        parts.append((first, last, os.path.join(var_dir, name)))
+
+    return sorted(parts)
+
+
+def read_parts(parts, start, end):
+    """Rows of the files between the days start and end (included)"""
+    filters = [("time", ">=", start.to_pydatetime()), ("time", "<", (end + ONE_DAY).to_pydatetime())]
+    frames = [
+        pq.read_table(path, filters=filters).to_pandas()
+        for first, last, path in parts
+        if first <= end and last >= start
+    ]
+    if not frames:
+        return None
+    data = pd.concat(frames, ignore_index=True) if len(frames) > 1 else frames[0]
+
+    return data.drop_duplicates(subset="time", keep="last").sort_values("time").reset_index(drop=True)
+
+
+def write_part(var_dir, block, first, last):
+    os.makedirs(var_dir, exist_ok=True)
+    block = block.reset_index(drop=True)
+    block.attrs = {}
+    tmp = os.path.join(var_dir, f".{uuid.uuid4().hex}.tmp")
+    try:
+        pq.write_table(pa.Table.from_pandas(block, preserve_index=False), tmp)
+        os.replace(tmp, os.path.join(var_dir, f"{first:%Y%m%d}_{last:%Y%m%d}.parquet"))
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+
+
+def stored_periods(parts):
+    """Periods covered by the files, with overlapping and adjacent ones joined"""
+    periods = []
+    for first, last, _ in parts:
+        if periods and first <= periods[-1][1] + ONE_DAY:
+            periods[-1][1] = max(periods[-1][1], last)
+        else:
+            periods.append([first, last])
+
+    return periods
+
+
+def missing_periods(parts, start, end):
+    """Periods between the days start and end (included) not covered by the files"""
+    missing, day = [], start
+    for first, last in stored_periods(parts):
+        if last < day:
+            continue
+        if first > end:
+            break
+        if first > day:
+            missing.append((day, first - ONE_DAY))
+        day = max(day, last + ONE_DAY)
+    if day <= end:
+        missing.append((day, end))
+
+    return missing
+
+
+def merge_parts(var_dir):
+    """Merge the files of every stored period of a variable when they are too many"""
+    parts = list_parts(var_dir)
+    if len(parts) <= POINT_ARCHIVE_MAX_PARTS:
+        return
+    for first, last in stored_periods(parts):
+        group = [part for part in parts if first <= part[0] and part[1] <= last]
+        if len(group) < 2:
+            continue
+        write_part(var_dir, read_parts(group, first, last), first, last)
+        merged = f"{first:%Y%m%d}_{last:%Y%m%d}.parquet"
+        for _, _, path in group:
+            if os.path.basename(path) != merged:
+                os.remove(path)
+
+
+def last_complete_day(block, kind, end):
+    """Last day of block with all its data (the archive lags a few days behind)"""
+    if block.empty:
+        return None
+    last = block["time"].max()
+    day = last.normalize()
+    if kind == "hourly" and last.hour < 23:
+        day -= ONE_DAY
+
+    return min(day, end)
+
+
+def read_attrs(directory):
+    try:
+        with open(os.path.join(directory, "attrs.json"), encoding="utf-8") as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return {}
+
+
+def merge_attrs(attrs, new):
+    """attrs updated with those of a new download, keeping the units of all the variables"""
+    attrs = dict(attrs)
+    for key, value in new.items():
+        if key.endswith("_units") and isinstance(value, dict):
+            attrs[key] = {**attrs.get(key, {}), **value}
+        else:
+            attrs[key] = value
+
+    return attrs
+
+
+def update_store(f, kind, kwargs, directory, variables, start, end):
+    """Download what is missing of every variable and return them all, as frames"""
+    var_parts = {var: list_parts(os.path.join(directory, var)) for var in variables}
+    # Read before writing, as the files may be merged afterwards (files
+    # merged by another worker in the meantime make the read fail)
+    try:
+        stored_data = {var: read_parts(var_parts[var], start, end) for var in variables}
+    except (OSError, pa.ArrowException) as e:
+        raise StoreError(e) from e
+    # Variables missing the same period are downloaded together
+    periods = {}
+    for var in variables:
+        for period in missing_periods(var_parts[var], start, end):
+            periods.setdefault(period, []).append(var)
+
+    attrs, downloaded = read_attrs(directory), {}
+    for (first, last), period_vars in periods.items():
+        data = f(**dict(kwargs,
+                        variables=",".join(period_vars),
+                        start_date=first.strftime("%Y-%m-%d"),
+                        end_date=last.strftime("%Y-%m-%d")))
+        attrs = merge_attrs(attrs, data.attrs)
+        for var, block in split_blocks(data, period_vars).items():
+            downloaded.setdefault(var, []).append(block)
+            # Gaps before stored days are final, at the end we only keep
+            # the complete days, the others are asked again next time
+            if any(part[0] > last for part in var_parts[var]):
+                stored_until = last
+            else:
+                stored_until = last_complete_day(block, kind, last)
+            if stored_until is None or stored_until < first:
+                continue
+            var_dir = os.path.join(directory, var)
+            try:
+                write_part(var_dir, block[block["time"] < stored_until + ONE_DAY], first, stored_until)
+                with process_lock(hashlib.sha1(var_dir.encode("utf-8")).hexdigest()):
+                    merge_parts(var_dir)
+            except OSError as e:
+                logging.warning(f"Cannot write to the point archive {directory}: {e}")
+    if periods:
+        try:
+            os.makedirs(directory, exist_ok=True)
+            with open(os.path.join(directory, "attrs.json"), "w", encoding="utf-8") as f_attrs:
+                json.dump(attrs, f_attrs, default=str)
+        except OSError as e:
+            logging.warning(f"Cannot write to the point archive {directory}: {e}")
+
+    blocks = {}
+    for var in variables:
+        frames = [frame for frame in [stored_data[var]] + downloaded.get(var, []) if frame is not None]
+        if not frames:
+            frames = [pd.DataFrame({"time": pd.Series(dtype="datetime64[ns]"), var: pd.Series(dtype=float)})]
+        block = pd.concat(frames, ignore_index=True) if len(frames) > 1 else frames[0]
+        block = block.drop_duplicates(subset="time", keep="last").sort_values("time")
+        blocks[var] = block[(block["time"] >= start) & (block["time"] < end + ONE_DAY)].reset_index(drop=True)
+
+    return blocks, attrs
+
+
+def point_archived(kind):
+    """
+    Decorator for the archive download functions, below the cache.
+    kind is the section of the response ("daily" or "hourly") and the
+    functions must return a frame with a time column and a column per
+    variable. The functions must be called with keyword arguments only
+    (this is what @single_flight does).
+    """
+    def decorator(f):
+        @wraps(f)
+        def wrapper(**kwargs):
+            if pa is None or not POINT_ARCHIVE_DIR:
+                return f(**kwargs)
+
+            params = {k: v for k, v in kwargs.items() if k not in IGNORED_ARGUMENTS}
+            directory = location_dir(kind, params)
+            variables = split_variables(kwargs["variables"])
+            start = pd.Timestamp(kwargs["start_date"]).normalize()
+            end = pd.Timestamp(kwargs["end_date"]).normalize()
+            try:
+                blocks, attrs = update_store(f, kind, kwargs, directory, variables, start, end)
+            except StoreError as e:
+                logging.warning(f"Cannot read the point archive {directory}, downloading: {e}")
+                return f(**kwargs)
+
+            # Rows with a missing value are dropped, as in the downloaded frames
+            data = assemble(blocks, variables).dropna().reset_index(drop=True)
+            request = attrs.get("request")
+            if request is not None:
+                attrs["request"] = dict(request, **{
+                    kind: ",".join(variables),
+                    "start_date": str(kwargs["start_date"]),
+                    "end_date": str(kwargs["end_date"]),
+                })
+            data.attrs = attrs
+
+            return data
+
+        return wrapper
+
+    return decorator
@@ -0,0 +1,73 @@
+"""
+Popularity of the locations selected by the users.
+Every submit is appended as a JSON line to LOCATIONS_LOG (each worker
+writes whole lines with O_APPEND, so they never mix) and the score of a
+location is the number of requests, each one weighted by how recent it is.
+The file can be rotated or truncated at any time.
+"""
+import json
+import math
+import os
+import time
+from .settings import LOCATIONS_LOG, POPULARITY_HALF_LIFE_DAYS
+from .custom_logger import logging
+
+# Requests older than this many half-lives are ignored (weight < 0.1%)
+MAX_HALF_LIVES = 10
+
+
+def record_location(latitude, longitude, label=None, page=None, path=LOCATIONS_LOG):
+    """Append a request for a location to the log, never raises"""
+    line = json.dumps({
+        "time": int(time.time()),
+        "latitude": float(latitude),
+        "longitude": float(longitude),
+        "label": label,
+        "page": page,
+    }) + "\n"
+    try:
+        fd = os.open(path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        try:
+            os.write(fd, line.encode("utf-8"))
+        finally:
+            os.close(fd)
+    except OSError as e:
+        logging.warning(f"Cannot record location in {path}: {e}")
+
+
+def popular_locations(top=None, path=LOCATIONS_LOG, half_life_days=POPULARITY_HALF_LIFE_DAYS):
+    """
+    Locations sorted by score, as a list of dicts with latitude, longitude,
+    label (the last one used), pages (where they were requested) and score.
+    """
+    half_life = half_life_days * 86400
+    now = time.time()
+    locations = {}
+    try:
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                    age = now - entry["time"]
+                    key = (round(entry["latitude"], 4), round(entry["longitude"], 4))
+                except (ValueError, KeyError, TypeError):
+                    continue
+                if age > MAX_HALF_LIVES * half_life:
+                    continue
+                loc = locations.setdefault(key, {
+                    "latitude": entry["latitude"],
+                    "longitude": entry["longitude"],
+                    "label": None,
+                    "pages": set(),
+                    "score": 0.0,
+                })
+                loc["score"] += math.pow(0.5, max(age, 0) / half_life)
+                loc["label"] = entry.get("label") or loc["label"]
+                if entry.get("page"):
+                    loc["pages"].add(entry["page"])
+    except FileNotFoundError:
+        return []
+
+    ranked = sorted(locations.values(), key=lambda loc: loc["score"], reverse=True)
+
+    return ranked[:top] if top else ranked
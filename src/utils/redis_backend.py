@@ -0,0 +1,206 @@
+"""
+Cache backend on a Redis server (or anything speaking its protocol), so
+that all the nodes behind a load balancer share the same entries instead
+of downloading and computing the same data each on their own.
+Values are stored like in the filesystem backend (DataFrames as Arrow IPC,
+everything else pickled) and recently used ones are also kept in memory
+in every worker. The URL fakeredis:// uses a server living inside the
+process (needs the fakeredis package), to try things out without Redis.
+"""
+import io
+import threading
+import time
+from flask_caching.backends.rediscache import RedisCache
+from cachelib.serializers import RedisSerializer
+from .cache_backend import DataFrameSerializer, ARROW_MAGIC, MEMVER_SUFFIX, pa
+from .local_cache import LocalCache, MISSING, value_size
+from .custom_logger import logging
+
+try:
+    import redis
+    from redis.exceptions import RedisError
+except ImportError:
+    redis = None
+
+    class RedisError(Exception):
+        pass
+
+try:
+    import fakeredis
+except ImportError:
+    fakeredis = None
+
+_clients = {}
+_clients_lock = threading.Lock()
+
+
+def redis_client(url):
+    """
+    Client for url, shared by the whole process (clients are thread-safe
+    and reconnect by themselves after a fork)
+    """
+    with _clients_lock:
+        if url not in _clients:
+            if url.startswith("fakeredis://"):
+                if fakeredis is None:
+                    raise RuntimeError("fakeredis:// needs the fakeredis package")
+                # All the clients of the process talk to the same server
+                if "fakeredis://" not in _clients:
+                    _clients["fakeredis://"] = fakeredis.FakeServer()
+                _clients[url] = fakeredis.FakeRedis(server=_clients["fakeredis://"])
+            else:
+                if redis is None:
+                    raise RuntimeError("The redis cache needs the redis package")
+                _clients[url] = redis.Redis.from_url(url)
+
+    return _clients[url]
+
+
+class RedisDataFrameSerializer(RedisSerializer):
+    """Same formats as DataFrameSerializer, but to and from bytes"""
+
+    def __init__(self, compression=None, zero_copy=False):
+        self.frames = DataFrameSerializer(compression=compression, zero_copy=zero_copy)
+
+    def dumps(self, value):
+        buffer = io.BytesIO()
+        if self.frames.dump_arrow(value, buffer):
+            return buffer.getvalue()
+
+        return super().dumps(value)
+
+    def loads(self, value):
+        if value is not None and value[:len(ARROW_MAGIC)] == ARROW_MAGIC:
+            if pa is None:
+                logging.warning("Cache entry needs pyarrow to be read")
+                return None
+            return self.frames.read_arrow(pa.py_buffer(value)[len(ARROW_MAGIC):])
+
+        return super().loads(value)
+
+
+class RedisDataFrameCache(RedisCache):
+    """
+    Use it with CACHE_TYPE = "utils.redis_backend.RedisDataFrameCache",
+    CACHE_REDIS_URL and CACHE_KEY_PREFIX. CACHE_OPTIONS can contain
+    compression and zero_copy (see DataFrameSerializer), local_max_bytes
+    and local_ttl (see LocalCache).
+    Errors talking to the server are logged and the cache behaves as
+    empty, as the filesystem backend does when it cannot read a file.
+    Eviction is left to the server (e.g. maxmemory-policy allkeys-lfu).
+    """
+
+    def __init__(self, host="localhost", compression=None, zero_copy=False,
+                 local_max_bytes=0, local_ttl=300, **kwargs):
+        super().__init__(host=host, **kwargs)
+        self.serializer = RedisDataFrameSerializer(compression=compression, zero_copy=zero_copy)
+        self.local = LocalCache(local_max_bytes, local_ttl)
+
+    @classmethod
+    def factory(cls, app, config, args, kwargs):
+        kwargs["host"] = redis_client(config["CACHE_REDIS_URL"])
+        if config.get("CACHE_KEY_PREFIX"):
+            kwargs["key_prefix"] = config["CACHE_KEY_PREFIX"]
+
+        return cls(*args, **kwargs)
+
+    def _fetch(self, keys):
+        """Values of keys from the server, stored also in the local cache"""
+        pipe = self._read_client.pipeline(transaction=False)
+        for key in keys:
+            pipe.get(f"{self._get_prefix()}{key}")
+            pipe.pttl(f"{self._get_prefix()}{key}")
+        results = pipe.execute()
+
+        now = time.time()
+        values = []
+        for key, raw, ttl in zip(keys, results[::2], results[1::2]):
+            value = self.serializer.loads(raw)
+            # Versions of memoized functions are always read from the server,
+            # so that delete_memoized on a node is seen by all the others
+            if value is not None and not key.endswith(MEMVER_SUFFIX):
+                expires = 0 if ttl < 0 else now + ttl / 1000
+                self.local.set(key, value, expires, value_size(value, len(raw)))
+            values.append(value)
+
+        return values
+
+    def get_many(self, *keys):
+        values, missing = {}, []
+        for key in keys:
+            value = MISSING if key.endswith(MEMVER_SUFFIX) else self.local.get(key)
+            if value is MISSING:
+                missing.append(key)
+            else:
+                values[key] = value
+        if missing:
+            try:
+                values.update(zip(missing, self._fetch(missing)))
+            except RedisError as e:
+                logging.warning(f"Cannot read from the Redis cache: {e}")
+                values.update((key, None) for key in missing)
+
+        return [values[key] for key in keys]
+
+    def get(self, key):
+        return self.get_many(key)[0]
+
+    def _set_local(self, key, value, timeout):
+        if key.endswith(MEMVER_SUFFIX):
+            self.local.delete(key)
+            return
+        timeout = self._normalize_timeout(timeout)
+        expires = 0 if timeout == -1 else time.time() + timeout
+        self.local.set(key, value, expires, value_size(value, 0))
+
+    def set(self, key, value, timeout=None):
+        try:
+            result = super().set(key, value, timeout=timeout)
+        except RedisError as e:
+            logging.warning(f"Cannot write to the Redis cache: {e}")
+            self.local.delete(key)
+            return False
+        self._set_local(key, value, timeout)
+
+        return result
+
+    def set_many(self, mapping, timeout=None):
+        try:
+            result = super().set_many(mapping, timeout=timeout)
+        except RedisError as e:
+            logging.warning(f"Cannot write to the Redis cache: {e}")
+            for key in mapping:
+                self.local.delete(key)
+            return []
+        for key, value in mapping.items():
+            self._set_local(key, value, timeout)
+
+        return result
+
+    def add(self, key, value, timeout=None):
+        self.local.delete(key)
+
+        return super().add(key, value, timeout=timeout)
+
+    def delete(self, key):
+        self.local.delete(key)
+
+        return super().delete(key)
+
+    def delete_many(self, *keys):
+        for key in keys:
+            self.local.delete(key)
+
+        return super().delete_many(*keys)
+
+    def clear(self):
+        self.local.clear()
+
+        return super().clear()
+
+    def invalidate_local(self, key=None):
+        """Same as DataFrameFileSystemCache.invalidate_local"""
+        if key is None:
+            self.local.clear()
+        else:
+            self.local.delete(key)
@@ -1,4 +1,6 @@
 # package imports
+from contextlib import nullcontext
+from flask import current_app, has_app_context
 from flask_caching import Cache
 import plotly.io as pio
 import utils.custom_theme
@@ -19,6 +21,125 @@ OPENWEATHERMAP_KEY = os.getenv("OPENWEATHERMAP_KEY", None)
 MAPBOX_API_PLACES_URL = "https://api.mapbox.com/geocoding/v5/mapbox.places"
 CACHE_DIR = os.getenv("CACHE_DIR", "/var/cache/pointwx/")
 DISABLE_CACHE = os.getenv("DISABLE_CACHE", "false").lower() == "true"
+# Where the cache lives: "filesystem" (CACHE_DIR, shared by the workers of this node)
+# or "redis" (REDIS_URL, shared by all the nodes, needs the redis package).
+# REDIS_URL = fakeredis:// runs a stand-in server inside the process (needs fakeredis)
+CACHE_BACKEND = os.getenv("CACHE_BACKEND", "filesystem")
+REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379/0")
+# All the keys in Redis start with CACHE_KEY_NAMESPACE. CACHE_KEY_VERSION is increased
+# when the format of the cached values changes, so that nodes running different
+# versions of the app never read each other's entries
+CACHE_KEY_PREFIX = os.getenv("CACHE_KEY_PREFIX", "pointwx")
+CACHE_KEY_VERSION = 1
+CACHE_KEY_NAMESPACE = f"{CACHE_KEY_PREFIX}:v{CACHE_KEY_VERSION}:"
+# DataFrames are stored in the cache as Arrow IPC files (if pyarrow is installed).
+# CACHE_COMPRESSION can be "lz4" or "zstd" to shrink them on disk, CACHE_ZERO_COPY
+# returns read-only frames that point directly into the cache files
+CACHE_COMPRESSION = os.getenv("CACHE_COMPRESSION", None)
+CACHE_ZERO_COPY = os.getenv("CACHE_ZERO_COPY", "false").lower() == "true"
+# Size budget of the cache directory (0 = no limit). Every CACHE_COMPACTION_INTERVAL
+# seconds expired entries are removed and, if over budget, the least valuable ones
+# are evicted: those of cheap functions (see CACHE_COST_WEIGHTS) that were used least
+# recently ("lru") or least often ("lfu"). Run python -m utils.cache_admin for a report
+CACHE_MAX_SIZE_MB = int(os.getenv("CACHE_MAX_SIZE_MB", "2048"))
+CACHE_EVICTION_POLICY = os.getenv("CACHE_EVICTION_POLICY", "lru")
+CACHE_COMPACTION_INTERVAL = int(os.getenv("CACHE_COMPACTION_INTERVAL", "600"))
+# Every worker also keeps the most recently used entries in memory, up to
+# CACHE_LOCAL_SIZE_MB (0 to disable). Entries are re-read from the directory at
+# least every CACHE_LOCAL_TTL seconds, as they may be changed by other workers
+CACHE_LOCAL_SIZE_MB = int(os.getenv("CACHE_LOCAL_SIZE_MB", "128"))
+CACHE_LOCAL_TTL = int(os.getenv("CACHE_LOCAL_TTL", "300"))
+# How expensive it is to recompute the result of a function (default 1),
+# roughly the time it takes compared to a single forecast request
+CACHE_COST_WEIGHTS = {
+    "compute_climate_baseline": 100,
+    "compute_climatology": 100,
+    "compute_monthly_clima": 100,
+    "compute_climatology_zarr": 100,
+    "compute_harmonic_climatology": 100,
+    "get_historical_data": 50,
+    "create_ai_report": 50,
+    "get_historical_daily_data": 20,
+    "compute_yearly_accumulation": 20,
+    "compute_yearly_comparison": 20,
+    "compute_daily_ensemble_meteogram": 5,
+    "_download_ensemble_data": 5,
+    "_download_ensemble_daily_data": 5,
+}
+# Timeouts (in seconds) used for every upstream HTTP request
+HTTP_CONNECT_TIMEOUT = float(os.getenv("HTTP_CONNECT_TIMEOUT", "5"))
+HTTP_READ_TIMEOUT = float(os.getenv("HTTP_READ_TIMEOUT", "60"))
+# Size of the keep-alive connection pool (per worker) for every upstream host.
+# Hosts that are not listed here use HTTP_DEFAULT_POOL_SIZE.
+HTTP_DEFAULT_POOL_SIZE = int(os.getenv("HTTP_DEFAULT_POOL_SIZE", "4"))
+HTTP_POOL_SIZES = {
+    "api.open-meteo.com": 10,
+    "ensemble-api.open-meteo.com": 10,
+    "archive-api.open-meteo.com": 10,
+    "geocoding-api.open-meteo.com": 4,
+    "marine-api.open-meteo.com": 2,
+}
+# Directory holding the lock files used to coalesce identical upstream requests
+# across workers. This cannot live inside CACHE_DIR, as the filesystem cache
+# assumes to be the only user of that directory.
+LOCK_DIR = os.getenv("LOCK_DIR", os.path.join(tempfile.gettempdir(), "pointwx-locks"))
+# Maximum time (in seconds) a request waits for an identical in-flight request
+# before giving up and fetching the data on its own
+SINGLE_FLIGHT_TIMEOUT = float(os.getenv("SINGLE_FLIGHT_TIMEOUT", "120"))
+# Every submitted location is appended (one JSON line) to LOCATIONS_LOG, from which
+# the cache warmer (python -m utils.cache_warmer) computes the most popular ones.
+# A request counts half after POPULARITY_HALF_LIFE_DAYS
+LOCATIONS_LOG = os.getenv("LOCATIONS_LOG", os.path.join(tempfile.gettempdir(), "pointwx-locations.jsonl"))
+POPULARITY_HALF_LIFE_DAYS = float(os.getenv("POPULARITY_HALF_LIFE_DAYS", "7"))
+# The warmer keeps the data of the CACHE_WARMER_TOP_LOCATIONS most popular locations
+# fresh, with a pass every time a new model run is available (or every
+# CACHE_WARMER_INTERVAL seconds), sending at most CACHE_WARMER_BUDGET upstream requests per pass
+CACHE_WARMER_TOP_LOCATIONS = int(os.getenv("CACHE_WARMER_TOP_LOCATIONS", "200"))
+CACHE_WARMER_INTERVAL = int(os.getenv("CACHE_WARMER_INTERVAL", "1800"))
+CACHE_WARMER_BUDGET = int(os.getenv("CACHE_WARMER_BUDGET", "300"))
+# Ensemble models warmed for every location (ensemble page and meteogram)
+CACHE_WARMER_ENSEMBLE_MODELS = os.getenv("CACHE_WARMER_ENSEMBLE_MODELS", "icon_seamless,ecmwf_ifs025").split(",")
+# Maximum number of locations sent in a single request by the *_batch fetchers
+OPENMETEO_BATCH_SIZE = int(os.getenv("OPENMETEO_BATCH_SIZE", "50"))
+# Run metadata (meta.json) of the models is re-read at most every MODEL_META_TIMEOUT
+# seconds. Forecasts of models that publish it are cached until a newer run is
+# available, but never longer than MODEL_RUN_TIMEOUT seconds
+MODEL_META_TIMEOUT = int(os.getenv("MODEL_META_TIMEOUT", "300"))
+MODEL_RUN_TIMEOUT = int(os.getenv("MODEL_RUN_TIMEOUT", "86400"))
+# Forecasts are always downloaded for this many days (the maximum of the API)
+# and then cut to what was requested, so that a single cache entry serves all
+# the forecast_days values
+FORECAST_MAX_DAYS = int(os.getenv("FORECAST_MAX_DAYS", "16"))
+# Cached forecasts and ensembles that are out of date are served immediately while
+# they are refreshed in the background: those of an older model run for up to this
+# many seconds after the newer run became available, the others for up to this many
+# seconds after their timeout. Set to 0 to always wait for fresh data
+STALE_WHILE_REVALIDATE = int(os.getenv("STALE_WHILE_REVALIDATE", "3600"))
+# Historical (archive) data is cached by calendar year. A year is closed, and kept until
+# evicted, HISTORICAL_ARCHIVE_DELAY_DAYS days after its end (the reanalysis comes out with
+# a delay), the current one is downloaded again every HISTORICAL_OPEN_YEAR_TIMEOUT seconds.
+# Missing years are downloaded with up to HISTORICAL_DOWNLOAD_WORKERS parallel requests
+HISTORICAL_OPEN_YEAR_TIMEOUT = int(os.getenv("HISTORICAL_OPEN_YEAR_TIMEOUT", "10800"))
+HISTORICAL_ARCHIVE_DELAY_DAYS = int(os.getenv("HISTORICAL_ARCHIVE_DELAY_DAYS", "7"))
+HISTORICAL_DOWNLOAD_WORKERS = int(os.getenv("HISTORICAL_DOWNLOAD_WORKERS", "4"))
+# Independent downloads of a page (e.g. ensemble, deterministic forecast and climatology
+# of the meteogram) run together with up to PAGE_FETCH_WORKERS threads (1 to disable).
+# Optional ones (e.g. the climatology lines) are given up after PAGE_FETCH_TIMEOUT seconds
+PAGE_FETCH_WORKERS = int(os.getenv("PAGE_FETCH_WORKERS", "4"))
+PAGE_FETCH_TIMEOUT = float(os.getenv("PAGE_FETCH_TIMEOUT", "20"))
+# Archive series of every location and model are also kept in POINT_ARCHIVE_DIR
+# (Parquet files, needs pyarrow, empty to disable) so that only the days added to the
+# archive since are downloaded. Files of a variable are merged above POINT_ARCHIVE_MAX_PARTS
+POINT_ARCHIVE_DIR = os.getenv("POINT_ARCHIVE_DIR", os.path.join(tempfile.gettempdir(), "pointwx-archive"))
+POINT_ARCHIVE_MAX_PARTS = int(os.getenv("POINT_ARCHIVE_MAX_PARTS", "30"))
+# Hourly climatology shown in the ensemble page: "table" (mean of every day and hour),
+# "harmonic" (a few annual and diurnal harmonics fitted to the hourly data, much smaller
+# to cache) or "harmonic_daily" (built from daily max, min and mean, no hourly download)
+CLIMATOLOGY_MODE = os.getenv("CLIMATOLOGY_MODE", "table")
+# Transport used to download data from open-meteo: "json" or "flatbuffers"
+# (binary, decoded straight into float32 arrays, needs openmeteo-sdk).
+# Can also be changed per call with the response_format argument of the fetchers
+OPENMETEO_FORMAT = os.getenv("OPENMETEO_FORMAT", "json")
 
 # This is imported from utils.custom_theme
 # You have to change the theme settings there
@@ -48,18 +169,60 @@ def get_cache_directory():
     return None
 
 
+# Options of utils.cache_backend.DataFrameFileSystemCache
+CACHE_BACKEND_OPTIONS = {
+    "compression": CACHE_COMPRESSION,
+    "zero_copy": CACHE_ZERO_COPY,
+    "max_bytes": CACHE_MAX_SIZE_MB * 1024 * 1024,
+    "eviction_policy": CACHE_EVICTION_POLICY,
+    "cost_weights": CACHE_COST_WEIGHTS,
+    "compaction_interval": CACHE_COMPACTION_INTERVAL,
+    "lock_dir": LOCK_DIR,
+    "local_max_bytes": CACHE_LOCAL_SIZE_MB * 1024 * 1024,
+    "local_ttl": CACHE_LOCAL_TTL,
+}
+
 if DISABLE_CACHE:
     cache = Cache(config={"CACHE_TYPE": "null"})
+elif CACHE_BACKEND == "redis":
+    logging.info("Using Redis as cache")
+    cache = Cache(config={
+        "CACHE_TYPE": "utils.redis_backend.RedisDataFrameCache",
+        "CACHE_REDIS_URL": REDIS_URL,
+        "CACHE_KEY_PREFIX": CACHE_KEY_NAMESPACE,
+        "CACHE_OPTIONS": {
+            "compression": CACHE_COMPRESSION,
+            "zero_copy": CACHE_ZERO_COPY,
+            "local_max_bytes": CACHE_LOCAL_SIZE_MB * 1024 * 1024,
+            "local_ttl": CACHE_LOCAL_TTL,
+        },
+    })
 else:
     cache_dir = get_cache_directory()
     if cache_dir:
         logging.info(f"Using {cache_dir} as cache directory")
-        cache = Cache(config={"CACHE_TYPE": "filesystem", "CACHE_DIR": cache_dir})
+        cache = Cache(config={
+            "CACHE_TYPE": "utils.cache_backend.DataFrameFileSystemCache",
+            "CACHE_DIR": cache_dir,
+            # The size is limited by max_bytes, not by the number of entries
+            "CACHE_THRESHOLD": 0 if CACHE_MAX_SIZE_MB else 500,
+            "CACHE_OPTIONS": CACHE_BACKEND_OPTIONS,
+        })
     else:
         logging.warning("No writable cache directory found, disabling cache")
         cache = Cache(config={"CACHE_TYPE": "null"})
 
 
+def thread_app_context():
+    """
+    Function giving, in any thread, the app context of the caller: threads
+    started by a callback need it to use the cache (init_app doesn't keep the app)
+    """
+    app = current_app._get_current_object() if has_app_context() else None
+
+    return lambda: app.app_context() if app is not None else nullcontext()
+
+
 def filter_options(values_to_find, options):
     """
     Helper function which helps in filtering a set of options
@@ -178,8 +341,7 @@ ENSEMBLE_MODELS = [
 # Maps internal model values (as used in this app) to the model slug used by
 # open-meteo's static meta.json endpoint (https://<api-host>/data/<slug>/static/meta.json),
 # which exposes info about the latest available run for a model (e.g. its
-# initialisation time). Currently only ensemble models are mapped; deterministic
-# models could be added here later following the same pattern.
+# initialisation time). Deterministic models are in FORECAST_MODEL_META_MAP.
 # Seamless models (icon_seamless, gfs_seamless) are intentionally excluded: they
 # blend multiple runs/models so there isn't a single meta.json to point to.
 MODEL_META_MAP = {
@@ -199,6 +361,32 @@ MODEL_META_MAP = {
     "ukmo_uk_ensemble_2km": "ukmo_uk_ensemble_2km",
 }
 
+# Spacing (degrees) of the regular grid(s) used by a model, used to share the
+# cache between requests falling in the same grid cell (see utils.grid_alias).
+# Seamless models list the spacing of all the grids they combine.
+MODEL_GRID_SPACING = {
+    "era5": (0.25,),
+    "era5_land": (0.1,),
+    "era5_seamless": (0.1, 0.25),
+    "ecmwf_ifs025": (0.25,),
+    "ecmwf_aifs025": (0.25,),
+    "gfs025": (0.25,),
+    "gfs05": (0.5,),
+    "ncep_aigefs025": (0.25,),
+}
+# Requests in the same grid cell share the data only if their elevation (to which
+# the data is downscaled) differs by less than this (in metres)
+GRID_ALIAS_ELEVATION_TOLERANCE = float(os.getenv("GRID_ALIAS_ELEVATION_TOLERANCE", "10"))
+GRID_ALIAS_TIMEOUT = int(os.getenv("GRID_ALIAS_TIMEOUT", "2592000"))
+
+# Same as MODEL_META_MAP but for the deterministic models of the forecast API
+FORECAST_MODEL_META_MAP = {
+    "ecmwf_ifs025": "ecmwf_ifs025",
+    "icon_global": "dwd_icon",
+    "icon_eu": "dwd_icon_eu",
+    "icon_d2": "dwd_icon_d2",
+}
+
 # The variables that we decide to expose as dropdown for ensemble models
 ENSEMBLE_VARS = [
     {
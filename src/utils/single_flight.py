@@ -0,0 +1,232 @@
+"""
+Request coalescing ("single-flight") for the memoized fetchers.
+When the same call is issued concurrently (many users opening the same
+location, double submits...) only the first caller runs the function,
+while the others wait for it and then read the result.
+Inside a process the waiters receive the result directly, across
+gunicorn workers they wait on a file lock and then hit the cache.
+With the Redis cache the lock is taken on the server instead, so that
+identical requests are coalesced across all the nodes.
+"""
+import copy
+import hashlib
+import inspect
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+from contextlib import contextmanager
+from functools import wraps
+from .settings import (
+    LOCK_DIR,
+    SINGLE_FLIGHT_TIMEOUT,
+    CACHE_BACKEND,
+    REDIS_URL,
+    CACHE_KEY_NAMESPACE,
+)
+from .custom_logger import logging
+
+try:
+    import fcntl
+except ImportError:  # e.g. Windows: only coalesce inside the process
+    fcntl = None
+
+# Number of lock files used across processes. Keys are hashed
+# onto these stripes so that the lock directory doesn't grow unbounded.
+LOCK_STRIPES = 4096
+
+_in_flight = {}
+_in_flight_lock = threading.Lock()
+# Stripes locked by this process (stripe -> file descriptor and keys holding it)
+_held_stripes = {}
+_held_stripes_lock = threading.Lock()
+
+
+def canonical_arguments(f, args, kwargs):
+    """
+    Return all the arguments of a call to f as keywords, defaults included,
+    so that the call does not depend on how the arguments were passed
+    (positional vs keyword, explicit defaults or not).
+    """
+    bound = inspect.signature(f).bind(*args, **kwargs)
+    bound.apply_defaults()
+
+    return dict(bound.arguments)
+
+
+def canonical_key(f, arguments):
+    raw = f"{f.__module__}.{f.__qualname__}{sorted(arguments.items())}"
+
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+
+def _release_stripe(stripe, key):
+    with _held_stripes_lock:
+        held = _held_stripes[stripe]
+        held["keys"].remove(key)
+        if held["keys"]:
+            return
+        del _held_stripes[stripe]
+    fcntl.flock(held["fd"], fcntl.LOCK_UN)
+    os.close(held["fd"])
+
+
+@contextmanager
+def process_lock(key, timeout=SINGLE_FLIGHT_TIMEOUT):
+    """
+    Exclusive lock shared by all the processes on this host.
+    If the lock cannot be acquired within timeout we go on without it:
+    worst case the request is sent twice, as it was before.
+    """
+    if fcntl is None:
+        yield False
+        return
+
+    stripe = int(key[:8], 16) % LOCK_STRIPES
+    with _held_stripes_lock:
+        held = _held_stripes.get(stripe)
+        # The stripe is already locked by this process for another key (e.g.
+        # a nested call): flock would wait for ourselves, so we join the holder
+        reentrant = held is not None and key not in held["keys"]
+        if reentrant:
+            held["keys"].append(key)
+    if reentrant:
+        try:
+            yield True
+        finally:
+            _release_stripe(stripe, key)
+        return
+
+    try:
+        os.makedirs(LOCK_DIR, exist_ok=True)
+        fd = os.open(os.path.join(LOCK_DIR, f"{stripe:04d}.lock"), os.O_RDWR | os.O_CREAT, 0o600)
+    except OSError as e:
+        logging.warning(f"Cannot open lock file in {LOCK_DIR}: {e}")
+        yield False
+        return
+
+    acquired = False
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            acquired = True
+            break
+        except BlockingIOError:
+            if time.monotonic() >= deadline:
+                logging.warning(f"Timeout waiting for lock {key}, fetching without it")
+                break
+            time.sleep(0.05)
+    if not acquired:
+        os.close(fd)
+        yield False
+        return
+
+    with _held_stripes_lock:
+        _held_stripes[stripe] = {"fd": fd, "keys": [key]}
+    try:
+        yield True
+    finally:
+        # The file is unlocked when the last key of the stripe is released
+        _release_stripe(stripe, key)
+
+
+@contextmanager
+def shared_lock(key, timeout=SINGLE_FLIGHT_TIMEOUT):
+    """
+    Same as process_lock, but held on the Redis server (SET NX) so that
+    it is shared by all the nodes. The lock expires after timeout, in case
+    its holder dies, as waiters would stop waiting anyway.
+    """
+    from .redis_backend import redis_client, RedisError
+
+    name = f"{CACHE_KEY_NAMESPACE}lock:{key}"
+    token = uuid.uuid4().hex
+    acquired = False
+    try:
+        client = redis_client(REDIS_URL)
+        deadline = time.monotonic() + timeout
+        while not acquired:
+            acquired = bool(client.set(name, token, nx=True, px=int(timeout * 1000)))
+            if not acquired:
+                if time.monotonic() >= deadline:
+                    logging.warning(f"Timeout waiting for lock {key}, fetching without it")
+                    break
+                time.sleep(0.05)
+    except (RedisError, RuntimeError) as e:
+        logging.warning(f"Cannot take the shared lock {key}, fetching without it: {e}")
+
+    try:
+        yield acquired
+    finally:
+        if acquired:
+            try:
+                # Only release the lock if it is still ours (it may have expired)
+                with client.pipeline() as pipe:
+                    pipe.watch(name)
+                    if pipe.get(name) == token.encode():
+                        pipe.multi()
+                        pipe.delete(name)
+                        pipe.execute()
+            except RedisError as e:
+                logging.warning(f"Cannot release the shared lock {key}: {e}")
+
+
+def cross_process_lock(key):
+    """Lock shared by all the processes that share the cache"""
+    if CACHE_BACKEND == "redis":
+        return shared_lock(key)
+
+    return process_lock(key)
+
+
+def single_flight(f):
+    """
+    Decorator to be placed on top of @cache.memoize so that identical
+    concurrent calls are coalesced into a single execution.
+    """
+    @wraps(f)
+    def wrapper(*args, **kwargs):
+        # Always call f with explicit keywords: this way the memoize key
+        # is the same however the caller passed the arguments
+        kwargs = canonical_arguments(f, args, kwargs)
+        args = ()
+        key = canonical_key(f, kwargs)
+
+        with _in_flight_lock:
+            entry = _in_flight.get(key)
+            leader = entry is None
+            if leader:
+                entry = _in_flight[key] = {"future": Future(), "waiters": 0}
+            else:
+                entry["waiters"] += 1
+
+        if not leader:
+            try:
+                # Callers are free to modify the returned object, so every
+                # waiter gets its own copy
+                return copy.deepcopy(entry["future"].result(timeout=SINGLE_FLIGHT_TIMEOUT))
+            except FutureTimeoutError:
+                logging.warning(f"Timeout waiting for {f.__name__}, fetching without coalescing")
+                return f(*args, **kwargs)
+
+        try:
+            with cross_process_lock(key):
+                result = f(*args, **kwargs)
+        except BaseException as e:
+            with _in_flight_lock:
+                _in_flight.pop(key, None)
+            entry["future"].set_exception(e)
+            raise
+
+        with _in_flight_lock:
+            _in_flight.pop(key, None)
+        if entry["waiters"] > 0:
+            # Hand a private snapshot to the waiters, as our caller
+            # may start modifying the result as soon as we return it
+            entry["future"].set_result(copy.deepcopy(result))
+
+        return result
+
+    return wrapper
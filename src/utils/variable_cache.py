@@ -0,0 +1,292 @@
+"""
+Cache of the downloaded frames split by variable.
+Instead of storing one entry per combination of variables (e.g. the
+ensemble page and the ensemble heatmap asking different variables for the
+same point) every variable is stored as its own block of columns, keyed by
+the rest of the request and by the model run. A request only downloads the
+variables that are not in the cache yet (in a single call) and the frame is
+assembled from the blocks.
+Blocks that are out of date (from an older model run, or older than the
+timeout) are served as they are for STALE_WHILE_REVALIDATE more seconds
+(after the newer run came out, or after the timeout) while they are
+refreshed in the background (stale-while-revalidate).
+"""
+import copy
+import hashlib
+import threading
+from functools import reduce, wraps
+import pandas as pd
+from .settings import cache, thread_app_context, MODEL_RUN_TIMEOUT, STALE_WHILE_REVALIDATE
+from .single_flight import cross_process_lock
+from .custom_logger import logging
+
+# Arguments that do not change the content of the data
+IGNORED_ARGUMENTS = ("variables", "response_format")
+
+
+def split_variables(variables):
+    """
+    List of the variables in a comma separated string (or in a list),
+    without duplicates and in the same order
+    """
+    if isinstance(variables, str):
+        variables = variables.split(",")
+    out = []
+    for var in variables:
+        var = var.strip()
+        if var and var not in out:
+            out.append(var)
+
+    return out
+
+
+# Background refreshes running in this process (key -> thread)
+_refreshing = {}
+_refreshing_lock = threading.Lock()
+
+
+def block_key(namespace, params, variable):
+    raw = f"{sorted(params.items())}|{variable}"
+
+    return f"{namespace}:{hashlib.sha1(raw.encode('utf-8')).hexdigest()}"
+
+
+def data_age(data):
+    """Seconds since data was downloaded (attrs['fetched_at']), None if unknown"""
+    fetched_at = data.attrs.get("fetched_at")
+    if fetched_at is None:
+        return None
+
+    return (pd.Timestamp.now(tz="UTC") - fetched_at).total_seconds()
+
+
+def wait_for_refreshes(timeout=None):
+    """Wait for the background refreshes started by this process to finish"""
+    with _refreshing_lock:
+        threads = list(_refreshing.values())
+    for thread in threads:
+        thread.join(timeout)
+
+
+def is_current_run(data, run):
+    """
+    Whether data (attrs['model_run']) comes from run or from a newer one:
+    a stale read of the run metadata never rejects newer data
+    """
+    tag = data.attrs.get("model_run")
+
+    return tag is not None and tag >= run
+
+
+def split_blocks(data, variables):
+    """
+    Split data into one frame (time + columns) per variable.
+    Columns are either the variable itself or the variable plus a suffix
+    (ensemble member, model name...). When more variables match the same
+    column (e.g. snowfall and snowfall_height) the longest one wins.
+    """
+    owners = {}
+    for col in data.columns[data.columns != "time"]:
+        matches = [v for v in variables if col == v or col.startswith(f"{v}_")]
+        if matches:
+            owners.setdefault(max(matches, key=len), []).append(col)
+
+    blocks = {}
+    for var in variables:
+        block = data[["time"] + owners.get(var, [])].reset_index(drop=True)
+        block.attrs = copy.deepcopy(data.attrs)
+        blocks[var] = block
+
+    return blocks
+
+
+def assemble(blocks, variables):
+    """
+    Frame with the columns of all the variables, in the requested order
+    """
+    frames = [blocks[var] for var in variables]
+    first = frames[0]
+    if all(frame["time"].equals(first["time"]) for frame in frames[1:]):
+        data = pd.concat(
+            [first[["time"]]] + [frame.drop(columns="time") for frame in frames],
+            axis=1)
+    else:
+        # Blocks downloaded at different times may not cover the same period
+        data = reduce(
+            lambda left, right: left.merge(right, on="time", how="outer"),
+            [frame.dropna(subset=["time"]) for frame in frames],
+        ).sort_values("time").reset_index(drop=True)
+
+    value_columns = data.columns[data.columns != "time"]
+    if len(value_columns) > 0:
+        data = data.dropna(subset=value_columns, how="all")
+
+    attrs = copy.deepcopy(first.attrs)
+    for frame in frames[1:]:
+        for key, value in frame.attrs.items():
+            if key.endswith("_units"):
+                attrs.setdefault(key, {}).update(value)
+    # The data is as old as its oldest block
+    fetched = [frame.attrs["fetched_at"] for frame in frames if "fetched_at" in frame.attrs]
+    if fetched:
+        attrs["fetched_at"] = min(fetched)
+    request = attrs.get("request")
+    if request is not None:
+        for section in ("hourly", "minutely_15", "daily"):
+            if section in request:
+                request[section] = ",".join(variables)
+    data.attrs = attrs
+
+    return data
+
+
+def cache_by_variable(timeout, get_run=None, stale_ttl=STALE_WHILE_REVALIDATE):
+    """
+    Decorator used instead of @cache.memoize on download functions that
+    have a variables argument (comma separated string or list).
+    get_run, if given, returns the current model run for the call
+    arguments (or None if unknown): blocks are then up to date until a newer
+    run is available (and kept at most MODEL_RUN_TIMEOUT) instead of timeout seconds.
+    Out of date blocks are served while they are refreshed in the background
+    for stale_ttl more seconds (after the newer run became available for the
+    blocks of an older run, after the timeout for the others, 0 to always wait
+    for fresh data).
+    The functions must be called with keyword arguments only
+    (this is what @single_flight does).
+    """
+    def decorator(f):
+        namespace = f"{f.__module__}.{f.__qualname__}"
+
+        def current_run(kwargs):
+            return get_run(kwargs) if get_run is not None else None
+
+        def is_fresh(block, run):
+            if run is not None:
+                return is_current_run(block, run)
+            age = data_age(block)
+
+            return age is not None and age <= timeout
+
+        def is_servable(block, run):
+            """
+            Whether an out of date block can still be served while refreshing:
+            blocks of an older run until stale_ttl seconds after the newer run
+            became available, the others until stale_ttl seconds after their timeout
+            """
+            if run is not None:
+                return (pd.Timestamp.now(tz="UTC") - run).total_seconds() <= stale_ttl
+            age = data_age(block)
+
+            return age is not None and age <= timeout + stale_ttl
+
+        def get_blocks(kwargs, variables):
+            params = {k: v for k, v in kwargs.items() if k not in IGNORED_ARGUMENTS}
+            keys = [block_key(namespace, params, var) for var in variables]
+
+            return {
+                var: block
+                for var, block in zip(variables, cache.get_many(*keys))
+                if block is not None
+            }
+
+        def set_blocks(data, kwargs, variables, run):
+            params = {k: v for k, v in kwargs.items() if k not in IGNORED_ARGUMENTS}
+            if run is not None:
+                data.attrs["model_run"] = run
+            data.attrs["fetched_at"] = pd.Timestamp.now(tz="UTC")
+            blocks = split_blocks(data, variables)
+            for var, block in blocks.items():
+                cache.set(
+                    block_key(namespace, params, var),
+                    block,
+                    timeout=MODEL_RUN_TIMEOUT if run is not None else timeout + stale_ttl,
+                )
+
+            return blocks
+
+        def split_fresh(blocks, run):
+            """Split blocks into fresh ones and stale ones that can still be served"""
+            fresh = {var: block for var, block in blocks.items() if is_fresh(block, run)}
+            stale = {}
+            if stale_ttl > 0:
+                stale = {
+                    var: block
+                    for var, block in blocks.items()
+                    if var not in fresh and is_servable(block, run)
+                }
+
+            return fresh, stale
+
+        def refresh(kwargs, variables):
+            """Download again variables in a background thread, once per process"""
+            params = {k: v for k, v in kwargs.items() if k not in IGNORED_ARGUMENTS}
+            key = hashlib.sha1(f"{namespace}{sorted(params.items())}{variables}".encode("utf-8")).hexdigest()
+            # The thread has no app context of its own
+            app_context = thread_app_context()
+
+            def task():
+                try:
+                    with app_context():
+                        # Only one process refreshes, the others find the new blocks
+                        with cross_process_lock(key):
+                            run = current_run(kwargs)
+                            fresh, _ = split_fresh(get_blocks(kwargs, variables), run)
+                            outdated = [var for var in variables if var not in fresh]
+                            if outdated:
+                                data = f(**dict(kwargs, variables=",".join(outdated)))
+                                set_blocks(data, kwargs, outdated, run)
+                except Exception as e:
+                    logging.warning(f"Background refresh of {f.__name__} failed: {type(e).__name__}: {e}")
+                finally:
+                    with _refreshing_lock:
+                        _refreshing.pop(key, None)
+
+            with _refreshing_lock:
+                if key in _refreshing:
+                    return
+                thread = _refreshing[key] = threading.Thread(
+                    target=task, name=f"refresh-{f.__name__}", daemon=True)
+            thread.start()
+
+        @wraps(f)
+        def wrapper(**kwargs):
+            variables = split_variables(kwargs["variables"])
+            run = current_run(kwargs)
+            fresh, stale = split_fresh(get_blocks(kwargs, variables), run)
+            missing = [var for var in variables if var not in fresh and var not in stale]
+            if missing:
+                # We have to wait for a download anyway: include the stale variables in it
+                outdated = [var for var in variables if var not in fresh]
+                data = f(**dict(kwargs, variables=",".join(outdated)))
+                fresh.update(set_blocks(data, kwargs, outdated, run))
+            elif stale:
+                refresh(kwargs, list(stale))
+                fresh.update(stale)
+
+            return assemble(fresh, variables)
+
+        def get_cached(**kwargs):
+            """Assembled frame if all the variables are in the cache, None otherwise"""
+            variables = split_variables(kwargs["variables"])
+            fresh, stale = split_fresh(get_blocks(kwargs, variables), current_run(kwargs))
+            if len(fresh) + len(stale) < len(variables):
+                return None
+            if stale:
+                refresh(kwargs, list(stale))
+
+            return assemble({**fresh, **stale}, variables)
+
+        def set_cached(data, **kwargs):
+            """Store a frame downloaded outside of f (e.g. in a batch request)"""
+            variables = split_variables(kwargs["variables"])
+            blocks = set_blocks(data, kwargs, variables, current_run(kwargs))
+
+            return assemble(blocks, variables)
+
+        wrapper.uncached = f
+        wrapper.get_cached = get_cached
+        wrapper.set_cached = set_cached
+
+        return wrapper
+
+    return decorator
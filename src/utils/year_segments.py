@@ -0,0 +1,191 @@
+"""
+Cache of the historical (archive) downloads split by calendar year.
+The pages ask for periods ending today, so caching the whole request would
+give a new entry, and a new download of decades of data, every day.
+Instead every year is stored as its own segment, keyed by the rest of the
+request: closed years never change and are kept as long as possible, the
+current (open) one is downloaded again after a short timeout. A request is
+assembled from the segments and cut to its dates, whatever the dates are.
+The missing segments are downloaded in parallel, with contiguous years
+grouped in the same request.
+"""
+import copy
+import hashlib
+import math
+from concurrent.futures import ThreadPoolExecutor
+from functools import wraps
+import pandas as pd
+from .settings import (
+    cache,
+    HISTORICAL_OPEN_YEAR_TIMEOUT,
+    HISTORICAL_ARCHIVE_DELAY_DAYS,
+    HISTORICAL_DOWNLOAD_WORKERS,
+)
+
+# Arguments that do not change the content of a segment
+IGNORED_ARGUMENTS = ("start_date", "end_date", "response_format")
+
+
+def segment_key(namespace, params, year):
+    raw = f"{sorted(params.items())}|{year}"
+
+    return f"{namespace}:{hashlib.sha1(raw.encode('utf-8')).hexdigest()}"
+
+
+def segment_period(year, today):
+    """First and last day of the segment of year (never after today)"""
+    return pd.Timestamp(year=year, month=1, day=1), min(pd.Timestamp(year=year, month=12, day=31), today)
+
+
+def is_closed(year, today):
+    """True if the archive data of year will not change anymore"""
+    return pd.Timestamp(year=year + 1, month=1, day=1) + pd.Timedelta(days=HISTORICAL_ARCHIVE_DELAY_DAYS) <= today
+
+
+def download_chunks(years, workers=HISTORICAL_DOWNLOAD_WORKERS):
+    """
+    Split years into lists of contiguous years, one per request: workers
+    lists at most, unless the years have gaps
+    """
+    size = max(1, math.ceil(len(years) / max(workers, 1)))
+    chunks = []
+    for year in years:
+        if chunks and year == chunks[-1][-1] + 1 and len(chunks[-1]) < size:
+            chunks[-1].append(year)
+        else:
+            chunks.append([year])
+
+    return chunks
+
+
+def split_years(data, years):
+    """One frame per year of data"""
+    segments = {}
+    for year in years:
+        segment = data[data["time"].dt.year == year].reset_index(drop=True)
+        segment.attrs = copy.deepcopy(data.attrs)
+        segments[year] = segment
+
+    return segments
+
+
+def assemble(segments, start_date, end_date):
+    """Frame with the segments in order, cut to the requested dates"""
+    frames = [segments[year] for year in sorted(segments)]
+    non_empty = [frame for frame in frames if not frame.empty] or frames[:1]
+    data = pd.concat(non_empty, ignore_index=True) if len(non_empty) > 1 else non_empty[0].copy()
+    start = pd.Timestamp(start_date).normalize()
+    end = pd.Timestamp(end_date).normalize() + pd.Timedelta(days=1)
+    data = data[(data["time"] >= start) & (data["time"] < end)].reset_index(drop=True)
+
+    attrs = copy.deepcopy(frames[0].attrs)
+    request = attrs.get("request")
+    if request is not None:
+        request["start_date"], request["end_date"] = str(start_date), str(end_date)
+    data.attrs = attrs
+
+    return data
+
+
+def cache_by_year(closed_timeout=0, open_timeout=HISTORICAL_OPEN_YEAR_TIMEOUT):
+    """
+    Decorator used instead of @cache.memoize on the archive download
+    functions, which have start_date and end_date arguments and return a
+    frame with a time column. Segments of closed years are kept for
+    closed_timeout seconds (0 = until evicted), the one of the current year
+    for open_timeout seconds.
+    The functions must be called with keyword arguments only
+    (this is what @single_flight does).
+    """
+    def decorator(f):
+        namespace = f"{f.__module__}.{f.__qualname__}"
+
+        def requested_years(kwargs, today):
+            start = pd.Timestamp(kwargs["start_date"]).normalize()
+            end = min(pd.Timestamp(kwargs["end_date"]).normalize(), today)
+
+            return list(range(start.year, end.year + 1)) if start <= end else []
+
+        def get_segments(kwargs, years):
+            params = {k: v for k, v in kwargs.items() if k not in IGNORED_ARGUMENTS}
+            keys = [segment_key(namespace, params, year) for year in years]
+
+            return {
+                year: segment
+                for year, segment in zip(years, cache.get_many(*keys))
+                if segment is not None
+            }
+
+        def set_segments(segments, kwargs, today):
+            params = {k: v for k, v in kwargs.items() if k not in IGNORED_ARGUMENTS}
+            for year, segment in segments.items():
+                cache.set(
+                    segment_key(namespace, params, year),
+                    segment,
+                    timeout=closed_timeout if is_closed(year, today) else open_timeout,
+                )
+
+        def download(kwargs, years, today):
+            first, _ = segment_period(years[0], today)
+            _, last = segment_period(years[-1], today)
+            data = f(**dict(kwargs,
+                            start_date=first.strftime("%Y-%m-%d"),
+                            end_date=last.strftime("%Y-%m-%d")))
+
+            return split_years(data, years)
+
+        @wraps(f)
+        def wrapper(**kwargs):
+            today = pd.Timestamp.today().normalize()
+            years = requested_years(kwargs, today)
+            if not years:
+                # Nothing in the archive yet: let the API answer as it would
+                return f(**kwargs)
+
+            segments = get_segments(kwargs, years)
+            missing = [year for year in years if year not in segments]
+            if missing:
+                chunks = download_chunks(missing)
+                if len(chunks) == 1:
+                    downloaded = [download(kwargs, chunks[0], today)]
+                else:
+                    with ThreadPoolExecutor(max_workers=min(len(chunks), HISTORICAL_DOWNLOAD_WORKERS)) as pool:
+                        downloaded = list(pool.map(lambda chunk: download(kwargs, chunk, today), chunks))
+                for chunk_segments in downloaded:
+                    set_segments(chunk_segments, kwargs, today)
+                    segments.update(chunk_segments)
+
+            return assemble(segments, kwargs["start_date"], kwargs["end_date"])
+
+        def get_cached(**kwargs):
+            """Assembled frame if all the segments are in the cache, None otherwise"""
+            years = requested_years(kwargs, pd.Timestamp.today().normalize())
+            segments = get_segments(kwargs, years)
+            if not years or len(segments) < len(years):
+                return None
+
+            return assemble(segments, kwargs["start_date"], kwargs["end_date"])
+
+        def set_cached(data, **kwargs):
+            """
+            Store a frame downloaded outside of f (e.g. in a batch request):
+            only the years it covers entirely become segments
+            """
+            today = pd.Timestamp.today().normalize()
+            start = pd.Timestamp(kwargs["start_date"]).normalize()
+            end = min(pd.Timestamp(kwargs["end_date"]).normalize(), today)
+            covered = [
+                year for year in requested_years(kwargs, today)
+                if start <= segment_period(year, today)[0] and segment_period(year, today)[1] <= end
+            ]
+            set_segments(split_years(data, covered), kwargs, today)
+
+            return data
+
+        wrapper.uncached = f
+        wrapper.get_cached = get_cached
+        wrapper.set_cached = set_cached
+
+        return wrapper
+
+    return decorator